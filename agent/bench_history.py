@@ -0,0 +1,72 @@
+"""
+Measures the per-turn cost of the agent's send path: QuillpadAgent.trigger_action with a
+mocked SDK client and blog API, so only the agent's own work (recording the turn, running
+the tool call, preparing and sending the history, snapshotting) is timed.
+
+Usage: python bench_history.py [turns] [window]
+Run it next to the agent.py and api.py that script.py generates, not the hand-maintained copies.
+Each turn is a prompt, one list_posts tool call and a text answer. The mean cost per
+window should stay flat as the history grows; the legacy column re-walks and copies
+every item per request, like the old _prepare_history_for_sdk and history[:-1] did,
+and grows linearly.
+"""
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from google.generativeai import Types as GenAiTypes
+import agent as agent_module
+from api import BlogApi, UserCredentials
+
+class FakeClient:
+    """Stands in for the SDK client: calls a tool after a prompt, answers with text after the tool result."""
+    def __init__(self, api_key: str) -> None:
+        self.requests = 0
+
+    def generate_content(self, model, contents, generation_config=None, tools=None):
+        self.requests += 1
+        text = f"Listed posts (request {self.requests})." if contents[-1].role == 'function' else ""
+        part = GenAiTypes.Part(text=text) if text else GenAiTypes.Part(function_call=GenAiTypes.FunctionCall(name="list_posts", args={"limit": 5}))
+        return SimpleNamespace(candidates=[SimpleNamespace(content=GenAiTypes.Content(role='model', parts=[part]))], text=text)
+
+def make_blog() -> BlogApi:
+    blog = mock.create_autospec(BlogApi, instance=True)
+    blog.user_login.return_value = {"success": True, "data": {"logged_in_user_id": 1}}
+    blog.get_logged_in_user_ids.return_value = [1]
+    blog.list_posts.return_value = {"success": True, "data": {"count": 0, "results": []}}
+    return blog
+
+def legacy_send(history):
+    prepared = []
+    for item in history:
+        parts = [p if isinstance(p, GenAiTypes.Part) else GenAiTypes.Part(text=str(p)) for p in item.parts]
+        prepared.append({'role': item.role, 'parts': parts})
+    return prepared[:-1], prepared[-1]['parts']
+
+def main(turns: int = 5000, window: int = 1000) -> None:
+    with tempfile.TemporaryDirectory() as tmp, mock.patch.object(agent_module, 'Client', FakeClient):
+        quill = agent_module.QuillpadAgent(
+            make_blog(), api_key="bench", model_id="bench", admin_credentials=UserCredentials("admin", "admin"),
+            log_file=f"{tmp}/agent_activity.log", history_token_budget=10**12, history_file=None # Never compacts: measure raw growth
+        )
+        history = quill._QuillpadAgent__history
+        elapsed = 0.0
+        print(f"{'turns':>8} {'send path us/turn':>18} {'legacy us/turn':>16}")
+        for i in range(1, turns + 1):
+            start = time.perf_counter()
+            quill.trigger_action(f"Prompt {i}: simulate the next action.")
+            elapsed += time.perf_counter() - start
+
+            if i % window == 0:
+                # Sample the legacy preparation once per window (two requests per turn); running it every turn is quadratic.
+                start = time.perf_counter()
+                for _ in range(2): legacy_send(history.as_list())
+                legacy = time.perf_counter() - start
+                print(f"{i:>8} {elapsed / window * 1e6:>18.1f} {legacy * 1e6:>16.1f}")
+                elapsed = 0.0
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,274 @@
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from google.generativeai import Types as GenAiTypes
+
+log = logging.getLogger("ChatHistory")
+
+CHARS_PER_TOKEN = 4
+SUMMARY_PREFIX = "Summary of earlier simulation activity (older turns were condensed):\n"
+SUMMARY_ACK = "Noted. I will keep this earlier activity in mind."
+ID_KEYS = ("id", "user_id", "logged_in_user_id", "username", "slug", "title", "name", "post", "parent")
+
+def _to_plain(value: Any) -> Any:
+    # SDK structs (MapComposite/RepeatedComposite) behave like dicts/lists but are not JSON types.
+    if isinstance(value, (str, int, float, bool)) or value is None: return value
+    if hasattr(value, 'items'): return {str(k): _to_plain(v) for k, v in value.items()}
+    if hasattr(value, '__iter__'): return [_to_plain(v) for v in value]
+    return str(value)
+
+def _function_call_of(part: Any) -> Any:
+    call = getattr(part, 'function_call', None)
+    return call if call and getattr(call, 'name', None) else None
+
+def _function_response_of(part: Any) -> Any:
+    response = getattr(part, 'function_response', None)
+    return response if response and getattr(response, 'name', None) else None
+
+def estimate_tokens(parts: List[Any]) -> int:
+    """Cheap character-based token estimate; good enough for budgeting."""
+    chars = 0
+    for part in parts:
+        call = _function_call_of(part)
+        response = _function_response_of(part)
+        if call: chars += len(call.name) + len(json.dumps(_to_plain(call.args or {}), default=str))
+        elif response: chars += len(response.name) + len(json.dumps(_to_plain(response.response or {}), default=str))
+        else: chars += len(getattr(part, 'text', '') or '')
+    return chars // CHARS_PER_TOKEN + 1
+
+def compact_payload(payload: Dict[str, Any], max_chars: int) -> Dict[str, Any]:
+    """Reduces a tool result to its status and the identifiers the model may still refer to."""
+    compact: Dict[str, Any] = {"elided": True}
+    for key, value in payload.items():
+        if key == "data": continue
+        if isinstance(value, (str, int, float, bool)) or value is None:
+            compact[key] = value[:200] if isinstance(value, str) else value
+    data = payload.get("data")
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        compact["count"] = data.get("count", len(data["results"]))
+        data = data["results"]
+    if isinstance(data, list):
+        compact["items"] = [
+            {k: item[k] for k in ID_KEYS if k in item} if isinstance(item, dict) else str(item)[:80]
+            for item in data
+        ]
+    elif isinstance(data, dict):
+        compact["data"] = {k: data[k] for k in ID_KEYS if k in data}
+    elif data is not None:
+        compact["data"] = str(data)[:200]
+    if len(json.dumps(compact, default=str)) > max_chars and "items" in compact:
+        compact["items"] = compact["items"][:max(1, len(compact["items"]) // 4)]
+    return compact
+
+def part_to_json(part: Any) -> Dict[str, Any]:
+    call = _function_call_of(part)
+    response = _function_response_of(part)
+    if call: return {"function_call": {"name": call.name, "args": _to_plain(call.args or {})}}
+    if response: return {"function_response": {"name": response.name, "response": _to_plain(response.response or {})}}
+    return {"text": getattr(part, 'text', '') or ''}
+
+def part_from_json(data: Dict[str, Any]) -> GenAiTypes.Part:
+    if "function_call" in data:
+        call = data["function_call"]
+        return GenAiTypes.Part(function_call=GenAiTypes.FunctionCall(name=call["name"], args=call.get("args", {})))
+    if "function_response" in data:
+        response = data["function_response"]
+        return GenAiTypes.Part(function_response=GenAiTypes.FunctionResponse(name=response["name"], response=response.get("response", {})))
+    return GenAiTypes.Part(text=str(data.get("text", "")))
+
+class ChatHistoryManager:
+    """
+    Keeps the agent's chat history inside a token budget.
+
+    The primer (system prompt + acknowledgement) is always sent first. When the
+    budget is exceeded, the oldest complete turns are folded into a rolling
+    summary (model-generated via `summarizer`, heuristic otherwise). Bulky
+    function-response payloads are replaced by compact stubs once the model
+    has answered them.
+
+    Items are stored as SDK `Content` objects in the exact list that is sent to
+    the model (primer, summary pair, recent entries), so each turn only appends
+    to it instead of rebuilding and re-validating the whole history.
+    """
+    def __init__(
+        self,
+        primer: List[GenAiTypes.Content],
+        token_budget: int = 24000,
+        keep_recent_turns: int = 6,
+        max_response_chars: int = 1500,
+        max_summary_chars: int = 6000,
+        summarizer: Optional[Callable[[str, str], str]] = None,
+        snapshot_file: Optional[str] = None
+    ) -> None:
+        self.__primer = list(primer)
+        self.__primer_tokens = sum(estimate_tokens(item.parts) for item in self.__primer)
+        self.__token_budget = token_budget
+        self.__keep_recent_turns = max(1, keep_recent_turns)
+        self.__max_response_chars = max_response_chars
+        self.__max_summary_chars = max_summary_chars
+        self.__summarizer = summarizer
+        self.__snapshot_file = snapshot_file
+        self.__summary = ""
+        self.__prepared: List[GenAiTypes.Content] = list(self.__primer)
+        self.__entry_tokens: List[int] = [] # One per entry, i.e. per item after the summary pair
+        self.__total_tokens = self.__primer_tokens
+
+    def _head(self) -> int:
+        return len(self.__prepared) - len(self.__entry_tokens)
+
+    @property
+    def entries(self) -> List[GenAiTypes.Content]:
+        """Copy of the history items after the primer and summary, oldest first."""
+        return self.__prepared[self._head():]
+
+    @property
+    def summary(self) -> str:
+        return self.__summary
+
+    @property
+    def total_tokens(self) -> int:
+        return self.__total_tokens
+
+    def last_role(self) -> Optional[str]:
+        return self.__prepared[-1].role if self.__entry_tokens else None
+
+    def _summary_items(self) -> List[GenAiTypes.Content]:
+        if not self.__summary: return []
+        return [
+            GenAiTypes.Content(role='user', parts=[GenAiTypes.Part(text=SUMMARY_PREFIX + self.__summary)]),
+            GenAiTypes.Content(role='model', parts=[GenAiTypes.Part(text=SUMMARY_ACK)]),
+        ]
+
+    def _set_summary(self, summary: str) -> None:
+        old_items = self.__prepared[len(self.__primer):self._head()]
+        self.__summary = summary
+        new_items = self._summary_items()
+        self.__prepared[len(self.__primer):self._head()] = new_items
+        self.__total_tokens += sum(estimate_tokens(i.parts) for i in new_items) - sum(estimate_tokens(i.parts) for i in old_items)
+
+    def as_list(self) -> List[GenAiTypes.Content]:
+        """The history to send, ready for the SDK. Shared, not copied: callers must not mutate it."""
+        return self.__prepared
+
+    def append(self, content: GenAiTypes.Content) -> None:
+        if content.role == 'model' and self.last_role() == 'function':
+            self._elide_function_responses(len(self.__prepared) - 1)
+        tokens = estimate_tokens(content.parts)
+        self.__prepared.append(content)
+        self.__entry_tokens.append(tokens)
+        self.__total_tokens += tokens
+
+    def pop(self) -> Optional[GenAiTypes.Content]:
+        if not self.__entry_tokens: return None
+        self.__total_tokens -= self.__entry_tokens.pop()
+        return self.__prepared.pop()
+
+    def _elide_function_responses(self, index: int) -> None:
+        """The model has consumed these tool results; keep only a compact stub of large ones."""
+        item = self.__prepared[index]
+        changed = False
+        new_parts: List[GenAiTypes.Part] = []
+        for part in item.parts:
+            response = _function_response_of(part)
+            payload = _to_plain(response.response or {}) if response else None
+            if isinstance(payload, dict) and len(json.dumps(payload, default=str)) > self.__max_response_chars:
+                stub = compact_payload(payload, self.__max_response_chars)
+                new_parts.append(GenAiTypes.Part(function_response=GenAiTypes.FunctionResponse(name=response.name, response=stub)))
+                changed = True
+            else:
+                new_parts.append(part)
+        if not changed: return
+        entry_index = index - self._head()
+        tokens = estimate_tokens(new_parts)
+        self.__total_tokens += tokens - self.__entry_tokens[entry_index]
+        self.__prepared[index] = GenAiTypes.Content(role=item.role, parts=new_parts)
+        self.__entry_tokens[entry_index] = tokens
+        log.debug(f"Elided bulky function responses in history item {index}.")
+
+    def _turn_starts(self) -> List[int]:
+        # A turn begins with a user prompt; function/model items belong to the preceding turn.
+        head = self._head()
+        return [i - head for i in range(head, len(self.__prepared)) if self.__prepared[i].role == 'user']
+
+    def compact(self) -> bool:
+        """Folds the oldest complete turns into the summary while over budget. Returns True if anything was folded."""
+        if self.__total_tokens <= self.__token_budget: return False
+        starts = self._turn_starts()
+        if len(starts) <= 1: return False
+
+        keep = min(self.__keep_recent_turns, len(starts) - 1)
+        cut = starts[-keep]
+        # Recent turns alone may still exceed the budget; fold more, but never the current turn.
+        while keep > 1 and self.__total_tokens - sum(self.__entry_tokens[:cut]) > self.__token_budget:
+            keep -= 1
+            cut = starts[-keep]
+
+        head = self._head()
+        folded = self.__prepared[head:head + cut]
+        transcript = self._transcript(folded)
+        summary = ""
+        if self.__summarizer:
+            try: summary = (self.__summarizer(self.__summary, transcript) or "").strip()
+            except Exception as e: log.warning(f"Model summarization failed, using heuristic summary: {e}")
+        if not summary:
+            summary = "\n".join(s for s in (self.__summary, transcript) if s)
+        if len(summary) > self.__max_summary_chars:
+            summary = "..." + summary[-self.__max_summary_chars:]
+
+        self.__total_tokens -= sum(self.__entry_tokens[:cut])
+        del self.__prepared[head:head + cut]
+        del self.__entry_tokens[:cut]
+        self._set_summary(summary)
+        log.info(f"Folded {len(folded)} history items into summary. History now ~{self.__total_tokens} tokens.")
+        return True
+
+    def _transcript(self, items: List[GenAiTypes.Content]) -> str:
+        lines: List[str] = []
+        for item in items:
+            for part in item.parts:
+                call = _function_call_of(part)
+                response = _function_response_of(part)
+                if call:
+                    lines.append(f"- called {call.name}({json.dumps(_to_plain(call.args or {}), default=str)[:200]})")
+                elif response:
+                    payload = _to_plain(response.response or {})
+                    ok = payload.get("success", "error" not in payload) if isinstance(payload, dict) else True
+                    error = payload.get("error") if isinstance(payload, dict) else None
+                    lines.append(f"- {response.name} -> {'ok' if ok else 'failed'}{f': {error}' if error else ''}")
+                elif item.role == 'model' and getattr(part, 'text', None):
+                    lines.append(f"- agent: {part.text.strip()[:300]}")
+        return "\n".join(lines)
+
+    def save_snapshot(self) -> None:
+        """Writes summary + recent entries atomically so a restart resumes with compact context."""
+        if not self.__snapshot_file: return
+        snapshot = {
+            "version": 1,
+            "summary": self.__summary,
+            "entries": [{"role": item.role, "parts": [part_to_json(p) for p in item.parts]} for item in self.entries],
+        }
+        tmp_path = f"{self.__snapshot_file}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as fp: json.dump(snapshot, fp, separators=(',', ':'), default=str)
+            os.replace(tmp_path, self.__snapshot_file)
+        except (IOError, TypeError) as e: log.error(f"Failed to write history snapshot '{self.__snapshot_file}': {e}")
+
+    def load_snapshot(self) -> bool:
+        if not self.__snapshot_file or not os.path.exists(self.__snapshot_file): return False
+        try:
+            with open(self.__snapshot_file, 'r', encoding='utf-8') as fp: snapshot = json.load(fp)
+            entries = [GenAiTypes.Content(role=e['role'], parts=[part_from_json(p) for p in e['parts']]) for e in snapshot.get("entries", [])]
+        except (IOError, json.JSONDecodeError, KeyError, TypeError) as e:
+            log.error(f"Ignoring unreadable history snapshot '{self.__snapshot_file}': {e}")
+            return False
+        self.__prepared = list(self.__primer)
+        self.__entry_tokens = []
+        self.__total_tokens = self.__primer_tokens
+        self.__summary = ""
+        self._set_summary(snapshot.get("summary", ""))
+        for entry in entries: self.append(entry)
+        while self.__entry_tokens and self.last_role() != 'model': self.pop() # Drop an interrupted turn
+        log.info(f"Restored history snapshot: {len(self.__entry_tokens)} items, summary {len(self.__summary)} chars.")
+        return True
@@ -22,6 +22,8 @@ env_content = dedent("""
     MODEL_TEMPRATURE=0.8
     # Optional: Set log level for the agent/runner (DEBUG, INFO, WARNING, ERROR)
     LOG_LEVEL=INFO
+    # Optional: Approximate token budget for chat history sent to the model (older turns get summarized)
+    HISTORY_TOKEN_BUDGET=24000
 """)
 
 api_py_content = dedent(r"""
@@ -325,8 +327,362 @@ api_py_content = dedent(r"""
             self.__active_tokens.clear()
 """)
 
+# history.py: Token-budgeted chat history with rolling summarization
+history_py_content = dedent(r'''
+    import json
+    import logging
+    import os
+    from typing import Any, Callable, Dict, List, Optional
+
+    from google.generativeai import Types as GenAiTypes
+
+    log = logging.getLogger("ChatHistory")
+
+    CHARS_PER_TOKEN = 4
+    SUMMARY_PREFIX = "Summary of earlier simulation activity (older turns were condensed):\n"
+    SUMMARY_ACK = "Noted. I will keep this earlier activity in mind."
+    ID_KEYS = ("id", "user_id", "logged_in_user_id", "username", "slug", "title", "name", "post", "parent")
+
+    def _to_plain(value: Any) -> Any:
+        # SDK structs (MapComposite/RepeatedComposite) behave like dicts/lists but are not JSON types.
+        if isinstance(value, (str, int, float, bool)) or value is None: return value
+        if hasattr(value, 'items'): return {str(k): _to_plain(v) for k, v in value.items()}
+        if hasattr(value, '__iter__'): return [_to_plain(v) for v in value]
+        return str(value)
+
+    def _function_call_of(part: Any) -> Any:
+        call = getattr(part, 'function_call', None)
+        return call if call and getattr(call, 'name', None) else None
+
+    def _function_response_of(part: Any) -> Any:
+        response = getattr(part, 'function_response', None)
+        return response if response and getattr(response, 'name', None) else None
+
+    def estimate_tokens(parts: List[Any]) -> int:
+        """Cheap character-based token estimate; good enough for budgeting."""
+        chars = 0
+        for part in parts:
+            call = _function_call_of(part)
+            response = _function_response_of(part)
+            if call: chars += len(call.name) + len(json.dumps(_to_plain(call.args or {}), default=str))
+            elif response: chars += len(response.name) + len(json.dumps(_to_plain(response.response or {}), default=str))
+            else: chars += len(getattr(part, 'text', '') or '')
+        return chars // CHARS_PER_TOKEN + 1
+
+    def compact_payload(payload: Dict[str, Any], max_chars: int) -> Dict[str, Any]:
+        """Reduces a tool result to its status and the identifiers the model may still refer to."""
+        compact: Dict[str, Any] = {"elided": True}
+        for key, value in payload.items():
+            if key == "data": continue
+            if isinstance(value, (str, int, float, bool)) or value is None:
+                compact[key] = value[:200] if isinstance(value, str) else value
+        data = payload.get("data")
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            compact["count"] = data.get("count", len(data["results"]))
+            data = data["results"]
+        if isinstance(data, list):
+            compact["items"] = [
+                {k: item[k] for k in ID_KEYS if k in item} if isinstance(item, dict) else str(item)[:80]
+                for item in data
+            ]
+        elif isinstance(data, dict):
+            compact["data"] = {k: data[k] for k in ID_KEYS if k in data}
+        elif data is not None:
+            compact["data"] = str(data)[:200]
+        if len(json.dumps(compact, default=str)) > max_chars and "items" in compact:
+            compact["items"] = compact["items"][:max(1, len(compact["items"]) // 4)]
+        return compact
+
+    def part_to_json(part: Any) -> Dict[str, Any]:
+        call = _function_call_of(part)
+        response = _function_response_of(part)
+        if call: return {"function_call": {"name": call.name, "args": _to_plain(call.args or {})}}
+        if response: return {"function_response": {"name": response.name, "response": _to_plain(response.response or {})}}
+        return {"text": getattr(part, 'text', '') or ''}
+
+    def part_from_json(data: Dict[str, Any]) -> GenAiTypes.Part:
+        if "function_call" in data:
+            call = data["function_call"]
+            return GenAiTypes.Part(function_call=GenAiTypes.FunctionCall(name=call["name"], args=call.get("args", {})))
+        if "function_response" in data:
+            response = data["function_response"]
+            return GenAiTypes.Part(function_response=GenAiTypes.FunctionResponse(name=response["name"], response=response.get("response", {})))
+        return GenAiTypes.Part(text=str(data.get("text", "")))
+
+    class ChatHistoryManager:
+        """
+        Keeps the agent's chat history inside a token budget.
+
+        The primer (system prompt + acknowledgement) is always sent first. When the
+        budget is exceeded, the oldest complete turns are folded into a rolling
+        summary (model-generated via `summarizer`, heuristic otherwise). Bulky
+        function-response payloads are replaced by compact stubs once the model
+        has answered them.
+
+        Items are stored as SDK `Content` objects in the exact list that is sent to
+        the model (primer, summary pair, recent entries), so each turn only appends
+        to it instead of rebuilding and re-validating the whole history.
+        """
+        def __init__(
+            self,
+            primer: List[GenAiTypes.Content],
+            token_budget: int = 24000,
+            keep_recent_turns: int = 6,
+            max_response_chars: int = 1500,
+            max_summary_chars: int = 6000,
+            summarizer: Optional[Callable[[str, str], str]] = None,
+            snapshot_file: Optional[str] = None
+        ) -> None:
+            self.__primer = list(primer)
+            self.__primer_tokens = sum(estimate_tokens(item.parts) for item in self.__primer)
+            self.__token_budget = token_budget
+            self.__keep_recent_turns = max(1, keep_recent_turns)
+            self.__max_response_chars = max_response_chars
+            self.__max_summary_chars = max_summary_chars
+            self.__summarizer = summarizer
+            self.__snapshot_file = snapshot_file
+            self.__summary = ""
+            self.__prepared: List[GenAiTypes.Content] = list(self.__primer)
+            self.__entry_tokens: List[int] = [] # One per entry, i.e. per item after the summary pair
+            self.__total_tokens = self.__primer_tokens
+
+        def _head(self) -> int:
+            return len(self.__prepared) - len(self.__entry_tokens)
+
+        @property
+        def entries(self) -> List[GenAiTypes.Content]:
+            """Copy of the history items after the primer and summary, oldest first."""
+            return self.__prepared[self._head():]
+
+        @property
+        def summary(self) -> str:
+            return self.__summary
+
+        @property
+        def total_tokens(self) -> int:
+            return self.__total_tokens
+
+        def last_role(self) -> Optional[str]:
+            return self.__prepared[-1].role if self.__entry_tokens else None
+
+        def _summary_items(self) -> List[GenAiTypes.Content]:
+            if not self.__summary: return []
+            return [
+                GenAiTypes.Content(role='user', parts=[GenAiTypes.Part(text=SUMMARY_PREFIX + self.__summary)]),
+                GenAiTypes.Content(role='model', parts=[GenAiTypes.Part(text=SUMMARY_ACK)]),
+            ]
+
+        def _set_summary(self, summary: str) -> None:
+            old_items = self.__prepared[len(self.__primer):self._head()]
+            self.__summary = summary
+            new_items = self._summary_items()
+            self.__prepared[len(self.__primer):self._head()] = new_items
+            self.__total_tokens += sum(estimate_tokens(i.parts) for i in new_items) - sum(estimate_tokens(i.parts) for i in old_items)
+
+        def as_list(self) -> List[GenAiTypes.Content]:
+            """The history to send, ready for the SDK. Shared, not copied: callers must not mutate it."""
+            return self.__prepared
+
+        def append(self, content: GenAiTypes.Content) -> None:
+            if content.role == 'model' and self.last_role() == 'function':
+                self._elide_function_responses(len(self.__prepared) - 1)
+            tokens = estimate_tokens(content.parts)
+            self.__prepared.append(content)
+            self.__entry_tokens.append(tokens)
+            self.__total_tokens += tokens
+
+        def pop(self) -> Optional[GenAiTypes.Content]:
+            if not self.__entry_tokens: return None
+            self.__total_tokens -= self.__entry_tokens.pop()
+            return self.__prepared.pop()
+
+        def _elide_function_responses(self, index: int) -> None:
+            """The model has consumed these tool results; keep only a compact stub of large ones."""
+            item = self.__prepared[index]
+            changed = False
+            new_parts: List[GenAiTypes.Part] = []
+            for part in item.parts:
+                response = _function_response_of(part)
+                payload = _to_plain(response.response or {}) if response else None
+                if isinstance(payload, dict) and len(json.dumps(payload, default=str)) > self.__max_response_chars:
+                    stub = compact_payload(payload, self.__max_response_chars)
+                    new_parts.append(GenAiTypes.Part(function_response=GenAiTypes.FunctionResponse(name=response.name, response=stub)))
+                    changed = True
+                else:
+                    new_parts.append(part)
+            if not changed: return
+            entry_index = index - self._head()
+            tokens = estimate_tokens(new_parts)
+            self.__total_tokens += tokens - self.__entry_tokens[entry_index]
+            self.__prepared[index] = GenAiTypes.Content(role=item.role, parts=new_parts)
+            self.__entry_tokens[entry_index] = tokens
+            log.debug(f"Elided bulky function responses in history item {index}.")
+
+        def _turn_starts(self) -> List[int]:
+            # A turn begins with a user prompt; function/model items belong to the preceding turn.
+            head = self._head()
+            return [i - head for i in range(head, len(self.__prepared)) if self.__prepared[i].role == 'user']
+
+        def compact(self) -> bool:
+            """Folds the oldest complete turns into the summary while over budget. Returns True if anything was folded."""
+            if self.__total_tokens <= self.__token_budget: return False
+            starts = self._turn_starts()
+            if len(starts) <= 1: return False
+
+            keep = min(self.__keep_recent_turns, len(starts) - 1)
+            cut = starts[-keep]
+            # Recent turns alone may still exceed the budget; fold more, but never the current turn.
+            while keep > 1 and self.__total_tokens - sum(self.__entry_tokens[:cut]) > self.__token_budget:
+                keep -= 1
+                cut = starts[-keep]
+
+            head = self._head()
+            folded = self.__prepared[head:head + cut]
+            transcript = self._transcript(folded)
+            summary = ""
+            if self.__summarizer:
+                try: summary = (self.__summarizer(self.__summary, transcript) or "").strip()
+                except Exception as e: log.warning(f"Model summarization failed, using heuristic summary: {e}")
+            if not summary:
+                summary = "\n".join(s for s in (self.__summary, transcript) if s)
+            if len(summary) > self.__max_summary_chars:
+                summary = "..." + summary[-self.__max_summary_chars:]
+
+            self.__total_tokens -= sum(self.__entry_tokens[:cut])
+            del self.__prepared[head:head + cut]
+            del self.__entry_tokens[:cut]
+            self._set_summary(summary)
+            log.info(f"Folded {len(folded)} history items into summary. History now ~{self.__total_tokens} tokens.")
+            return True
+
+        def _transcript(self, items: List[GenAiTypes.Content]) -> str:
+            lines: List[str] = []
+            for item in items:
+                for part in item.parts:
+                    call = _function_call_of(part)
+                    response = _function_response_of(part)
+                    if call:
+                        lines.append(f"- called {call.name}({json.dumps(_to_plain(call.args or {}), default=str)[:200]})")
+                    elif response:
+                        payload = _to_plain(response.response or {})
+                        ok = payload.get("success", "error" not in payload) if isinstance(payload, dict) else True
+                        error = payload.get("error") if isinstance(payload, dict) else None
+                        lines.append(f"- {response.name} -> {'ok' if ok else 'failed'}{f': {error}' if error else ''}")
+                    elif item.role == 'model' and getattr(part, 'text', None):
+                        lines.append(f"- agent: {part.text.strip()[:300]}")
+            return "\n".join(lines)
+
+        def save_snapshot(self) -> None:
+            """Writes summary + recent entries atomically so a restart resumes with compact context."""
+            if not self.__snapshot_file: return
+            snapshot = {
+                "version": 1,
+                "summary": self.__summary,
+                "entries": [{"role": item.role, "parts": [part_to_json(p) for p in item.parts]} for item in self.entries],
+            }
+            tmp_path = f"{self.__snapshot_file}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as fp: json.dump(snapshot, fp, separators=(',', ':'), default=str)
+                os.replace(tmp_path, self.__snapshot_file)
+            except (IOError, TypeError) as e: log.error(f"Failed to write history snapshot '{self.__snapshot_file}': {e}")
+
+        def load_snapshot(self) -> bool:
+            if not self.__snapshot_file or not os.path.exists(self.__snapshot_file): return False
+            try:
+                with open(self.__snapshot_file, 'r', encoding='utf-8') as fp: snapshot = json.load(fp)
+                entries = [GenAiTypes.Content(role=e['role'], parts=[part_from_json(p) for p in e['parts']]) for e in snapshot.get("entries", [])]
+            except (IOError, json.JSONDecodeError, KeyError, TypeError) as e:
+                log.error(f"Ignoring unreadable history snapshot '{self.__snapshot_file}': {e}")
+                return False
+            self.__prepared = list(self.__primer)
+            self.__entry_tokens = []
+            self.__total_tokens = self.__primer_tokens
+            self.__summary = ""
+            self._set_summary(snapshot.get("summary", ""))
+            for entry in entries: self.append(entry)
+            while self.__entry_tokens and self.last_role() != 'model': self.pop() # Drop an interrupted turn
+            log.info(f"Restored history snapshot: {len(self.__entry_tokens)} items, summary {len(self.__summary)} chars.")
+            return True
+''')
+
+# bench_history.py: Benchmark for the agent's per-turn send path (mocked SDK client)
+bench_history_py_content = dedent(r'''
+    """
+    Measures the per-turn cost of the agent's send path: QuillpadAgent.trigger_action with a
+    mocked SDK client and blog API, so only the agent's own work (recording the turn, running
+    the tool call, preparing and sending the history, snapshotting) is timed.
+
+    Usage: python bench_history.py [turns] [window]
+    Run it next to the agent.py and api.py that script.py generates, not the hand-maintained copies.
+    Each turn is a prompt, one list_posts tool call and a text answer. The mean cost per
+    window should stay flat as the history grows; the legacy column re-walks and copies
+    every item per request, like the old _prepare_history_for_sdk and history[:-1] did,
+    and grows linearly.
+    """
+    import sys
+    import tempfile
+    import time
+    from types import SimpleNamespace
+    from unittest import mock
+
+    from google.generativeai import Types as GenAiTypes
+    import agent as agent_module
+    from api import BlogApi, UserCredentials
+
+    class FakeClient:
+        """Stands in for the SDK client: calls a tool after a prompt, answers with text after the tool result."""
+        def __init__(self, api_key: str) -> None:
+            self.requests = 0
+
+        def generate_content(self, model, contents, generation_config=None, tools=None):
+            self.requests += 1
+            text = f"Listed posts (request {self.requests})." if contents[-1].role == 'function' else ""
+            part = GenAiTypes.Part(text=text) if text else GenAiTypes.Part(function_call=GenAiTypes.FunctionCall(name="list_posts", args={"limit": 5}))
+            return SimpleNamespace(candidates=[SimpleNamespace(content=GenAiTypes.Content(role='model', parts=[part]))], text=text)
+
+    def make_blog() -> BlogApi:
+        blog = mock.create_autospec(BlogApi, instance=True)
+        blog.user_login.return_value = {"success": True, "data": {"logged_in_user_id": 1}}
+        blog.get_logged_in_user_ids.return_value = [1]
+        blog.list_posts.return_value = {"success": True, "data": {"count": 0, "results": []}}
+        return blog
+
+    def legacy_send(history):
+        prepared = []
+        for item in history:
+            parts = [p if isinstance(p, GenAiTypes.Part) else GenAiTypes.Part(text=str(p)) for p in item.parts]
+            prepared.append({'role': item.role, 'parts': parts})
+        return prepared[:-1], prepared[-1]['parts']
+
+    def main(turns: int = 5000, window: int = 1000) -> None:
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(agent_module, 'Client', FakeClient):
+            quill = agent_module.QuillpadAgent(
+                make_blog(), api_key="bench", model_id="bench", admin_credentials=UserCredentials("admin", "admin"),
+                log_file=f"{tmp}/agent_activity.log", history_token_budget=10**12, history_file=None # Never compacts: measure raw growth
+            )
+            history = quill._QuillpadAgent__history
+            elapsed = 0.0
+            print(f"{'turns':>8} {'send path us/turn':>18} {'legacy us/turn':>16}")
+            for i in range(1, turns + 1):
+                start = time.perf_counter()
+                quill.trigger_action(f"Prompt {i}: simulate the next action.")
+                elapsed += time.perf_counter() - start
+
+                if i % window == 0:
+                    # Sample the legacy preparation once per window (two requests per turn); running it every turn is quadratic.
+                    start = time.perf_counter()
+                    for _ in range(2): legacy_send(history.as_list())
+                    legacy = time.perf_counter() - start
+                    print(f"{i:>8} {elapsed / window * 1e6:>18.1f} {legacy * 1e6:>16.1f}")
+                    elapsed = 0.0
+
+    if __name__ == "__main__":
+        args = [int(a) for a in sys.argv[1:3]]
+        main(*args)
+''')
+
 # agent.py: Corrected string literal termination and indentation around line 551
-agent_py_content = dedent(r"""
+agent_py_content = dedent(r'''
     import datetime as dt
     import json
     import logging
@@ -337,31 +693,32 @@ agent_py_content = dedent(r"""
     from google.generativeai import Client, Types as GenAiTypes
     from api import BlogApi, PostData, UserCredentials
     from api_desc import blog_api_tools
+    from history import ChatHistoryManager
 
     log = logging.getLogger("QuillpadAgent")
 
     system_prompt = """
-You are an AI agent simulating activity on a blogging platform (QuillPad).
-Your goal is to create realistic user interactions over time using the provided API tools.
-
-**Workflow:**
-1.  **Choose an Action:** Decide what action to take (register, login, create post, comment, list things, etc.).
-2.  **Select User:** If the action requires a logged-in user, decide which user will perform it. You need their *username* and *password* (which you should remember from registration). You can list users or posts to get IDs/slugs if needed.
-3.  **Login (If Necessary):** Check `is_user_logged_in` for the *user_id*. If not logged in, use the `user_login` tool with their *username* and *password*. The result will indicate success and provide the `logged_in_user_id`. Remember this ID!
-4.  **Perform Action:** Use the appropriate tool, passing the correct `user_id` of the *currently logged-in user* for authenticated actions (like creating posts, commenting, liking, creating categories).
-5.  **Logout (Optional):** You can log users out using `user_logout` with their `user_id` to simulate session endings.
-6.  **Log Results:** After each *complete action sequence* (e.g., register -> login -> create post -> logout), provide a concise log message summarizing what you did, the user involved, the outcome (success/failure), any relevant IDs/slugs, and any errors encountered.
-
-**Guidelines:**
-*   **User Simulation:** Create diverse users with plausible names, emails, and passwords. Register them first, then log them in to act. **Remember the credentials you create!**
-*   **Content Generation:** Write varied and relatively coherent blog posts (using Markdown) and comments. Simulate discussions, questions, and replies in comment threads. Use Markdown formatting for posts.
-*   **Error Handling:** If a tool call fails (e.g., login failure, post creation error, non-existent resource), acknowledge the error in your log and decide whether to retry (e.g., login again), try something else, or abandon the action. Don't get stuck retrying indefinitely if something is fundamentally wrong.
-*   **State Awareness:** Use `is_user_logged_in` to check the status before performing authenticated actions. Use `list_users` or `list_posts` or `list_categories` if you need to find existing entities or IDs.
-*   **Realism:** Vary the actions. Have users comment, reply, and like posts. Simulate different user roles (readers commenting, authors posting). You can suggest a user should be promoted to 'author' in your log.
-*   **Admin User:** An admin user (username specified at startup) exists. You might need to log in as the admin to perform actions like creating categories or listing all users. Remember the admin password!
-
-You will receive periodic prompts to take an action. Respond ONLY with the API tool calls needed to complete your chosen action sequence. Once the tools return results, you will be prompted again, and you should respond with your summary log message.
-""" # <-- CORRECTLY TERMINATED STRING LITERAL
+    You are an AI agent simulating activity on a blogging platform (QuillPad).
+    Your goal is to create realistic user interactions over time using the provided API tools.
+
+    **Workflow:**
+    1.  **Choose an Action:** Decide what action to take (register, login, create post, comment, list things, etc.).
+    2.  **Select User:** If the action requires a logged-in user, decide which user will perform it. You need their *username* and *password* (which you should remember from registration). You can list users or posts to get IDs/slugs if needed.
+    3.  **Login (If Necessary):** Check `is_user_logged_in` for the *user_id*. If not logged in, use the `user_login` tool with their *username* and *password*. The result will indicate success and provide the `logged_in_user_id`. Remember this ID!
+    4.  **Perform Action:** Use the appropriate tool, passing the correct `user_id` of the *currently logged-in user* for authenticated actions (like creating posts, commenting, liking, creating categories).
+    5.  **Logout (Optional):** You can log users out using `user_logout` with their `user_id` to simulate session endings.
+    6.  **Log Results:** After each *complete action sequence* (e.g., register -> login -> create post -> logout), provide a concise log message summarizing what you did, the user involved, the outcome (success/failure), any relevant IDs/slugs, and any errors encountered.
+
+    **Guidelines:**
+    *   **User Simulation:** Create diverse users with plausible names, emails, and passwords. Register them first, then log them in to act. **Remember the credentials you create!**
+    *   **Content Generation:** Write varied and relatively coherent blog posts (using Markdown) and comments. Simulate discussions, questions, and replies in comment threads. Use Markdown formatting for posts.
+    *   **Error Handling:** If a tool call fails (e.g., login failure, post creation error, non-existent resource), acknowledge the error in your log and decide whether to retry (e.g., login again), try something else, or abandon the action. Don't get stuck retrying indefinitely if something is fundamentally wrong.
+    *   **State Awareness:** Use `is_user_logged_in` to check the status before performing authenticated actions. Use `list_users` or `list_posts` or `list_categories` if you need to find existing entities or IDs.
+    *   **Realism:** Vary the actions. Have users comment, reply, and like posts. Simulate different user roles (readers commenting, authors posting). You can suggest a user should be promoted to 'author' in your log.
+    *   **Admin User:** An admin user (username specified at startup) exists. You might need to log in as the admin to perform actions like creating categories or listing all users. Remember the admin password!
+
+    You will receive periodic prompts to take an action. Respond ONLY with the API tool calls needed to complete your chosen action sequence. Once the tools return results, you will be prompted again, and you should respond with your summary log message.
+    """ # <-- CORRECTLY TERMINATED STRING LITERAL
 
     class QuillpadAgent:
         """
@@ -375,7 +732,9 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
             admin_credentials: UserCredentials,
             model_temperature: float = 1.0,
             log_file: str = "agent_activity.log",
-            print_log: bool = False
+            print_log: bool = False,
+            history_token_budget: int = 24000,
+            history_file: Optional[str] = "agent_history.json"
         ) -> None:
             self.__log_file = log_file
             self.__print_log = print_log
@@ -404,10 +763,15 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
             self.__model_id = model_id
             self.__chat_config = GenAiTypes.GenerationConfig(temperature=model_temperature)
 
-            self.__chat_history: List[Dict[str, Any]] = [
-                 {'role': 'user', 'parts': [GenAiTypes.Part(text=system_prompt)]}, # Use Part object
-                 {'role': 'model', 'parts': [GenAiTypes.Part(text="Understood. I am ready to simulate activity on the QuillPad blog platform using the provided API tools. I will manage user sessions by logging users in before they perform actions and logging the results.")]}
+            primer: List[GenAiTypes.Content] = [
+                 GenAiTypes.Content(role='user', parts=[GenAiTypes.Part(text=system_prompt)]),
+                 GenAiTypes.Content(role='model', parts=[GenAiTypes.Part(text="Understood. I am ready to simulate activity on the QuillPad blog platform using the provided API tools. I will manage user sessions by logging users in before they perform actions and logging the results.")])
             ]
+            self.__history = ChatHistoryManager(
+                primer, token_budget=history_token_budget,
+                summarizer=self._summarize_history, snapshot_file=history_file
+            )
+            self.__history.load_snapshot()
 
             log.info(f"QuillpadAgent initialized with model: {self.__model_id}, temperature: {model_temperature}")
             self._initial_admin_login()
@@ -462,10 +826,11 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
             logged_in_ids = self.__blog.get_logged_in_user_ids()
             system_context = f"Current UTC time: {dt.datetime.utcnow().isoformat()}Z.\nCurrently logged in user IDs (agent state): {logged_in_ids if logged_in_ids else 'None'}."
             user_message = f"{system_context}\n\nPrompt: {prompt}"
+            self.__history.compact() # Only between turns, so tool call/response pairs are never split
             self._add_to_history('user', user_message)
 
             try:
-                response = self._send_chat_message_with_retry(self.__chat_history)
+                response = self._send_chat_message_with_retry(self.__history.as_list())
                 log.debug("Raw model response received.")
                 model_content_obj = response.candidates[0].content
                 self._add_to_history('model', model_content_obj)
@@ -479,8 +844,9 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
                 else:
                      log.warning("Model did not provide a final text response after processing tool calls.")
                      last_model_part_repr = 'N/A'
-                     if self.__chat_history and self.__chat_history[-1]['role'] == 'model':
-                         try: last_model_part_repr = repr(self.__chat_history[-1]['parts'][0]) if self.__chat_history[-1]['parts'] else 'Empty Parts'
+                     entries = self.__history.entries
+                     if entries and entries[-1].role == 'model':
+                         try: last_model_part_repr = repr(entries[-1].parts[0]) if entries[-1].parts else 'Empty Parts'
                          except Exception: last_model_part_repr = '(Error getting representation)'
                      self._log_action(f"WARNING: No final text response from model. Last model part: {last_model_part_repr}")
 
@@ -488,6 +854,8 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
                 log.exception(f"An error occurred during agent action processing: {e}")
                 self._log_action(f"ERROR: An unexpected error occurred during agent turn: {e}")
                 self._handle_chat_error()
+            finally:
+                self.__history.save_snapshot()
 
         def _process_function_calls(self, initial_response: GenAiTypes.GenerateContentResponse) -> GenAiTypes.GenerateContentResponse:
             current_response = initial_response
@@ -546,7 +914,7 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
 
                 log.info(f"Sending {len(api_responses)} function response(s) back (End Cycle {cycle_count}).")
                 try:
-                    current_response = self._send_chat_message_with_retry(self.__chat_history)
+                    current_response = self._send_chat_message_with_retry(self.__history.as_list())
                     self._add_to_history('model', current_response.candidates[0].content)
                 except Exception as e:
                      log.exception(f"Error getting next model response after function calls: {e}")
@@ -560,20 +928,17 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
             return current_response
 
 
-        def _send_chat_message_with_retry(self, history: List[Dict], max_retries=3, delay=5):
+        def _send_chat_message_with_retry(self, history: List[GenAiTypes.Content], max_retries=3, delay=5):
+            # History is already normalized by _add_to_history and ends with the message to answer, so the whole
+            # list is sent as-is in one request: no chat session to rebuild and no copy of the earlier turns.
             attempt = 0
             last_exception = None
             while attempt < max_retries:
                 try:
-                    formatted_history = self._prepare_history_for_sdk(history)
-                    log.debug(f"Sending history (len={len(formatted_history)}) to model (Attempt {attempt + 1})...")
-
-                    # Start chat with history excluding the last message/parts
-                    chat = self.__client.start_chat(history=formatted_history[:-1])
-                    last_message_content = formatted_history[-1]['parts'] # Get parts from the last history item
-
-                    response = chat.send_message(
-                         last_message_content,
+                    log.debug(f"Sending history (len={len(history)}) to model (Attempt {attempt + 1})...")
+                    response = self.__client.generate_content(
+                         model=self.__model_id,
+                         contents=history,
                          generation_config=self.__chat_config,
                          tools=[blog_api_tools]
                     )
@@ -602,82 +967,35 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
             raise last_exception or RuntimeError("Unknown error after retries in _send_chat_message_with_retry")
 
 
-        def _prepare_history_for_sdk(self, history: List[Dict]) -> List[Dict]:
-            """Sanitizes history for the Google GenAI SDK."""
-            prepared_history = []
-            for item in history:
-                if not isinstance(item, dict) or 'role' not in item or 'parts' not in item:
-                    log.warning(f"Skipping invalid history item (missing role/parts): {item}")
-                    continue
-
-                role = item['role']
-                parts_raw = item['parts']
-
-                # Ensure 'parts' is a list (or convert Content object)
-                if isinstance(parts_raw, GenAiTypes.Content): # <-- Check for Content obj
-                    parts_list = list(parts_raw.parts)
-                elif not isinstance(parts_raw, list):
-                    log.warning(f"History parts for role '{role}' not list/Content ({type(parts_raw)}), converting.")
-                    if isinstance(parts_raw, str): parts_list = [GenAiTypes.Part(text=parts_raw)] # Use Part()
-                    else: log.error(f"Cannot convert parts for role '{role}'. Skipping item."); continue
-                else:
-                    parts_list = parts_raw # It's already a list
-
-                # Sanitize individual parts
-                sanitized_parts = []
-                for part_raw in parts_list:
-                    # If already a Part object, keep it
-                    if isinstance(part_raw, GenAiTypes.Part):
-                        sanitized_parts.append(part_raw)
-                    # If it's a dict, try creating a Part (basic validation)
-                    elif isinstance(part_raw, dict):
-                        # Check for known part structures before creating blindly
-                        if 'text' in part_raw:
-                             sanitized_parts.append(GenAiTypes.Part(text=str(part_raw['text'])))
-                        elif 'function_call' in part_raw:
-                             # Assume dict structure is correct for FunctionCall
-                             try: sanitized_parts.append(GenAiTypes.Part(function_call=part_raw['function_call']))
-                             except Exception as e: log.warning(f"Could not create Part from function_call dict: {e}, Part: {part_raw}")
-                        elif 'function_response' in part_raw:
-                             # Assume dict structure is correct for FunctionResponse
-                             try: sanitized_parts.append(GenAiTypes.Part(function_response=part_raw['function_response']))
-                             except Exception as e: log.warning(f"Could not create Part from function_response dict: {e}, Part: {part_raw}")
-                        else:
-                             log.warning(f"Skipping unrecognized part dictionary structure: {part_raw}")
-                    # If it's just a string, wrap it
-                    elif isinstance(part_raw, str):
-                        sanitized_parts.append(GenAiTypes.Part(text=part_raw))
-                    else:
-                        log.warning(f"Skipping unrecognized part type ({type(part_raw)}) for role '{role}': {part_raw}")
-
-                if sanitized_parts:
-                    prepared_history.append({'role': role, 'parts': sanitized_parts})
-                else:
-                    log.warning(f"No valid parts for history item role '{role}'. Skipping.")
-
-            return prepared_history
+        def _normalize_part(self, role: str, part_raw: Any) -> Optional[GenAiTypes.Part]:
+            """Converts one raw part (Part, dict or str) to a Part; returns None if unrecognized."""
+            if isinstance(part_raw, GenAiTypes.Part): return part_raw
+            if isinstance(part_raw, str): return GenAiTypes.Part(text=part_raw)
+            if isinstance(part_raw, dict):
+                # Check for known part structures before creating blindly
+                try:
+                    if 'text' in part_raw: return GenAiTypes.Part(text=str(part_raw['text']))
+                    if 'function_call' in part_raw: return GenAiTypes.Part(function_call=part_raw['function_call'])
+                    if 'function_response' in part_raw: return GenAiTypes.Part(function_response=part_raw['function_response'])
+                except Exception as e:
+                    log.warning(f"Could not create Part from dict: {e}, Part: {part_raw}")
+                    return None
+            log.warning(f"Skipping unrecognized part ({type(part_raw)}) for role '{role}': {part_raw}")
+            return None
 
 
         def _add_to_history(self, role: str, content: Any):
-            """Adds content to history, ensuring parts are correctly formatted."""
+            """Normalizes content to an SDK Content once, so sending never has to re-validate old history."""
             parts_to_add: List[GenAiTypes.Part] = []
             if isinstance(content, str):
                 parts_to_add = [GenAiTypes.Part(text=content)]
-            elif isinstance(content, list) and all(isinstance(p, GenAiTypes.Part) for p in content):
-                parts_to_add = content # Already a list of Parts
             elif isinstance(content, GenAiTypes.Content):
                  parts_to_add = list(content.parts) # Extract parts from Content object
-            elif isinstance(content, dict) and 'parts' in content and isinstance(content['parts'], list):
-                 # Handle case where a history-like dict is passed (e.g., from model response)
-                 # Make sure internal parts are actual Part objects if possible
-                 raw_parts = content['parts']
-                 converted_parts = []
-                 for p in raw_parts:
-                      if isinstance(p, GenAiTypes.Part): converted_parts.append(p)
-                      elif isinstance(p, dict) and 'text' in p: converted_parts.append(GenAiTypes.Part(text=str(p['text'])))
-                      # Add more checks for function_call/response dicts if needed
-                      else: log.warning(f"Could not convert part {p} to Part object in _add_to_history."); converted_parts.append(GenAiTypes.Part(text=str(p))) # Fallback
-                 parts_to_add = converted_parts
+            elif isinstance(content, (list, dict)):
+                 # A list of raw parts, or a history-like dict (e.g., from model response)
+                 raw_parts = content.get('parts', []) if isinstance(content, dict) else content
+                 if not isinstance(raw_parts, list): raw_parts = [raw_parts]
+                 parts_to_add = [p for p in (self._normalize_part(role, raw) for raw in raw_parts) if p is not None]
             else:
                  log.warning(f"Unexpected content type ({type(content)}) for role '{role}' in _add_to_history. Converting to string.")
                  parts_to_add = [GenAiTypes.Part(text=str(content))]
@@ -686,10 +1004,22 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
                  log.warning(f"Attempted to add empty parts to history for role '{role}'. Skipping.")
                  return
 
-            self.__chat_history.append({'role': role, 'parts': parts_to_add})
+            self.__history.append(GenAiTypes.Content(role=role, parts=parts_to_add))
             log.debug(f"Added to history: Role='{role}', Parts Count={len(parts_to_add)}")
 
 
+        def _summarize_history(self, previous_summary: str, transcript: str) -> str:
+            """Asks the model to condense old turns; used by ChatHistoryManager when over budget."""
+            prompt = (
+                "Condense the following blog simulation activity into a short factual summary. "
+                "Keep every username, password, user ID, post ID/slug and category you see, "
+                "and note which users are logged in. Reply with the summary only.\n\n"
+                f"Existing summary:\n{previous_summary or '(none)'}\n\nNew activity:\n{transcript}"
+            )
+            response = self.__client.generate_content(model=self.__model_id, contents=prompt, generation_config=self.__chat_config)
+            return self._extract_text_from_response(response)
+
+
         def _extract_text_from_response(self, response: GenAiTypes.GenerateContentResponse) -> str:
             """Safely extracts text from the model's response candidate."""
             try:
@@ -713,24 +1043,24 @@ You will receive periodic prompts to take an action. Respond ONLY with the API t
         def _handle_chat_error(self):
             """Handles errors during chat interaction by trimming history."""
             log.error("Attempting simple history recovery after chat error.")
-            if len(self.__chat_history) >= 2:
+            entries = self.__history.entries # Primer and summary are never trimmed
+            if len(entries) >= 2:
                 # More robust check: ensure last two items are user/model or function/model
-                last_role = self.__chat_history[-1].get('role')
-                second_last_role = self.__chat_history[-2].get('role')
+                last_role = entries[-1].role
+                second_last_role = entries[-2].role
                 if (second_last_role == 'user' and last_role == 'model') or \
                    (second_last_role == 'function' and last_role == 'model'):
                     log.warning("Removing the last exchange (user/func -> model) from history.")
-                    self.__chat_history.pop() # Remove model response
-                    self.__chat_history.pop() # Remove user/function input
+                    self.__history.pop() # Remove model response
+                    self.__history.pop() # Remove user/function input
                 else:
                     log.warning(f"History end roles '{second_last_role}' -> '{last_role}' not standard exchange. Removing just last item.")
-                    self.__chat_history.pop()
-            elif len(self.__chat_history) > 1: # Keep initial system prompt if possible
-                 log.warning("History has only system prompt + one item after error. Removing last item.")
-                 self.__chat_history.pop()
+                    self.__history.pop()
+            elif entries:
+                 log.warning("History has only the primer + one item after error. Removing last item.")
+                 self.__history.pop()
             else: log.error("Chat history too short or structure unrecognizable. Cannot trim.")
-
-""")
+''')
 
 # Indentation fixed for api_desc.py (Should be okay)
 api_desc_py_content = dedent(r"""
@@ -960,6 +1290,8 @@ runner_py_content = dedent(r"""
     MODEL_NAME = os.getenv("MODEL_NAME", "gemini-1.5-flash-latest")
     MODEL_TEMPERATURE = float(os.getenv("MODEL_TEMPRATURE", "0.8"))
     AGENT_LOG_FILE = "agent_activity.log"
+    HISTORY_SNAPSHOT_FILE = "agent_history.json"
+    HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "24000"))
     PRINT_LOG_TO_CONSOLE = True
     LOG_LEVEL_STR = os.getenv('LOG_LEVEL', 'INFO').upper()
     LOG_LEVEL = getattr(logging, LOG_LEVEL_STR, logging.INFO)
@@ -999,7 +1331,8 @@ runner_py_content = dedent(r"""
             self.__agent = QuillpadAgent(
                 blog_instance=self.__blog_api, api_key=API_KEY, model_id=MODEL_NAME,
                 admin_credentials=self.__admin_credentials, model_temperature=MODEL_TEMPERATURE,
-                log_file=AGENT_LOG_FILE, print_log=PRINT_LOG_TO_CONSOLE
+                log_file=AGENT_LOG_FILE, print_log=PRINT_LOG_TO_CONSOLE,
+                history_token_budget=HISTORY_TOKEN_BUDGET, history_file=HISTORY_SNAPSHOT_FILE
             )
 
         def start(self):
@@ -1099,9 +1432,11 @@ requirements_txt_content = dedent("""
 file_map = {
     ".env": env_content,
     "api.py": api_py_content,
+    "history.py": history_py_content,
     "agent.py": agent_py_content,
     "api_desc.py": api_desc_py_content,
     "runner.py": runner_py_content,
+    "bench_history.py": bench_history_py_content,
     "requirements.txt": requirements_txt_content,
     "agent_activity.log": f"--- Log Initialized: {datetime.datetime.now().isoformat()} ---\n",
 }
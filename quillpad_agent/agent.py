@@ -45,6 +45,8 @@ class QuillpadAgent:
         "user_post_comment": self.__blog.user_post_comment,
         "user_reply_comment": self.__blog.user_reply_comment,
         "user_like_post": self.__blog.user_like_post,
+        "user_post_comments": self.__blog.user_post_comments,
+        "user_like_posts": self.__blog.user_like_posts,
         "get_post_details": self.__blog.get_post_details,
      "get_post_comments": self.__blog.get_post_comments,
      }
@@ -61,7 +63,7 @@ class QuillpadAgent:
             config=self.__chat_config,
         )
 
-        admin_user_exists = any(user.username == admin_user.username for user in self.__blog.users)
+        admin_user_exists = self.__blog.users.get_by_username(admin_user.username) is not None
         if not admin_user_exists:
             self.__blog.add_user(admin_user)
         self.send_msg(self.system_message(f"Blog agent system launched.\nAdmin info{str(asdict(admin_user))}\nWhat action to take?"))
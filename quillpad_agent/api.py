@@ -1,11 +1,21 @@
 from __future__ import annotations
 from dataclasses import dataclass, asdict, field
-from typing import Dict, Any, List, Optional, Union
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 
 import requests
 import json
 import random
 import os
+import logging
+import email.utils
+import datetime as dt
+import shutil
+import threading
+
+log = logging.getLogger("BlogApi")
+
+# Mirrors BULK_MAX_ITEMS in the backend's blog/views.py
+BULK_MAX_ITEMS = 100
 
 
 @dataclass
@@ -42,12 +52,29 @@ class Comment:
     replies:list[Comment] = field(default_factory=lambda: [])
 
 
+def parse_retry_after(value:Optional[str], default:float = 1.0) -> float:
+    """Seconds to wait from a Retry-After header, given as delay-seconds or an HTTP-date."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=dt.timezone.utc) # "-0000" dates parse as naive UTC
+    return max(0.0, (retry_at - dt.datetime.now(dt.timezone.utc)).total_seconds())
+
+
 def api_request(
     session: requests.Session,
     api_base_url: str,
     method: str,
     endpoint: str,
-    data: Optional[Dict[str, Any]] = None,
+    data: Optional[Dict[str, Any] | List[Any]] = None,
     files: Optional[Dict[str, Any]] = None,
     require_auth: bool = False,
     current_auth_token: Optional[str] = None
@@ -98,6 +125,9 @@ def api_request(
         else:
             response_info["success"] = False
             response_info["error"] = f"HTTP Error {response.status_code}"
+            if response.status_code == 429:
+                # Throttled: the backend says how long to back off for
+                response_info["retry_after"] = parse_retry_after(response.headers.get("Retry-After"))
             try:
                 error_data: Union[Dict, List, str] = response.json()
                 response_info["data"] = error_data
@@ -113,14 +143,189 @@ def api_request(
     return response_info
 
 
+class UserRegistry:
+    """Locally known users, indexed by id, username and email so lookups and duplicate checks are O(1)."""
+
+    def __init__(self, users:Iterable[UserInfo] = ()) -> None:
+        self.__lock = threading.RLock()
+        self.__by_id:Dict[int, UserInfo] = {}
+        self.__by_username:Dict[str, UserInfo] = {}
+        self.__by_email:Dict[str, UserInfo] = {}
+        for user in users:
+            self.add(user)
+
+    def __len__(self) -> int:
+        return len(self.__by_id)
+
+    def __iter__(self) -> Iterator[UserInfo]:
+        with self.__lock:
+            return iter(list(self.__by_id.values()))
+
+    def get(self, user_id:int) -> Optional[UserInfo]:
+        return self.__by_id.get(user_id)
+
+    def get_by_username(self, username:str) -> Optional[UserInfo]:
+        return self.__by_username.get(username)
+
+    def get_by_email(self, email:str) -> Optional[UserInfo]:
+        return self.__by_email.get(email)
+
+    def conflict(self, user_id:int|None = None, username:str|None = None, email:str|None = None) -> Optional[str]:
+        """Returns the name of the first field that is already taken, or None."""
+        if user_id is not None and user_id in self.__by_id:
+            return "id"
+        if username is not None and username in self.__by_username:
+            return "username"
+        if email and email in self.__by_email:
+            return "email"
+        return None
+
+    def add(self, user:UserInfo) -> bool:
+        """Adds the user to every index, or to none of them if any key is taken."""
+        with self.__lock:
+            if self.conflict(user.id, user.username, user.email):
+                return False
+            self.__by_id[user.id] = user
+            self.__by_username[user.username] = user
+            if user.email:
+                self.__by_email[user.email] = user
+            return True
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__by_id.clear()
+            self.__by_username.clear()
+            self.__by_email.clear()
+
+
+class UserStore:
+    """
+    Append-only JSONL journal of local users and their cached auth tokens.
+
+    Each new user or token change is one appended, fsync'd line, so a write costs
+    the same at any population. A crash can at worst leave a torn last line, which load() drops.
+    The journal is rewritten to one line per live user/token (atomically, through
+    a temp file and os.replace) once stale records outnumber live ones.
+    """
+
+    def __init__(self, file_path:str = "users.jsonl", legacy_path:Optional[str] = "users.json", compact_min_records:int = 1000) -> None:
+        self.__file_path = file_path
+        self.__legacy_path = legacy_path
+        self.__compact_min_records = compact_min_records
+        self.__records = 0
+        self.__lock = threading.Lock()
+
+    @property
+    def file_path(self) -> str:
+        return self.__file_path
+
+    def load(self) -> Tuple[List[Dict[str, Any]], Dict[int, UserAuth]]:
+        """Replays the journal; returns the live user records (oldest first) and cached tokens by user id."""
+        if not os.path.exists(self.__file_path):
+            return self._import_legacy(), {}
+
+        users:Dict[int, Dict[str, Any]] = {}
+        tokens:Dict[int, UserAuth] = {}
+        records = 0
+        corrupt = 0
+        torn = False
+        with open(self.__file_path, 'rb') as fp:
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    torn = True # Torn write from a crash; only ever the last line
+                    break
+                try:
+                    record = json.loads(line)
+                    self._apply(users, tokens, record)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    corrupt += 1 # Skip it; the records after it are still good
+                    log.warning(f"Skipping corrupt record in '{self.__file_path}': {e}")
+                    continue
+                records += 1
+
+        if torn or corrupt:
+            # Keep the damaged journal for inspection, then rewrite it from what was readable
+            backup_path = f"{self.__file_path}.bak"
+            shutil.copy2(self.__file_path, backup_path)
+            log.warning(f"Repairing '{self.__file_path}' ({corrupt} corrupt record(s){', torn last line' if torn else ''}); original saved to '{backup_path}'.")
+            self.rewrite(list(users.values()), list(tokens.values()))
+        else:
+            self.__records = records
+        return list(users.values()), tokens
+
+    def _apply(self, users:Dict[int, Dict[str, Any]], tokens:Dict[int, UserAuth], record:Dict[str, Any]) -> None:
+        op = record.get("op")
+        if op == "add" and isinstance(record.get("user"), dict):
+            users[record["user"]["id"]] = record["user"]
+        elif op == "auth" and record.get("token"):
+            tokens[record["id"]] = UserAuth(id=record["id"], token=record["token"])
+        elif op == "logout":
+            tokens.pop(record.get("id"), None)
+
+    def _import_legacy(self) -> List[Dict[str, Any]]:
+        if not self.__legacy_path or not os.path.exists(self.__legacy_path):
+            return []
+        with open(self.__legacy_path, 'r') as fp:
+            users_data = [u for u in json.load(fp) if isinstance(u, dict)]
+        self.rewrite(users_data)
+        return users_data
+
+    def _append(self, record:Dict[str, Any]) -> None:
+        line = json.dumps(record, separators=(',', ':')) + "\n"
+        with self.__lock:
+            with open(self.__file_path, 'a', encoding='utf-8') as fp:
+                fp.write(line)
+                fp.flush()
+                os.fsync(fp.fileno())
+            self.__records += 1
+
+    def append(self, user:UserInfo) -> None:
+        self._append({"op": "add", "user": asdict(user)})
+
+    def save_auth(self, user_id:int, auth:Optional[UserAuth]) -> None:
+        if auth is None:
+            self._append({"op": "logout", "id": user_id})
+        else:
+            self._append({"op": "auth", "id": user_id, "token": auth.token})
+
+    def needs_compaction(self, live_count:int) -> bool:
+        return self.__records > max(self.__compact_min_records, 2 * live_count)
+
+    def rewrite(self, users:Iterable[Dict[str, Any]], tokens:Iterable[UserAuth] = ()) -> None:
+        """Replaces the journal with one record per user and token. Readers never see a partial file."""
+        tmp_path = f"{self.__file_path}.tmp"
+        with self.__lock:
+            records = 0
+            with open(tmp_path, 'w', encoding='utf-8') as fp:
+                for user in users:
+                    fp.write(json.dumps({"op": "add", "user": user}, separators=(',', ':')) + "\n")
+                    records += 1
+                for auth in tokens:
+                    fp.write(json.dumps({"op": "auth", "id": auth.id, "token": auth.token}, separators=(',', ':')) + "\n")
+                    records += 1
+                fp.flush()
+                os.fsync(fp.fileno())
+            os.replace(tmp_path, self.__file_path)
+            self.__records = records
+
+
 class UserSession:
     __api_url = ""
 
-    def __init__(self, info:UserInfo, api_url:str) -> None:
+    def __init__(
+        self,
+        info:UserInfo,
+        api_url:str,
+        session:Optional[requests.Session] = None,
+        auth:Optional[UserAuth] = None,
+        on_auth_change:Optional[Callable[[int, Optional[UserAuth]], None]] = None
+    ) -> None:
         self.__api_url = api_url
         self.__info:UserInfo = info
-        self.__session:requests.Session = requests.Session()
-        self.__auth:UserAuth | None = None
+        self.__session:requests.Session = session or requests.Session()
+        # A cached token is trusted until the server rejects it (see _auth_request)
+        self.__auth:UserAuth | None = auth
+        self.__on_auth_change = on_auth_change
 
 
     @property
@@ -135,6 +340,32 @@ class UserSession:
     def is_logged_in(self) -> bool:
         return self.__auth is not None
 
+    def _set_auth(self, auth:Optional[UserAuth]) -> None:
+        changed = (auth.token if auth else None) != (self.__auth.token if self.__auth else None)
+        self.__auth = auth
+        if changed and self.__on_auth_change:
+            self.__on_auth_change(self.user_id, auth)
+
+    def _auth_request(self, method:str, endpoint:str, data:Optional[Dict[str, Any] | List[Any]] = None, files:Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Authenticated request; on 401 the token is refreshed by logging in again and the request retried once."""
+        token = self.__auth.token if self.__auth else None
+        response_info = api_request(
+            self.__session, self.__api_url, method, endpoint,
+            data=data, files=files, require_auth=True, current_auth_token=token
+        )
+        if response_info["status"] != 401:
+            return response_info
+
+        self._set_auth(None)
+        if not self.login().get("success") or not self.__auth:
+            return response_info
+        for _, file_handle in (files or {}).values():
+            file_handle.seek(0)
+        return api_request(
+            self.__session, self.__api_url, method, endpoint,
+            data=data, files=files, require_auth=True, current_auth_token=self.__auth.token
+        )
+
 
     def login(self) -> dict:
         result = {"username": self.username}
@@ -151,12 +382,12 @@ class UserSession:
         if response_info["success"] and isinstance(response_info["data"], dict):
             data = response_info["data"]
             if 'token' in data and 'user_id' in data:
-                self.__auth = UserAuth(id=data['user_id'], token=data['token'])
+                self._set_auth(UserAuth(id=data['user_id'], token=data['token']))
                 result["status"] = "logged in"
                 result["success"] = True
                 return result
 
-        self.__auth = None
+        self._set_auth(None)
         result.update({
             "status": "failed",
             "success": False,
@@ -177,7 +408,7 @@ class UserSession:
             require_auth=True, current_auth_token=self.__auth.token
         )
         success = response_info["success"] or response_info["status"] == 401
-        self.__auth = None
+        self._set_auth(None)
 
         if success:
             result["status"] = "logged out"
@@ -217,12 +448,10 @@ class UserSession:
                 if file_handle: file_handle.close()
                 return {"success": False, "error": f"Could not open image file: {e}", "data": None}
 
-        response_info = api_request(
-            self.__session, self.__api_url, "POST", "/posts/",
+        response_info = self._auth_request(
+            "POST", "/posts/",
             data=post_data,
-            files=files if file_handle else None,
-            require_auth=True,
-            current_auth_token=self.__auth.token
+            files=files if file_handle else None
         )
 
         if file_handle:
@@ -244,10 +473,7 @@ class UserSession:
             "content": content,
             "parent": None
         }
-        response_info = api_request(
-            self.__session, self.__api_url, "POST", "/comments/",
-            data=comment_data, require_auth=True, current_auth_token=self.__auth.token
-        )
+        response_info = self._auth_request("POST", "/comments/", data=comment_data)
         return {
             "success": response_info["success"],
             "data": response_info["data"],
@@ -263,10 +489,7 @@ class UserSession:
             "content": content,
             "parent": parent_comment_id
         }
-        response_info = api_request(
-            self.__session, self.__api_url, "POST", "/comments/",
-            data=reply_data, require_auth=True, current_auth_token=self.__auth.token
-        )
+        response_info = self._auth_request("POST", "/comments/", data=reply_data)
 
         return {
             "success": response_info["success"],
@@ -278,10 +501,7 @@ class UserSession:
         if not self.is_logged_in or not self.__auth:
             return {"success": False, "error": "User not logged in", "data": None}
 
-        response_info = api_request(
-            self.__session, self.__api_url, "POST", f"/posts/{post_slug}/like/",
-            require_auth=True, current_auth_token=self.__auth.token
-        )
+        response_info = self._auth_request("POST", f"/posts/{post_slug}/like/")
 
         return {
             "success": response_info["success"],
@@ -289,16 +509,54 @@ class UserSession:
             "error": response_info["error"] if not response_info["success"] else None
         }
 
+    def _bulk_request(self, endpoint: str, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # The server caps a batch at BULK_MAX_ITEMS; larger lists are sent in chunks
+        # and the per-item results are stitched back together in order.
+        results: List[Any] = []
+        for start in range(0, len(items), BULK_MAX_ITEMS):
+            response_info = self._auth_request("POST", endpoint, data=items[start:start + BULK_MAX_ITEMS])
+            if not response_info["success"]:
+                return {
+                    "success": False,
+                    "data": {"results": results, "failed_chunk": response_info["data"]},
+                    "error": response_info["error"]
+                }
+            for item in (response_info["data"] or {}).get("results", []):
+                item["index"] = item.get("index", 0) + start
+                results.append(item)
+
+        return {"success": True, "data": {"results": results}, "error": None}
+
+    def post_comments(self, comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if not self.is_logged_in or not self.__auth:
+            return {"success": False, "error": "User not logged in", "data": None}
+
+        items = [
+            {"post": comment["post_id"], "content": comment["content"], "parent": comment.get("parent_comment_id")}
+            for comment in comments
+        ]
+        result = self._bulk_request("/comments/bulk/", items)
+        if result["success"]:
+            result["data"]["created"] = sum(1 for item in result["data"]["results"] if item.get("success"))
+        return result
+
+    def like_posts(self, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if not self.is_logged_in or not self.__auth:
+            return {"success": False, "error": "User not logged in", "data": None}
+
+        items = [
+            {"post": operation["post_slug"], "action": operation.get("action", "toggle")}
+            for operation in operations
+        ]
+        return self._bulk_request("/posts/bulk_like/", items)
+
     def get_post_comments(self, post_id: int) -> Dict[str, Any]:
-        token = self.__auth.token if self.is_logged_in and self.__auth else None
-        use_auth = self.is_logged_in
         endpoint = f"/comments/by_post/?post_id={post_id}"
 
-        response_info = api_request(
-            self.__session, self.__api_url, "GET", endpoint,
-            require_auth=use_auth,
-            current_auth_token=token
-        )
+        if self.is_logged_in:
+            response_info = self._auth_request("GET", endpoint)
+        else:
+            response_info = api_request(self.__session, self.__api_url, "GET", endpoint)
 
         if response_info["success"] and not isinstance(response_info["data"], list):
              return {
@@ -318,10 +576,7 @@ class UserSession:
              return {"success": False, "error": "User not logged in", "data": None}
 
          category_data = {"name": category_name}
-         response_info = api_request(
-             self.__session, self.__api_url, "POST", "/categories/",
-             data=category_data, require_auth=True, current_auth_token=self.__auth.token
-         )
+         response_info = self._auth_request("POST", "/categories/", data=category_data)
 
          return {
              "success": response_info["success"],
@@ -332,15 +587,21 @@ class UserSession:
 
 class BlogApi:
 
-    def __init__(self, base_url:str = "http://localhost:8000/api"):
+    def __init__(self, base_url:str = "http://localhost:8000/api", users_file:str = "users.jsonl"):
         self.__api_url = base_url
         self.__session = requests.Session()
         self.__user_sessions:Dict[int, UserSession] = {}
-        self.__users:List[UserInfo] = []
-        self.load_users()
+        self.__store = UserStore(users_file)
+        self.__users:Optional[UserRegistry] = None # Loaded from the store on first use
+        self.__tokens:Dict[int, UserAuth] = {}
 
     @property
-    def users(self):
+    def users(self) -> UserRegistry:
+        if self.__users is None:
+            error = self.load_users()
+            if error:
+                log.error(error)
+        assert self.__users is not None
         return self.__users
 
 
@@ -356,15 +617,16 @@ class BlogApi:
         }
 
     def list_users(self):
-            return [asdict(user) for user in self.__users]
+            return [asdict(user) for user in self.users]
 
     def register(self, username:str, email:str, password:str):
         result:dict[Any,Any] = {"status_msg": ""}
         #user_id = random.randint(1000000,9999999)
-        if any(u.username == username for u in self.__users):
+        conflict = self.users.conflict(username=username, email=email)
+        if conflict == "username":
             result["status_msg"] += " user already exists. "
             return result
-        if any(u.email == email for u in self.__users):
+        if conflict == "email":
                 result["status_msg"] = "email already exists"
                 return result
 
@@ -383,11 +645,9 @@ class BlogApi:
                     email=user_data.get('email', email)
                 )
 
-                self.__users.append(new_user_info)
-                self.save_users()
-
-                user_session = UserSession(new_user_info, self.__api_url)
-                self.__user_sessions[new_user_info.id] = user_session
+                if self.users.add(new_user_info):
+                    self._persist_user(new_user_info)
+                    self.__user_sessions[new_user_info.id] = self._new_session(new_user_info)
 
                 result.update({
                     "status_msg": "user created",
@@ -471,6 +731,19 @@ class BlogApi:
         return user_session.like(post_slug=post_slug)
 
 
+    def user_post_comments(self, user_id: int, comments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        user_session = self.get_user_session(user_id=user_id)
+        if user_session is None:
+            return {"success": False, "error": f"User with ID {user_id} not found locally", "data": None}
+        return user_session.post_comments(comments=comments)
+
+    def user_like_posts(self, user_id: int, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        user_session = self.get_user_session(user_id=user_id)
+        if user_session is None:
+            return {"success": False, "error": f"User with ID {user_id} not found locally", "data": None}
+        return user_session.like_posts(operations=operations)
+
+
     def get_post_details(self, post_slug: str) -> Dict[str, Any]:
         response_info = api_request(
             self.__session, self.__api_url, "GET", f"/posts/{post_slug}/",
@@ -523,26 +796,54 @@ class BlogApi:
     def get_user_session(self, user_id:int|None = None, username: str|None = None) -> Optional[UserSession]:
         user_info: Optional[UserInfo] = None
         if username is not None:
-            user_info = next((u for u in self.__users if u.username == username), None)
+            user_info = self.users.get_by_username(username)
         elif user_id is not None:
             # Check loaded sessions first
             if user_id in self.__user_sessions:
                 return self.__user_sessions[user_id]
             # Check persistent user list if not in active sessions
-            user_info = next((u for u in self.__users if u.id == user_id), None)
+            user_info = self.users.get(user_id)
 
         if not user_info:
             return None
 
         # Create session if user exists but session wasn't loaded/created yet
         if user_info.id not in self.__user_sessions:
-             self.__user_sessions[user_info.id] = UserSession(user_info, self.__api_url, self.__session)
+             self.__user_sessions[user_info.id] = self._new_session(user_info)
         return self.__user_sessions[user_info.id]
 
-    def save_users(self, file_path:str = "users.json") -> Optional[str]:
+    def _new_session(self, user_info:UserInfo) -> UserSession:
+        # Reuse the token cached from a previous run instead of logging in again
+        return UserSession(
+            user_info, self.__api_url, self.__session,
+            auth=self.__tokens.get(user_info.id), on_auth_change=self._save_auth
+        )
+
+    def _save_auth(self, user_id:int, auth:Optional[UserAuth]) -> None:
+        if auth is None:
+            self.__tokens.pop(user_id, None)
+        else:
+            self.__tokens[user_id] = auth
+        try:
+            self.__store.save_auth(user_id, auth)
+            if self.__store.needs_compaction(len(self.users) + len(self.__tokens)):
+                self.save_users()
+        except IOError as e:
+            log.error(f"IOError saving auth token: {e}")
+
+    def _persist_user(self, user_info:UserInfo) -> Optional[str]:
+        try:
+            self.__store.append(user_info)
+            if self.__store.needs_compaction(len(self.users) + len(self.__tokens)):
+                return self.save_users()
+            return None
+        except IOError as e:
+            return f"IOError saving user: {e}"
+
+    def save_users(self) -> Optional[str]:
+        """Compacts the user journal to one record per known user and cached token."""
         try:
-            with open(file_path, 'w') as fp:
-                json.dump([asdict(user) for user in self.__users], fp, indent=4)
+            self.__store.rewrite((asdict(user) for user in self.users), list(self.__tokens.values()))
             return None
         except IOError as e:
             return f"IOError saving users: {e}"
@@ -550,31 +851,26 @@ class BlogApi:
              return f"TypeError saving users: {e}"
 
 
-    def load_users(self, file_path:str = "users.json") -> Optional[str]:
-        if not os.path.exists(file_path):
-            self.__users = []
-            return None
-
+    def load_users(self) -> Optional[str]:
+        # Sessions are created on demand by get_user_session
+        self.__user_sessions = {}
         try:
-            with open(file_path, 'r') as fp:
-                users_data = json.load(fp)
-                self.__users = [UserInfo(**user_data) for user_data in users_data if isinstance(user_data, dict)]
-            self.__user_sessions = {user.id: UserSession(user, self.__api_url, self.__session) for user in self.__users}
+            users_data, self.__tokens = self.__store.load()
+            self.__users = UserRegistry(UserInfo(**user_data) for user_data in users_data)
             return None
         except (IOError, json.JSONDecodeError) as e:
-            self.__users = []
-            self.__user_sessions = {}
+            self.__users = UserRegistry()
+            self.__tokens = {}
             return f"Error loading users: {e}"
         except TypeError as e:
-            self.__users = []
-            self.__user_sessions = {}
+            self.__users = UserRegistry()
+            self.__tokens = {}
             return f"Data structure error loading users: {e}"
 
 
     def add_user(self, user_info:UserInfo):
-        if any(u.id == user_info.id for u in self.__users):
+        if not self.users.add(user_info):
              return
-        self.__users.append(user_info)
-        self.save_users()
+        self._persist_user(user_info)
         if user_info.id not in self.__user_sessions:
-            self.__user_sessions[user_info.id] = UserSession(user_info, self.__api_url)
\ No newline at end of file
+            self.__user_sessions[user_info.id] = self._new_session(user_info)
@@ -2,7 +2,7 @@ from google.genai import types
 
 list_posts_function = types.FunctionDeclaration(
     name="list_posts",
-    description="Retrieves a list of blog posts from the API. Can specify the number of posts to retrieve and an offset for pagination.",
+    description="Retrieves a list of blog posts from the API. Can specify the number of posts to retrieve and an offset for pagination. Each post carries a short plain-text excerpt instead of its full content; use get_post_details for the content.",
     parameters={
         "type": "OBJECT",
         "properties": {
@@ -213,6 +213,76 @@ user_like_post_function = types.FunctionDeclaration(
     }
 )
 
+user_post_comments_function = types.FunctionDeclaration(
+    name="user_post_comments",
+    description="Posts several comments or replies in a single batched request for a logged-in user. Each item reports its own success or validation errors.",
+    parameters={
+        "type": "OBJECT",
+        "properties": {
+            "user_id": {
+                "type": "INTEGER",
+                "description": "The ID of the user posting the comments. Must be logged in."
+            },
+            "comments": {
+                "type": "ARRAY",
+                "description": "The comments to post, in order.",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "post_id": {
+                            "type": "INTEGER",
+                            "description": "The ID of the post to comment on."
+                        },
+                        "content": {
+                            "type": "STRING",
+                            "description": "The content of the comment."
+                        },
+                        "parent_comment_id": {
+                            "type": "INTEGER",
+                            "description": "Optional ID of an existing comment on the same post to reply to."
+                        }
+                    },
+                    "required": ["post_id", "content"]
+                }
+            }
+        },
+        "required": ["user_id", "comments"]
+    }
+)
+
+user_like_posts_function = types.FunctionDeclaration(
+    name="user_like_posts",
+    description="Likes, unlikes or toggles several blog posts in a single batched request for a logged-in user.",
+    parameters={
+        "type": "OBJECT",
+        "properties": {
+            "user_id": {
+                "type": "INTEGER",
+                "description": "The ID of the user liking/unliking the posts. Must be logged in."
+            },
+            "operations": {
+                "type": "ARRAY",
+                "description": "The like operations to apply, in order.",
+                "items": {
+                    "type": "OBJECT",
+                    "properties": {
+                        "post_slug": {
+                            "type": "STRING",
+                            "description": "The slug of the post."
+                        },
+                        "action": {
+                            "type": "STRING",
+                            "description": "One of 'like', 'unlike' or 'toggle'. Defaults to 'toggle'."
+                        }
+                    },
+                    "required": ["post_slug"]
+                }
+            }
+        },
+        "required": ["user_id", "operations"]
+    }
+)
+
 get_post_details_function = types.FunctionDeclaration(
     name="get_post_details",
     description="Retrieves the full details of a specific blog post using its slug.",
@@ -294,6 +364,8 @@ blog_api_tools = types.Tool(
         user_post_comment_function,
         user_reply_comment_function,
         user_like_post_function,
+        user_post_comments_function,
+        user_like_posts_function,
         get_post_details_function,
         get_post_comments_function,
         list_categories_function,
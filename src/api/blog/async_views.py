@@ -0,0 +1,137 @@
+"""Async-native versions of the hot read paths, served without a worker thread under ASGI.
+
+DRF views are synchronous, so these are plain async Django views mounted in front of the router
+for GET/HEAD only; every other method is handed to the regular viewset, so writes, permissions and
+throttling are unchanged. Responses match the DRF ones: querysets are filtered through the
+viewset's own filter backends, rows are fetched with the async ORM (aiterator/aget/acount) with
+everything the serializers touch prefetched, and the serializers then run purely in memory.
+"""
+import functools
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.db.models import Count
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.request import Request
+from rest_framework.throttling import BaseThrottle
+from taggit.models import Tag
+
+from .models import Post, Comment
+from .serializers import PostSerializer, CommentSerializer, TagSerializer
+from .stats import aget_platform_stats
+from .views import PostViewSet, CommentViewSet, TagViewSet
+from quillpad_backend.fastjson import render_json
+from quillpad_backend.throttling import get_bucket_store, take
+
+SAFE_READS = ('GET', 'HEAD')
+
+_post_list = PostViewSet.as_view({'get': 'list', 'post': 'create'})
+_post_detail = PostViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'})
+_comments_by_post = CommentViewSet.as_view({'get': 'by_post'})
+_popular_tags = TagViewSet.as_view({'get': 'popular'})
+_post_stats = PostViewSet.as_view({'get': 'stats'})
+
+
+def _json(data, status=200):
+    return HttpResponse(render_json(data), status=status, content_type='application/json')  # same bytes as the DRF views
+
+
+def _viewset(viewset_class, request, action, **kwargs):
+    view = viewset_class(action=action, kwargs=kwargs, format_kwarg=None)
+    view.request = Request(request)
+    return view
+
+
+async def _delegate(sync_view, request, **kwargs):
+    return await sync_to_async(sync_view)(request, **kwargs)
+
+
+def read_throttled(view):
+    """Applies the per-IP 'read' bucket to GET/HEAD (requests aren't authenticated here, so not the per-user one)."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_READS:
+            ident = BaseThrottle().get_ident(request)
+            wait = take('read', ident, request) if get_bucket_store().is_local else await sync_to_async(take)('read', ident, request)
+            if wait:
+                response = _json({'detail': f'Request was throttled. Expected available in {math.ceil(wait)} seconds.'}, status=429)
+                response['Retry-After'] = str(math.ceil(wait))
+                return response
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@csrf_exempt
+@read_throttled
+async def post_list(request):
+    if request.method not in SAFE_READS: return await _delegate(_post_list, request)
+    view = _viewset(PostViewSet, request, 'list')
+    fields = view.sparse_fields()
+    # get_queryset() joins, prefetches, annotates comment totals and (given ?fields=/?omit=) narrows the columns for the serializer
+    queryset = await sync_to_async(view.filter_queryset)(view.get_queryset())
+
+    paginator = view.paginator
+    paginator.request, paginator.limit = view.request, paginator.get_limit(view.request)
+    paginator.offset = paginator.get_offset(view.request)
+    paginator.count = await queryset.acount()
+    window = queryset[paginator.offset:paginator.offset + paginator.limit]
+    reader = view.fast_reader()
+    if reader is not None:
+        data = await reader.aread([row async for row in reader.values(window).aiterator(chunk_size=paginator.limit)], view.request)
+    else:
+        posts = [post async for post in window.aiterator(chunk_size=paginator.limit)]  # comment totals are annotated by get_queryset()
+        data = view.get_serializer_class()(posts, many=True, context={'request': request}, fields=fields).data
+    return _json(paginator.get_paginated_response(data).data)
+
+
+@csrf_exempt
+@read_throttled
+async def post_detail(request, slug):
+    if request.method not in SAFE_READS: return await _delegate(_post_detail, request, slug=slug)
+    view = _viewset(PostViewSet, request, 'retrieve', slug=slug)
+    fields = view.sparse_fields()
+    try:
+        post = await view.get_queryset().aget(slug=slug)
+    except Post.DoesNotExist:
+        return _json({'detail': 'No Post matches the given query.'}, status=404)
+    return _json(PostSerializer(post, context={'request': request}, fields=fields).data)
+
+
+@csrf_exempt
+@read_throttled
+async def comments_by_post(request):
+    if request.method not in SAFE_READS: return await _delegate(_comments_by_post, request)
+    post_id = request.GET.get('post_id')
+    if not post_id: return _json({'error': 'post_id parameter is required'}, status=400)
+
+    view = _viewset(CommentViewSet, request, 'by_post')
+    fields, reader = view.sparse_fields(), view.fast_reader()
+    if reader is not None:
+        queryset = reader.values(Comment.objects.filter(post_id=post_id).order_by('-created_at'))
+        return _json(await reader.aread([row async for row in queryset.aiterator()], view.request))
+
+    # One query for the whole thread; replies are wired up in memory so the recursive serializer never queries
+    comments = [c async for c in CommentSerializer.prepare_queryset(Comment.objects.filter(post_id=post_id), fields).order_by('-created_at').aiterator()]
+    if fields is None or 'replies' in fields:
+        children = {}
+        for comment in sorted(comments, key=lambda c: c.id):  # replies come back in insertion order, as Comment has no Meta.ordering
+            children.setdefault(comment.parent_id, []).append(comment)
+        for comment in comments:
+            comment._prefetched_objects_cache = {'replies': children.get(comment.id, [])}
+    return _json(CommentSerializer(comments, many=True, context={'request': request}, fields=fields).data)
+
+
+@csrf_exempt
+@read_throttled
+async def popular_tags(request):
+    if request.method not in SAFE_READS: return await _delegate(_popular_tags, request)
+    tags = [tag async for tag in Tag.objects.annotate(post_count=Count('taggit_taggeditem_items')).order_by('-post_count')[:10].aiterator()]
+    return _json(TagSerializer(tags, many=True).data)
+
+
+@csrf_exempt
+@read_throttled
+async def post_stats(request):
+    if request.method not in SAFE_READS: return await _delegate(_post_stats, request)
+    return _json(await aget_platform_stats())
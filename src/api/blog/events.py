@@ -0,0 +1,144 @@
+"""Live post events (new comments, like counts) for the Server-Sent Events endpoint.
+
+Subscribers are asyncio queues living on the ASGI event loop; publishers are ordinary sync views
+running in worker threads, so delivery goes through `loop.call_soon_threadsafe`. Each event is
+encoded to an SSE frame once at publish time and the same bytes are handed to every subscriber.
+A slow subscriber's queue is bounded: when it is full the oldest frame is dropped.
+
+The in-process LocalBroker only reaches subscribers in the same process. With EVENTS_REDIS_URL set
+(and the optional `redis` package installed) publishes go through Redis pub/sub and every process
+relays them into its own LocalBroker, so several workers share one stream.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL_PREFIX = 'quillpad:events:'
+
+
+def encode_frame(event_id, event_type, data):
+    payload = json.dumps(data, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class Subscription:
+    __slots__ = ('channel', 'queue', 'loop', 'dropped', '_broker')
+
+    def __init__(self, broker, channel, loop, queue_size):
+        self._broker, self.channel, self.loop = broker, channel, loop
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    def deliver(self, frame):
+        # Runs on the subscriber's loop
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(frame)
+
+    def close(self):
+        self._broker.unsubscribe(self)
+
+
+class LocalBroker:
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or settings.EVENTS_QUEUE_SIZE
+        self._channels = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, channel):
+        """Must be called from the event loop that will consume the subscription."""
+        subscription = Subscription(self, channel, asyncio.get_running_loop(), self.queue_size)
+        with self._lock: self._channels[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is None: return
+            subscribers.discard(subscription)
+            if not subscribers: del self._channels[subscription.channel]
+
+    def subscriber_count(self, channel=None):
+        with self._lock:
+            return len(self._channels.get(channel, ())) if channel else sum(len(s) for s in self._channels.values())
+
+    def publish(self, channel, event_type, data):
+        self.deliver(channel, encode_frame(next(self._ids), event_type, data))
+
+    def deliver(self, channel, frame):
+        with self._lock: subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            try: subscription.loop.call_soon_threadsafe(subscription.deliver, frame)
+            except RuntimeError: self.unsubscribe(subscription)  # its loop is closed
+
+
+class RedisBroker(LocalBroker):
+    """LocalBroker whose publishes travel through Redis so every process sees them."""
+
+    def __init__(self, url, queue_size=None):
+        super().__init__(queue_size)
+        import redis  # optional dependency, only needed when EVENTS_REDIS_URL is set
+        self._url = url
+        self._client = redis.Redis.from_url(url)
+        self._listeners = {}
+
+    def subscribe(self, channel):
+        loop = asyncio.get_running_loop()
+        if loop not in self._listeners or self._listeners[loop].done():
+            self._listeners[loop] = loop.create_task(self._listen())
+        return super().subscribe(channel)
+
+    def publish(self, channel, event_type, data):
+        frame = encode_frame(next(self._ids), event_type, data)
+        try: self._client.publish(REDIS_CHANNEL_PREFIX + channel, frame)
+        except Exception:
+            logger.exception("Backend Events: Redis publish failed; delivering to this process only.")
+            self.deliver(channel, frame)
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+        client = aioredis.Redis.from_url(self._url)
+        async with client.pubsub() as pubsub:
+            await pubsub.psubscribe(REDIS_CHANNEL_PREFIX + '*')
+            async for message in pubsub.listen():
+                if message['type'] != 'pmessage': continue
+                channel = message['channel'].decode()[len(REDIS_CHANNEL_PREFIX):]
+                self.deliver(channel, message['data'])
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = RedisBroker(settings.EVENTS_REDIS_URL) if settings.EVENTS_REDIS_URL else LocalBroker()
+    return _broker
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+def publish_post_event(post_id, event_type, data):
+    """Publishes once the current transaction commits, so subscribers never see rolled-back rows."""
+    transaction.on_commit(lambda: get_broker().publish(post_channel(post_id), event_type, data))
+
+
+def comment_event(comment):
+    return {'id': comment.id, 'post': comment.post_id, 'parent': comment.parent_id, 'author': comment.author.username,
+            'content': comment.content, 'created_at': comment.created_at}
@@ -0,0 +1,33 @@
+"""Plain-text excerpts of post content, stored on Post.excerpt so list responses can skip `content`."""
+import html
+
+from django.conf import settings
+from django.utils.html import strip_tags
+from markdownx.utils import markdownify
+
+BACKFILL_BATCH_SIZE = 500
+
+
+def make_excerpt(content, length=None):
+    """Plain text of the rendered markdown, whitespace collapsed and cut at a word boundary to at most `length` characters.
+    Only the start of the content is rendered, so the cost doesn't grow with the post."""
+    length = length or settings.POST_EXCERPT_LENGTH
+    text = ' '.join(html.unescape(strip_tags(markdownify((content or '')[:length * 10]))).split())
+    if len(text) <= length: return text
+    cut = text[:length]
+    return (cut.rsplit(' ', 1)[0] if ' ' in cut[1:] else cut[:-1]).rstrip(' .,;:') + '…'
+
+
+def backfill_excerpts(post_model, batch_size=BACKFILL_BATCH_SIZE):
+    """Recomputes every post's excerpt in batches. Takes the model so migrations can pass their historical one."""
+    changed, updated = [], 0
+    for post in post_model.objects.only('id', 'content', 'excerpt').order_by('id').iterator(chunk_size=batch_size):
+        excerpt = make_excerpt(post.content)
+        if excerpt == post.excerpt: continue
+        post.excerpt = excerpt
+        changed.append(post)
+        if len(changed) >= batch_size:
+            post_model.objects.bulk_update(changed, ['excerpt'])
+            updated += len(changed); changed = []
+    if changed: post_model.objects.bulk_update(changed, ['excerpt'])
+    return updated + len(changed)
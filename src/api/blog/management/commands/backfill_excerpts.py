@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.excerpts import BACKFILL_BATCH_SIZE, backfill_excerpts
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recomputes the stored excerpt of every post (needed after changing POST_EXCERPT_LENGTH)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        updated = backfill_excerpts(Post, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} excerpts."))
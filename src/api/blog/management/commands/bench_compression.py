@@ -0,0 +1,48 @@
+import time
+import zlib
+
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from quillpad_backend.compression import available_encoders
+
+from .bench_reads import read_paths
+
+
+def decompress(name, data):
+    if name == 'gzip': return zlib.decompress(data, 31)
+    if name == 'br':
+        import brotli
+        return brotli.decompress(data)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class Command(BaseCommand):
+    help = ("Fetches each read endpoint once and reports, per endpoint and encoding at the configured levels, the "
+            "response size before and after compression and the CPU time compression takes. Run `seed_posts` first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50, help="Compressions per endpoint and encoding, to average the CPU time.")
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def handle(self, *args, **options):
+        client, repeat = Client(HTTP_HOST='localhost'), options['repeat']
+        paths = read_paths() + ['/api/posts/?limit=100']
+        encoders = available_encoders()
+        self.stdout.write(f"{'endpoint':<45} {'bytes':>8} " + ' '.join(f"{e.name + ' bytes':>10} {'saved':>6} {'CPU µs':>7}" for e in encoders))
+        for path in paths:
+            body = client.get(path, HTTP_ACCEPT_ENCODING='identity').content
+            row = f"{path[:45]:<45} {len(body):>8} "
+            for encoder in encoders:
+                started = time.thread_time()
+                for _ in range(repeat): compressed = encoder.compress(body)
+                cpu = (time.thread_time() - started) / repeat
+                assert decompress(encoder.name, compressed) == body
+                row += f"{len(compressed):>10} {1 - len(compressed) / len(body):>6.1%} {cpu * 1e6:>7.0f} "
+            self.stdout.write(row)
+
+        # End to end: the middleware's negotiation and headers
+        response = client.get(paths[0], HTTP_ACCEPT_ENCODING='gzip;q=0.5, br, zstd;q=0')
+        self.stdout.write(f"\nGET {paths[0]} with 'gzip;q=0.5, br, zstd;q=0': Content-Encoding={response.get('Content-Encoding')}, Vary={response.get('Vary')}")
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+
+from blog.models import Post
+
+
+def comment_queries():
+    """The two busiest comment threads."""
+    threads = Post.objects.annotate(total=Count('comments')).order_by('-total').values_list('id', flat=True)[:2]
+    return [f'?post_id={post_id}' for post_id in threads]
+
+
+class Command(BaseCommand):
+    help = ("Compares the CPU time per request of the serializer-free read path (blog/readers.py) and the serializers on "
+            "post lists and comment threads. Their byte-for-byte parity is covered by blog.tests.FastReaderParityTests. "
+            "Run `seed_posts` first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per query and path, to average the CPU time.")
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def handle(self, *args, **options):
+        if not Post.objects.exists(): raise CommandError("No posts; run `manage.py seed_posts`.")
+        self.stdout.write(f"{'request':<60} {'bytes':>8} {'serializer ms':>13} {'fast ms':>8} {'speedup':>7}")
+        client = Client(HTTP_HOST='localhost')
+        for path in ['/api/posts/?limit=10', '/api/posts/?limit=50', '/api/posts/?limit=50&content=true', '/api/posts/?limit=50&fields=id,title,slug',
+                     *(f'/api/comments/by_post/{query}' for query in comment_queries())]:
+            cpu = {}
+            for fast in (False, True):
+                with override_settings(FAST_READS=fast):
+                    size = len(client.get(path).content)
+                    started = time.process_time()
+                    for _ in range(options['repeat']): client.get(path)
+                    cpu[fast] = (time.process_time() - started) / options['repeat']
+            self.stdout.write(f"{path[:60]:<60} {size:>8} {cpu[False] * 1e3:>13.2f} {cpu[True] * 1e3:>8.2f} {cpu[False] / cpu[True]:>6.1f}x")
@@ -0,0 +1,45 @@
+import io
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from blog.models import Post
+from blog.serializers import PostListSerializer, PostSerializer
+from quillpad_backend.fastjson import ORJSONParser, ORJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = ("Compares DRF's JSONRenderer/JSONParser with the orjson pair (quillpad_backend/fastjson.py) on serialized "
+            "pages of seeded posts: time per page, throughput, and whether the output is byte-identical. Run `seed_posts` first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,50,100', help="Posts per page.")
+        parser.add_argument('--repeat', type=int, default=200, help="Renders/parses per page and codec, to average the time.")
+
+    def handle(self, *args, **options):
+        if orjson is None: raise CommandError("orjson is not installed.")
+        sizes, repeat = [int(size) for size in options['sizes'].split(',')], options['repeat']
+        if Post.objects.count() < max(sizes): raise CommandError(f"Needs at least {max(sizes)} posts; run `manage.py seed_posts`.")
+        context = {'request': APIRequestFactory().get('/api/posts/', HTTP_HOST='localhost')}
+        stdlib, fast = JSONRenderer(), ORJSONRenderer()
+
+        def per_call(fn):
+            started = time.perf_counter()
+            for _ in range(repeat): fn()
+            return (time.perf_counter() - started) / repeat
+
+        self.stdout.write(f"{'page':<22} {'bytes':>8} {'json µs':>8} {'orjson µs':>9} {'MB/s':>7} {'speedup':>7} {'parse x':>7} identical")
+        for serializer_class in (PostListSerializer, PostSerializer):
+            for size in sizes:
+                posts = serializer_class.prepare_queryset(Post.objects.order_by('-created_at'))[:size]
+                data = {'count': size, 'next': None, 'previous': None, 'results': serializer_class(posts, many=True, context=context).data}
+                body = stdlib.render(data)
+                slow, quick = per_call(lambda: stdlib.render(data)), per_call(lambda: fast.render(data))
+                parse_slow = per_call(lambda: JSONParser().parse(io.BytesIO(body)))
+                parse_quick = per_call(lambda: ORJSONParser().parse(io.BytesIO(body)))
+                identical = fast.render(data) == body and ORJSONParser().parse(io.BytesIO(body)) == JSONParser().parse(io.BytesIO(body))
+                self.stdout.write(f"{serializer_class.__name__ + ' x' + str(size):<22} {len(body):>8} {slow * 1e6:>8.0f} {quick * 1e6:>9.0f} "
+                                  f"{len(body) / quick / 1e6:>7.0f} {slow / quick:>6.1f}x {parse_slow / parse_quick:>6.1f}x {'yes' if identical else 'NO'}")
@@ -0,0 +1,120 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from blog.models import Post
+
+
+def read_paths():
+    """The read endpoint mix shared by the benchmark commands."""
+    post = Post.objects.filter(is_published=True, comments__isnull=False).order_by('-id').first()
+    if post is None: raise CommandError("Needs published posts with comments; run `manage.py seed_posts` first.")
+    return ['/api/posts/', '/api/posts/?limit=20&offset=40', f'/api/posts/{post.slug}/',
+            f'/api/comments/by_post/?post_id={post.id}', '/api/tags/popular/', '/api/posts/stats/']
+
+
+class Command(BaseCommand):
+    help = ("Compares the read endpoints served by the WSGI application (a thread pool, like one gthread worker) "
+            "with the async views served by the ASGI application, in-process and at several concurrency levels. "
+            "Run `seed_posts` first. --latency adds a sleep to every query to stand in for a remote database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help="Requests per concurrency level, cycling through the endpoints.")
+        parser.add_argument('--concurrency', default='1,8,32,128', help="Comma-separated numbers of concurrent clients, each sending requests back to back.")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads (gunicorn --threads).")
+        parser.add_argument('--latency', type=float, default=5.0, help="Milliseconds added to every database query.")
+
+    @override_settings(THROTTLE_ENABLED=False)  # every benchmark request comes from the same client
+    def handle(self, *args, **options):
+        paths = read_paths()
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        latency = options['latency'] / 1000
+
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(latency)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs): connection.execute_wrappers.append(slow_execute)
+        if latency: connection_created.connect(add_latency, weak=False)
+
+        from quillpad_backend.asgi import application as asgi_app
+        from quillpad_backend.wsgi import application as wsgi_app
+
+        self.stdout.write(f"{options['requests']} requests over {len(paths)} endpoints, {options['latency']:g} ms per query, "
+                          f"WSGI with {options['threads']} threads\n")
+        self.stdout.write(f"{'clients':>7} {'server':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+        try:
+            for clients in levels:
+                for name, runner in (('wsgi', self.run_wsgi), ('asgi', self.run_asgi)):
+                    app = wsgi_app if name == 'wsgi' else asgi_app
+                    elapsed, timings, errors = runner(app, paths, options['requests'], clients, options['threads'])
+                    timings.sort()
+                    self.stdout.write(f"{clients:>7} {name:>6} {len(timings) / elapsed:>8.1f} {statistics.median(timings) * 1000:>8.1f} "
+                                      f"{timings[int(len(timings) * 0.95) - 1] * 1000:>8.1f} {errors:>6}")
+        finally:
+            connection_created.disconnect(add_latency)
+
+    def run_wsgi(self, app, paths, total, clients, threads):
+        worker = threading.BoundedSemaphore(threads)
+
+        def request(i):
+            path, _, query = paths[i % len(paths)].partition('?')
+            environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'HTTP_HOST': 'localhost', 'wsgi.input': BytesIO()}
+            setup_testing_defaults(environ)
+            status = []
+            started = time.perf_counter()
+            # Clients beyond the thread count queue for a free thread, as they would behind gunicorn
+            with worker:
+                body = app(environ, lambda s, headers, exc_info=None: status.append(s))
+                b''.join(body)
+                if hasattr(body, 'close'): body.close()
+            return time.perf_counter() - started, not status[0].startswith('200')
+
+        def client(n): return [request(i) for i in range(n, total, clients)]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = [result for batch in pool.map(client, range(clients)) for result in batch]
+        return time.perf_counter() - started, [t for t, _ in results], sum(e for _, e in results)
+
+    def run_asgi(self, app, paths, total, clients, threads):
+        return asyncio.run(self._asgi(app, paths, total, clients))
+
+    async def _asgi(self, app, paths, total, clients):
+        async def request(i):
+            path, _, query = paths[i % len(paths)].partition('?')
+            scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                     'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+                     'headers': [(b'host', b'localhost')], 'client': ('127.0.0.1', 40000), 'server': ('localhost', 80)}
+            status, sent, finished = [], [False], asyncio.Event()
+
+            async def receive():
+                if sent[0]:
+                    await finished.wait()  # the client stays connected until the response is complete
+                    return {'type': 'http.disconnect'}
+                sent[0] = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start': status.append(message['status'])
+                elif not message.get('more_body'): finished.set()
+
+            started = time.perf_counter()
+            await app(scope, receive, send)
+            return time.perf_counter() - started, status[0] != 200
+
+        async def client(n): return [await request(i) for i in range(n, total, clients)]
+
+        started = time.perf_counter()
+        batches = await asyncio.gather(*(client(n) for n in range(clients)))
+        results = [result for batch in batches for result in batch]
+        return time.perf_counter() - started, [t for t, _ in results], sum(e for _, e in results)
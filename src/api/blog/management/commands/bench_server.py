@@ -0,0 +1,145 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_reads import read_paths
+
+# name -> (extra gunicorn args, environment); 'default' is a bare `gunicorn wsgi` with no config file
+WORKER_MODELS = {
+    'default': (['quillpad_backend.wsgi:application'], {}),
+    'gthread': (['-c', 'gunicorn.conf.py'], {'GUNICORN_WORKER_CLASS': 'gthread'}),
+    'uvicorn': (['-c', 'gunicorn.conf.py'], {'GUNICORN_WORKER_CLASS': 'uvicorn'}),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid):
+    children = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        try:
+            with open(f'/proc/{pid}/task/{task}/children') as f: children += [int(child) for child in f.read().split()]
+        except OSError: pass
+    return [pid] + [p for child in children for p in process_tree(child)]
+
+
+def pss_mb(pids):
+    """Proportional set size: memory shared copy-on-write between workers is split between them, not counted per worker."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/smaps_rollup') as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+        except (OSError, StopIteration): pass
+    return total / 1024
+
+
+async def fetch(reader, writer, path):
+    """One GET over a kept-alive HTTP/1.1 connection. Returns the status code."""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nAccept: application/json\r\n\r\n".encode())
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in head[1:] if ': ' in line)
+    headers = {name.lower(): value for name, value in headers.items()}
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size: break
+    else:
+        raise RuntimeError(f"Cannot find the end of the response to {path}: {head[0]}")
+    return int(head[0].split()[1])
+
+
+class Command(BaseCommand):
+    help = ("Starts gunicorn with each worker model on the current database (run `seed_posts` first), drives it over "
+            "HTTP with keep-alive clients at several concurrency levels and reports throughput, latency and memory.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', default=','.join(WORKER_MODELS), help=f"Comma-separated worker models ({', '.join(WORKER_MODELS)}).")
+        parser.add_argument('--requests', type=int, default=1000, help="Requests per concurrency level, cycling through the endpoints.")
+        parser.add_argument('--concurrency', default='1,16,64', help="Comma-separated numbers of concurrent keep-alive clients.")
+        parser.add_argument('--workers', type=int, help="WEB_CONCURRENCY for every model (default: derived from the CPUs).")
+
+    def handle(self, *args, **options):
+        models = options['models'].split(',')
+        unknown = set(models) - set(WORKER_MODELS)
+        if unknown: raise CommandError(f"Unknown worker models: {', '.join(sorted(unknown))}.")
+        paths, levels = read_paths(), [int(level) for level in options['concurrency'].split(',')]
+
+        self.stdout.write(f"{options['requests']} requests per level over {len(paths)} endpoints\n")
+        self.stdout.write(f"{'model':>8} {'clients':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6} {'PSS MB':>7}")
+        for model in models:
+            port = free_port()
+            server = self.start(model, port, options['workers'])
+            try:
+                for clients in levels:
+                    elapsed, timings, errors = asyncio.run(self.load(port, paths, options['requests'], clients))
+                    timings.sort()
+                    pct = lambda q: timings[max(int(len(timings) * q) - 1, 0)] * 1000
+                    self.stdout.write(f"{model:>8} {clients:>7} {len(timings) / elapsed:>8.1f} {statistics.median(timings) * 1000:>8.1f} "
+                                      f"{pct(0.95):>8.1f} {pct(0.99):>8.1f} {errors:>6} {pss_mb(process_tree(server.pid)):>7.0f}")
+            finally:
+                server.terminate()
+                try: server.wait(30)
+                except subprocess.TimeoutExpired: server.kill()
+
+    def start(self, model, port, workers):
+        args, env = WORKER_MODELS[model]
+        env = {**os.environ, **env, 'THROTTLE_ENABLED': 'False', 'GUNICORN_BIND': f'127.0.0.1:{port}', 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'quillpad_backend.settings')}
+        if workers: env['WEB_CONCURRENCY'] = str(workers)
+        command, cwd = [sys.executable, '-m', 'gunicorn', *args], str(settings.BASE_DIR)
+        if model == 'default':
+            # Outside the project directory, so the bare run does not pick up gunicorn.conf.py
+            command += ['--chdir', cwd, '-b', f'127.0.0.1:{port}']
+            cwd = tempfile.gettempdir()
+        server = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if server.poll() is not None: raise CommandError(f"gunicorn ({model}) exited with status {server.returncode}.")
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1): return server
+            except OSError: time.sleep(0.2)
+        server.kill()
+        raise CommandError(f"gunicorn ({model}) did not start listening on port {port}.")
+
+    async def load(self, port, paths, total, clients):
+        # Warm every worker's imports and caches before timing
+        await asyncio.gather(*(self.client(port, paths, range(n, len(paths) * 2, clients)) for n in range(min(clients, len(paths) * 2))))
+        started = time.perf_counter()
+        batches = await asyncio.gather(*(self.client(port, paths, range(n, total, clients)) for n in range(clients)))
+        elapsed = time.perf_counter() - started
+        results = [result for batch in batches for result in batch]
+        return elapsed, [t for t, _ in results], sum(error for _, error in results)
+
+    async def client(self, port, paths, indexes):
+        results, connection = [], None
+        for i in indexes:
+            started = time.perf_counter()
+            status = None
+            for _ in range(2):
+                reused = connection is not None
+                try:
+                    connection = connection or await asyncio.open_connection('127.0.0.1', port)
+                    status = await fetch(*connection, paths[i % len(paths)])
+                    break
+                except (OSError, asyncio.IncompleteReadError, RuntimeError, ValueError):
+                    connection = None
+                    if not reused: break  # a kept-alive connection may have been closed by the server (max-requests, keep-alive timeout)
+            results.append((time.perf_counter() - started, status != 200))
+        if connection: connection[1].close()
+        return results
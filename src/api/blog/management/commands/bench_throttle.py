@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+from rest_framework.throttling import AnonRateThrottle
+
+from quillpad_backend.throttling import AnonTokenBucketThrottle, LocalBucketStore, RedisBucketStore, get_bucket_store
+
+
+class Command(BaseCommand):
+    help = ("Measures the per-request cost of the token-bucket throttles (bucket store alone and the full DRF check), "
+            "next to DRF's built-in AnonRateThrottle on the configured cache.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=200_000)
+        parser.add_argument('--clients', type=int, default=10_000, help="Distinct keys the checks are spread over.")
+        parser.add_argument('--redis', help="Also measure a RedisBucketStore at this URL.")
+
+    def handle(self, *args, **options):
+        n, clients = options['checks'], options['clients']
+        keys = [f'bench:{i}' for i in range(clients)]
+
+        def per_check(fn, count=n):
+            started = time.perf_counter()
+            for i in range(count): fn(i)
+            return (time.perf_counter() - started) / count * 1e6
+
+        local = LocalBucketStore()
+        self.report("LocalBucketStore.take", per_check(lambda i: local.take(keys[i % clients], 1_000_000, 1_000_000.0)))
+        if options['redis']:
+            redis_store = RedisBucketStore(options['redis'])
+            self.report("RedisBucketStore.take", per_check(lambda i: redis_store.take(keys[i % clients], 1_000_000, 1_000_000.0), min(n, 20_000)))
+
+        factory = APIRequestFactory()
+        requests = []
+        for i in range(min(clients, 1000)):
+            request = Request(factory.get('/api/posts/', REMOTE_ADDR=f'10.0.{i // 250}.{i % 250}'))
+            request.user = AnonymousUser()
+            requests.append(request)
+
+        throttle = AnonTokenBucketThrottle()
+        store = type(get_bucket_store()).__name__
+        self.report(f"AnonTokenBucketThrottle.allow_request ({store})", per_check(lambda i: throttle.allow_request(requests[i % len(requests)], None)))
+        builtin = AnonRateThrottle()
+        self.report("DRF AnonRateThrottle.allow_request (cache)", per_check(lambda i: builtin.allow_request(requests[i % len(requests)], None), min(n, 50_000)))
+
+    def report(self, name, micros):
+        self.stdout.write(f"{name:<60} {micros:8.2f} µs/check")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog.related import BATCH_SIZE, build_related_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the related-posts index (tag + TF-IDF cosine neighbours) for every published post."
+
+    def add_arguments(self, parser):
+        parser.add_argument('-k', type=int, default=None, help="Neighbours kept per post (default: RELATED_POSTS_K).")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Posts whose similarities are computed at once.")
+
+    def handle(self, *args, **options):
+        indexed = build_related_index(k=options['k'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed related posts for {indexed} posts."))
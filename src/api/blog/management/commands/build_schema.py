@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from quillpad_backend.schema import code_fingerprint, read_schema_file, write_schema_file
+
+
+class Command(BaseCommand):
+    help = ("Generates the OpenAPI schema and writes it to SCHEMA_FILE with a fingerprint of the code, so /api/schema/ "
+            "serves it from memory instead of generating it. Run on every release; the file is ignored once the code changes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=settings.SCHEMA_FILE)
+        parser.add_argument('--check', action='store_true', help="Only report whether the file matches the current code; exits non-zero if not.")
+
+    def handle(self, *args, **options):
+        if options['check']:
+            if read_schema_file(options['file']) is None: raise CommandError(f"{options['file']} is missing or out of date.")
+            self.stdout.write(self.style.SUCCESS(f"{options['file']} is up to date ({code_fingerprint()[:12]})."))
+            return
+        elapsed = write_schema_file(options['file'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['file']} ({code_fingerprint()[:12]}) in {elapsed:.2f}s."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from blog.trending import CHUNK_SIZE, compute_trending
+
+
+class Command(BaseCommand):
+    help = "Recomputes time-decayed trending scores and the ranked list served by /api/posts/trending/ (run periodically)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows processed per vectorized batch.")
+
+    def handle(self, *args, **options):
+        ranked = compute_trending(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Ranked {ranked} trending posts."))
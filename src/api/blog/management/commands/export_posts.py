@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Post
+from blog.transfer import EXPORT_CHUNK_SIZE, export_lines
+
+
+class Command(BaseCommand):
+    help = "Streams posts (with tags, category, comments and likes) as NDJSON, one post per line."
+
+    def add_arguments(self, parser):
+        parser.add_argument('-o', '--output', default='-', help="File to write to, or '-' for stdout (default).")
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help="Rows fetched per database round trip.")
+        parser.add_argument('--author', help="Only export posts by this username.")
+        parser.add_argument('--published-only', action='store_true', help="Skip unpublished posts.")
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.all()
+        if options['author']: queryset = queryset.filter(author__username=options['author'])
+        if options['published_only']: queryset = queryset.filter(is_published=True)
+
+        out = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        count = 0
+        try:
+            for line in export_lines(queryset, chunk_size=options['chunk_size']):
+                out.write(line)
+                count += 1
+        finally:
+            if out is not sys.stdout.buffer: out.close()
+        self.stderr.write(self.style.SUCCESS(f"Exported {count} posts."))
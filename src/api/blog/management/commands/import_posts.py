@@ -0,0 +1,35 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.transfer import IMPORT_BATCH_SIZE, ON_CONFLICT_CHOICES, PostImporter
+
+
+class Command(BaseCommand):
+    help = "Imports posts from an NDJSON file produced by export_posts, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', default='-', help="File to read from, or '-' for stdin (default).")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="Posts written per transaction.")
+        parser.add_argument('--default-author', help="Username used for posts and comments whose author does not exist here.")
+        parser.add_argument('--on-conflict', choices=ON_CONFLICT_CHOICES, default='rename', help="What to do when a post's slug is already taken.")
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['default_author']:
+            default_author = get_user_model().objects.filter(username=options['default_author']).first()
+            if default_author is None: raise CommandError(f"User '{options['default_author']}' does not exist.")
+
+        importer = PostImporter(batch_size=options['batch_size'], default_author=default_author, on_conflict=options['on_conflict'])
+        source = sys.stdin.buffer if options['input'] == '-' else open(options['input'], 'rb')
+        try:
+            stats = importer.run(source)
+        finally:
+            if source is not sys.stdin.buffer: source.close()
+
+        for error in stats['errors']:
+            self.stderr.write(self.style.WARNING(f"line {error['line']}: {error['error']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['posts']} posts, {stats['comments']} comments, {stats['likes']} likes and {stats['tags']} tag links; skipped {stats['skipped']}."
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blog.stats import refresh_platform_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the platform stats snapshot served by /api/posts/stats/ (run from cron or a scheduler)."
+
+    def handle(self, *args, **options):
+        data = refresh_platform_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed stats: {data['total_posts']} posts, {data['total_comments']} comments, {data['total_categories']} categories, {data['total_tags']} tags."
+        ))
@@ -0,0 +1,72 @@
+import json
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from blog.transfer import PostImporter
+
+WORDS = ('django async python server worker thread query index cache latency request response stream queue database '
+         'replica pool token schema render parse post comment author reader editor feed tag category design deploy '
+         'profile memory socket event loop benchmark scale').split()
+
+
+class Command(BaseCommand):
+    help = ("Fills the database with a reproducible synthetic dataset (users, categories, tags, posts, comments, likes) "
+            "for benchmarks. Posts go through the NDJSON importer, so they are written in batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000)
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--comments', type=int, default=5, help="Average comments per post.")
+        parser.add_argument('--likes', type=int, default=5, help="Average likes per post.")
+        parser.add_argument('--days', type=int, default=60, help="Spread post creation times over this many days.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        User = get_user_model()
+        prefix = f"seed{options['seed']}"
+        usernames = [f'{prefix}_user{i}' for i in range(options['users'])]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        password = make_password(None)
+        User.objects.bulk_create([User(username=name, email=f'{name}@example.com', password=password, role='author')
+                                  for name in usernames if name not in existing])
+
+        categories = [f'Category {i}' for i in range(options['categories'])]
+        tags = [f'tag{i}' for i in range(options['tags'])]
+        now = timezone.now()
+
+        def text(n): return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+        def record(i):
+            created = now - timedelta(seconds=rng.randrange(max(options['days'], 1) * 86400))
+            comments = []
+            for c in range(rng.randint(0, 2 * options['comments'])):
+                parent = rng.choice(comments)['id'] if comments and rng.random() < 0.3 else None
+                comments.append({'id': c + 1, 'parent': parent, 'author': rng.choice(usernames), 'content': text(rng.randint(5, 40)),
+                                 'created_at': created + timedelta(minutes=c + 1)})
+            likers = rng.sample(usernames, min(len(usernames), rng.randint(0, 2 * options['likes'])))
+            return {
+                'title': f"{text(rng.randint(3, 8)).capitalize()} {i}", 'author': rng.choice(usernames),
+                'content': '\n\n'.join(text(rng.randint(40, 120)) for _ in range(rng.randint(2, 6))),
+                'created_at': created, 'updated_at': created,
+                'category': rng.choice(categories) if categories and rng.random() < 0.9 else None,
+                'tags': sorted(rng.sample(tags, min(len(tags), rng.randint(0, 4)))),
+                'is_published': rng.random() < 0.95, 'featured': rng.random() < 0.05, 'view_count': rng.randint(0, 5000),
+                'comments': comments,
+                'likes': [{'user': name, 'created_at': created + timedelta(hours=1)} for name in likers],
+            }
+
+        importer = PostImporter()
+        stats = importer.run(json.dumps(record(i), cls=DjangoJSONEncoder) for i in range(options['posts']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {stats['posts']} posts, {stats['comments']} comments, {stats['likes']} likes and {stats['tags']} tag links "
+            f"by {len(usernames)} users."
+        ))
@@ -0,0 +1,90 @@
+import asyncio
+import resource
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.events import get_broker, post_channel
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = ("Opens many concurrent SSE subscriptions to /api/posts/<id>/events/ through the project's ASGI "
+            "application (in-process, no sockets) and measures how long published events take to reach all of them.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=10_000)
+        parser.add_argument('--events', type=int, default=5)
+        parser.add_argument('--post', type=int, help="Post id to subscribe to (default: the newest published post).")
+
+    def handle(self, *args, **options):
+        post_id = options['post'] or Post.objects.filter(is_published=True).order_by('-id').values_list('id', flat=True).first()
+        if post_id is None: raise CommandError("Needs at least one published post.")
+        report = asyncio.run(self.run(post_id, options['subscribers'], options['events']))
+        for line in report: self.stdout.write(line)
+
+    async def run(self, post_id, subscribers, events):
+        from quillpad_backend.asgi import application
+
+        broker, channel = get_broker(), post_channel(post_id)
+        path = f'/api/posts/{post_id}/events/'
+        disconnect = asyncio.Event()
+        received = [0] * subscribers
+        statuses, opened = {}, [0]
+        progress = {'target': 0, 'remaining': subscribers, 'done': asyncio.Event()}
+
+        def client(index):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+                'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                'headers': [(b'host', b'localhost'), (b'accept', b'text/event-stream')],
+                'client': ('127.0.0.1', 20000 + index % 40000), 'server': ('localhost', 80),
+            }
+            first = [True]
+
+            async def receive():
+                if first[0]:
+                    first[0] = False
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses[message['status']] = statuses.get(message['status'], 0) + 1
+                elif message['type'] == 'http.response.body':
+                    body = message.get('body', b'')
+                    if body.startswith(b'retry:'): opened[0] += 1
+                    received[index] += body.count(b'\nevent: ')
+                    if received[index] == progress['target']:
+                        progress['remaining'] -= 1
+                        if not progress['remaining']: progress['done'].set()
+
+            return application(scope, receive, send)
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(client(i)) for i in range(subscribers)]
+        # Connected = the response has started streaming, not merely subscribed inside the view
+        while opened[0] < subscribers:
+            if any(task.done() for task in tasks): break
+            await asyncio.sleep(0.05)
+        connected = time.perf_counter() - started
+        report = [f"Connected {opened[0]}/{subscribers} streams ({broker.subscriber_count(channel)} subscribed) in {connected:.2f}s"]
+
+        for n in range(1, events + 1):
+            progress.update(target=n, remaining=subscribers, done=asyncio.Event())
+            t0 = time.perf_counter()
+            # Published from another thread, the way a sync DRF view would
+            await asyncio.to_thread(broker.publish, channel, 'comment', {'post': post_id, 'content': f'load test {n}'})
+            try: await asyncio.wait_for(progress['done'].wait(), 30)
+            except asyncio.TimeoutError: pass
+            delivered = sum(1 for count in received if count >= n)
+            report.append(f"Event {n}: delivered to {delivered}/{subscribers} in {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+        disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        report.append(f"Peak RSS {rss_mb:.0f} MB (~{rss_mb * 1024 / max(subscribers, 1):.1f} KB per subscriber incl. baseline); "
+                      f"responses {statuses}, {broker.subscriber_count(channel)} left subscribed, {threading.active_count()} threads")
+        return report
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:54
+
+import blog.slugs
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_comment_parent_post_featured_post_featured_image_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=blog.slugs.AllocatedSlugField(editable=False, populate_from='name', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='slug',
+            field=blog.slugs.AllocatedSlugField(editable=False, populate_from='title', unique=True),
+        ),
+    ]
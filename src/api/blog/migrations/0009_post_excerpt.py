@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:42
+
+from django.db import migrations, models
+
+
+def fill_excerpts(apps, schema_editor):
+    from blog.excerpts import backfill_excerpts
+    backfill_excerpts(apps.get_model('blog', 'Post'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_follow_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_excerpts, migrations.RunPython.noop),
+    ]
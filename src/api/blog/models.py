@@ -1,22 +1,23 @@
 from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
-from autoslug import AutoSlugField
 from taggit.managers import TaggableManager
 from markdownx.models import MarkdownxField
+from .excerpts import make_excerpt
+from .slugs import AllocatedSlugField, UniqueSlugMixin
 
 User = get_user_model()
 
-class Category(models.Model):
+class Category(UniqueSlugMixin, models.Model):
     name = models.CharField(max_length=50, unique=True)
-    slug = AutoSlugField(populate_from='name', unique=True)
+    slug = AllocatedSlugField(populate_from='name', unique=True)
 
     def __str__(self):
         return self.name
 
-class Post(models.Model):
+class Post(UniqueSlugMixin, models.Model):
     title = models.CharField(max_length=200)
-    slug = AutoSlugField(populate_from='title', unique=True)
+    slug = AllocatedSlugField(populate_from='title', unique=True)
     #author = models.ForeignKey(User, on_delete=models.CASCADE)
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -24,6 +25,7 @@ class Post(models.Model):
         related_name='posts'
     )
     content = MarkdownxField()
+    excerpt = models.TextField(blank=True, default='', editable=False)  # make_excerpt(content), kept in step by save()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     tags = TaggableManager()
@@ -34,6 +36,13 @@ class Post(models.Model):
     featured = models.BooleanField(default=False)
     view_count = models.PositiveIntegerField(default=0)
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.excerpt = make_excerpt(self.content)
+            if update_fields is not None: kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        return super().save(*args, **kwargs)
+
     def increment_view(self):
         self.view_count += 1
         self.save(update_fields=['view_count']) 
@@ -76,4 +85,64 @@ class SavedPost(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        unique_together = ('user', 'post')
\ No newline at end of file
+        unique_together = ('user', 'post')
+
+class PlatformStats(models.Model):
+    """Snapshot of the figures served by /posts/stats/, refreshed by blog.stats (one row per key)."""
+    key = models.CharField(max_length=50, unique=True)
+    data = models.JSONField(default=dict)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.key} @ {self.refreshed_at}'
+
+
+class TrendingScore(models.Model):
+    """Per-post time-decayed popularity, recomputed by blog.trending. `rank` is set only for the
+    current top list, so /posts/trending/ reads k rows off the rank index."""
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, related_name='trending')
+    score = models.FloatField(default=0)
+    view_score = models.FloatField(default=0)
+    views_seen = models.PositiveIntegerField(default=0)
+    rank = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.post_id}: {self.score:.2f} (#{self.rank})'
+
+
+class RelatedPost(models.Model):
+    """Precomputed nearest neighbours of a post by tag and content similarity (see blog.related)."""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('post', 'related')
+        ordering = ['post', 'rank']
+
+
+class Follow(models.Model):
+    """A reader following an author, a tag or a category; drives the personalised feed (blog.timeline)."""
+    TARGET_AUTHOR, TARGET_TAG, TARGET_CATEGORY = 'author', 'tag', 'category'
+    TARGET_CHOICES = ((TARGET_AUTHOR, 'Author'), (TARGET_TAG, 'Tag'), (TARGET_CATEGORY, 'Category'))
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='follows')
+    target_type = models.CharField(max_length=10, choices=TARGET_CHOICES)
+    target_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'target_type', 'target_id')
+        indexes = [models.Index(fields=['target_type', 'target_id'])]
+
+class TimelineEntry(models.Model):
+    """One post pushed into one reader's feed. `post_created_at` is copied so a page is an index range scan."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    post_created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [models.Index(fields=['user', '-post_created_at'])]
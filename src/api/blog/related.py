@@ -0,0 +1,218 @@
+"""Related-posts index: top-k cosine neighbours over tag and TF-IDF content vectors.
+
+Each published post becomes one sparse row: its IDF-weighted tag vector and its sublinear TF-IDF
+vector over title + content, both L2-normalised and scaled by sqrt(TAG_WEIGHT) / sqrt(TEXT_WEIGHT)
+so that a plain dot product gives TAG_WEIGHT * tag cosine + TEXT_WEIGHT * text cosine.
+
+`build_related_index` (manage.py build_related) fits the whole corpus and multiplies it against
+itself BATCH_SIZE rows at a time, so only one sparse block of similarities is alive at once.
+`refresh_related_posts` updates a single post after it is saved, against a bounded candidate pool
+(posts sharing a tag plus the most recent ones), and inserts it into its neighbours' lists. Saves don't
+wait for it: `schedule_related_refresh` queues it, once the transaction commits, on a one-thread
+per-process pool, and repeated saves of a post that is still queued share one refresh (on SQLite, which
+allows a single writer, it runs right after the commit instead). A refresh lost with its process is
+caught up by the next periodic `manage.py build_related`.
+"""
+import logging
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, router, transaction
+from taggit.models import TaggedItem
+
+from .models import Post, RelatedPost
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+_queued = set()  # ids of posts waiting for a refresh on the pool
+
+TAG_WEIGHT = 0.6
+TEXT_WEIGHT = 0.4
+BATCH_SIZE = 1000
+MAX_FEATURES = 50_000
+MAX_DF_RATIO = 0.5
+TOKEN_RE = re.compile(r'[a-z][a-z0-9]{2,}')
+STOP_WORDS = frozenset(
+    'the and for are but not you all any can had her was one our out day get has him his how man new now old see two way who '
+    'its did yes this that with have from they will would there their what about which when make like time just know take '
+    'into year your good some could them than then look only come over also back after use work first well even want because '
+    'these give most http https www com'.split()
+)
+
+
+def tokenize(text):
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def _normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+class _RowBuilder:
+    """Accumulates {column: count} rows straight into CSR arrays."""
+
+    def __init__(self):
+        self.indptr, self.indices, self.data = [0], [], []
+
+    def add(self, counts):
+        self.indices.extend(counts.keys()); self.data.extend(counts.values()); self.indptr.append(len(self.indices))
+
+    def matrix(self, n_cols):
+        return sparse.csr_matrix((np.asarray(self.data, dtype=np.float64), np.asarray(self.indices, dtype=np.int64), self.indptr),
+                                 shape=(len(self.indptr) - 1, n_cols))
+
+
+def _tfidf(counts, prune):
+    """Sublinear TF-IDF of a count matrix, L2-normalised per row."""
+    n_rows, n_cols = counts.shape
+    df = np.bincount(counts.indices, minlength=n_cols)
+    if prune and n_rows > 2:
+        keep = np.flatnonzero((df >= 2) & (df <= MAX_DF_RATIO * n_rows))
+        if len(keep) > MAX_FEATURES: keep = keep[np.argsort(-df[keep], kind='stable')[:MAX_FEATURES]]
+        counts, df = counts[:, keep], df[keep]
+    counts.data = 1 + np.log(counts.data)
+    idf = np.log((1 + n_rows) / (1 + df)) + 1
+    return _normalize(counts @ sparse.diags(idf))
+
+
+def fit(documents, tags_by_post, prune=True):
+    """documents: iterable of (post_id, text). Returns (ids, combined CSR matrix)."""
+    vocabulary, tag_columns, ids = {}, {}, []
+    text_rows, tag_rows = _RowBuilder(), _RowBuilder()
+    for post_id, text in documents:
+        ids.append(post_id)
+        text_rows.add(Counter(vocabulary.setdefault(token, len(vocabulary)) for token in tokenize(text)))
+        tag_rows.add({tag_columns.setdefault(tag_id, len(tag_columns)): 1 for tag_id in tags_by_post.get(post_id, ())})
+
+    text = _tfidf(text_rows.matrix(len(vocabulary)), prune)
+    tags = _tfidf(tag_rows.matrix(len(tag_columns)), prune=False)
+    combined = sparse.hstack([np.sqrt(TAG_WEIGHT) * tags, np.sqrt(TEXT_WEIGHT) * text]).tocsr()
+    return np.asarray(ids, dtype=np.int64), combined
+
+
+def top_neighbours(similarities, row_ids, ids, k):
+    """For each row of a sparse similarity block, the k best (post_id, score) excluding itself."""
+    similarities = similarities.tocsr()
+    result = []
+    for row, own_id in enumerate(row_ids):
+        start, end = similarities.indptr[row], similarities.indptr[row + 1]
+        cols, scores = similarities.indices[start:end], similarities.data[start:end]
+        mask = (ids[cols] != own_id) & (scores > 0)
+        cols, scores = cols[mask], scores[mask]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            cols, scores = cols[best], scores[best]
+        order = np.lexsort((ids[cols], -scores))
+        result.append([(int(ids[cols[i]]), float(scores[i])) for i in order])
+    return result
+
+
+def _post_tags(post_ids=None):
+    items = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post))
+    if post_ids is not None: items = items.filter(object_id__in=post_ids)
+    tags = defaultdict(list)
+    for object_id, tag_id in items.values_list('object_id', 'tag_id').iterator(chunk_size=5000):
+        tags[object_id].append(tag_id)
+    return tags
+
+
+def _replace(entries):
+    """entries: {post_id: [(related_id, score), ...]} -> replaces those posts' RelatedPost rows."""
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=list(entries)).delete()
+        RelatedPost.objects.bulk_create([
+            RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank)
+            for post_id, neighbours in entries.items() for rank, (related_id, score) in enumerate(neighbours, start=1)
+        ])
+
+
+def build_related_index(k=None, batch_size=BATCH_SIZE):
+    """Rebuilds RelatedPost for every published post. Returns the number of posts indexed."""
+    k = k or settings.RELATED_POSTS_K
+    documents = Post.objects.filter(is_published=True).order_by('id').values_list('id', 'title', 'content').iterator(chunk_size=2000)
+    ids, matrix = fit(((post_id, f"{title}\n{content}") for post_id, title, content in documents), _post_tags())
+    transposed = matrix.T.tocsr()
+    for start in range(0, len(ids), batch_size):
+        row_ids = ids[start:start + batch_size]
+        neighbours = top_neighbours(matrix[start:start + batch_size] @ transposed, row_ids, ids, k)
+        _replace(dict(zip(row_ids.tolist(), neighbours)))
+    RelatedPost.objects.exclude(post__is_published=True).delete()
+    logger.info(f"Backend Related Posts: Indexed {len(ids)} posts with {matrix.shape[1]} features.")
+    return len(ids)
+
+
+def refresh_related_posts(post, k=None):
+    """Recomputes one post's neighbours against a bounded candidate pool and offers it to theirs."""
+    k = k or settings.RELATED_POSTS_K
+    if not post.is_published:
+        RelatedPost.objects.filter(post=post).delete()
+        return []
+    pool_size = settings.RELATED_POSTS_CANDIDATES
+    tag_ids = list(post.tags.values_list('id', flat=True))
+    published = Post.objects.filter(is_published=True).exclude(pk=post.pk)
+    candidates = set(published.filter(tags__in=tag_ids).distinct().order_by('-created_at').values_list('id', flat=True)[:pool_size // 2]) if tag_ids else set()
+    candidates.update(published.order_by('-created_at').values_list('id', flat=True)[:pool_size - len(candidates)])
+
+    rows = [(post.pk, f"{post.title}\n{post.content}")]
+    rows += [(post_id, f"{title}\n{content}") for post_id, title, content in Post.objects.filter(id__in=candidates).values_list('id', 'title', 'content')]
+    ids, matrix = fit(rows, _post_tags([post_id for post_id, _ in rows]), prune=False)
+    neighbours = top_neighbours(matrix[0] @ matrix.T, ids[:1], ids, k)[0]
+
+    # Offer the post to each neighbour's list: it goes in if the list is short or it beats the weakest entry
+    current = defaultdict(list)
+    for owner, related_id, score in RelatedPost.objects.filter(post_id__in=[n for n, _ in neighbours]).exclude(related_id=post.pk).values_list('post_id', 'related_id', 'score'):
+        current[owner].append((related_id, score))
+    updates = {post.pk: neighbours}
+    for neighbour_id, score in neighbours:
+        existing = current[neighbour_id]
+        if len(existing) < k or score > min(s for _, s in existing):
+            updates[neighbour_id] = sorted(existing + [(post.pk, score)], key=lambda item: -item[1])[:k]
+    _replace(updates)
+    return neighbours
+
+
+def refresh_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None: _pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='related-posts')
+    return _pool
+
+
+def _refresh(post_id):
+    try:
+        post = Post.objects.filter(pk=post_id).first()
+        if post is not None: refresh_related_posts(post)
+    except Exception:
+        logger.exception(f"Backend Related Posts: Failed to refresh related posts for post {post_id}.")
+
+
+def _refresh_queued(post_id):
+    with _pool_lock: _queued.discard(post_id)  # A save from here on queues another refresh
+    try: _refresh(post_id)
+    finally: connections.close_all()  # This thread's connections only
+
+
+def _enqueue(post_id):
+    # SQLite takes one writer at a time: a background writer would only make the requests' writes fail with "database is locked"
+    if connections[router.db_for_write(Post)].vendor == 'sqlite': return _refresh(post_id)
+    with _pool_lock:
+        if post_id in _queued: return
+        _queued.add(post_id)
+    refresh_pool().submit(_refresh_queued, post_id)
+
+
+def schedule_related_refresh(post):
+    """Refreshes post's related posts in the background after the current transaction commits."""
+    post_id = post.pk
+    transaction.on_commit(lambda: _enqueue(post_id))
@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import Post, Category, Comment
+from .models import Post, Category, Comment, Follow
+from django.contrib.auth import get_user_model
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from taggit.serializers import (TagListSerializerField, TaggitSerializer)
 from taggit.models import Tag
 
@@ -17,11 +20,21 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'slug', 'post_count']
     
     def get_post_count(self, obj):
+        # Querysets annotated with post_count (tags/popular, the async views) skip the per-tag query
+        if hasattr(obj, 'post_count'): return obj.post_count
         return Post.objects.filter(tags__name__in=[obj.name]).count()
 
 class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """`fields`/`omit` kwargs restrict the output to a subset of Meta.fields (see blog.views.SparseFieldsMixin).
+    The class attributes tell prepare_queryset() what each output field reads."""
+    field_columns = {}     # output field -> model columns (only() paths) it reads, when not a column of the same name
+    select_related = {}    # output field -> relation to join
+    prefetch_related = {}  # output field -> relation to prefetch
+    annotations = {}       # output field -> {attribute: expression} to annotate, e.g. a count it would query per row
+    deferred = ()          # columns no output field reads, left out of the full representation's query
+
     def __init__(self, *args, **kwargs):
-        fields = kwargs.pop('fields', None)
+        fields, omit = kwargs.pop('fields', None), kwargs.pop('omit', None)
         super().__init__(*args, **kwargs)
         
         if fields is not None:
@@ -29,6 +42,27 @@ class DynamicFieldsModelSerializer(serializers.ModelSerializer):
             existing = set(self.fields)
             for field_name in existing - allowed:
                 self.fields.pop(field_name)
+        for field_name in set(omit or ()) & set(self.fields):
+            self.fields.pop(field_name)
+
+    @classmethod
+    def project(cls, fields=None, omit=None):
+        """The Meta.fields left by a `fields` and/or `omit` list, in Meta.fields order; unknown names are ignored."""
+        return [name for name in cls.Meta.fields if (fields is None or name in fields) and name not in (omit or ())]
+
+    @classmethod
+    def prepare_queryset(cls, queryset, fields=None):
+        """Joins, prefetches and annotates what the output reads; given a projection, also loads only its columns."""
+        names = cls.Meta.fields if fields is None else fields
+        related = sorted({cls.select_related[name] for name in names if name in cls.select_related})
+        prefetch = sorted({cls.prefetch_related[name] for name in names if name in cls.prefetch_related})
+        annotations = {attribute: expression for name in names for attribute, expression in cls.annotations.get(name, {}).items()}
+        if related: queryset = queryset.select_related(*related)
+        if prefetch: queryset = queryset.prefetch_related(*prefetch)
+        if annotations: queryset = queryset.annotate(**annotations)
+        if fields: queryset = queryset.only(*{column for name in fields for column in cls.field_columns.get(name, (name,))})
+        elif fields is None and cls.deferred: queryset = queryset.defer(*cls.deferred)
+        return queryset
 
 class PostSerializer(TaggitSerializer, DynamicFieldsModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
@@ -38,10 +72,16 @@ class PostSerializer(TaggitSerializer, DynamicFieldsModelSerializer):
     featured_image_url = serializers.SerializerMethodField()
     id = serializers.IntegerField(read_only=True)
 
+    field_columns = {'author': ('author__username',), 'category': ('category__name',), 'tags': (), 'comment_count': (), 'featured_image_url': ('featured_image',)}
+    select_related = {'author': 'author', 'category': 'category'}
+    prefetch_related = {'tags': 'tags'}
+    # A correlated count per row: joining comments and grouping would GROUP BY every selected post column
+    annotations = {'comment_count': {'comment_total': Coalesce(Subquery(
+        Comment.objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(total=Count('id')).values('total')), 0)}}
     
     class Meta:
         model = Post
-        fields = ['id', 'title', 'slug', 'content', 'author', 'created_at', 
+        fields = ['id', 'title', 'slug', 'content', 'excerpt', 'author', 'created_at', 
                  'updated_at', 'tags', 'category', 'comment_count', 
                  'featured_image', 'featured_image_url', 'is_published', 
                  'featured', 'view_count']
@@ -55,23 +95,29 @@ class PostSerializer(TaggitSerializer, DynamicFieldsModelSerializer):
         return None    
 
     def get_comment_count(self, obj):
+        if hasattr(obj, 'comment_total'): return obj.comment_total
         return obj.comments.count()
 
-    def get_serializer(self, *args, **kwargs):
-        fields = self.request.query_params.get('fields', None)
-        if fields:
-            kwargs['fields'] = fields.split(',')
-        return super().get_serializer(*args, **kwargs)
+class PostListSerializer(PostSerializer):
+    """PostSerializer without `content` (lists carry the stored excerpt); the column isn't even loaded."""
+    deferred = ('content',)
+
+    class Meta(PostSerializer.Meta):
+        fields = [name for name in PostSerializer.Meta.fields if name != 'content']
 
 class RecursiveCommentSerializer(serializers.Serializer):
     def to_representation(self, instance):
-        serializer = self.parent.parent.__class__(instance, context=self.context)
+        # Replies carry the same fields as the comment they answer
+        serializer = self.parent.parent.__class__(instance, context=self.context, fields=list(self.parent.parent.fields))
         return serializer.data
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(DynamicFieldsModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
     author_avatar = serializers.SerializerMethodField()
     replies = RecursiveCommentSerializer(many=True, read_only=True)
+
+    field_columns = {'author': ('author__username',), 'author_avatar': ('author__avatar',), 'replies': ('parent',)}
+    select_related = {'author': 'author', 'author_avatar': 'author'}
     
     class Meta:
         model = Comment
@@ -82,6 +128,34 @@ class CommentSerializer(serializers.ModelSerializer):
             return self.context['request'].build_absolute_uri(obj.author.avatar.url)
         return None 
 
+class CommentBulkItemSerializer(serializers.Serializer):
+    # Plain fields: post/parent are resolved for the whole batch at once in the view
+    post = serializers.IntegerField()
+    content = serializers.CharField()
+    parent = serializers.IntegerField(required=False, allow_null=True)
+
+class LikeBulkItemSerializer(serializers.Serializer):
+    ACTION_CHOICES = ('like', 'unlike', 'toggle')
+
+    post = serializers.SlugField()
+    action = serializers.ChoiceField(choices=ACTION_CHOICES, default='toggle')
+
+class FollowSerializer(serializers.ModelSerializer):
+    TARGET_MODELS = {Follow.TARGET_AUTHOR: get_user_model(), Follow.TARGET_TAG: Tag, Follow.TARGET_CATEGORY: Category}
+
+    class Meta:
+        model = Follow
+        fields = ['id', 'target_type', 'target_id', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+    def validate(self, attrs):
+        if not self.TARGET_MODELS[attrs['target_type']].objects.filter(pk=attrs['target_id']).exists():
+            raise serializers.ValidationError({'target_id': f"No {attrs['target_type']} with this id."})
+        user = self.context['request'].user
+        if Follow.objects.filter(user=user, target_type=attrs['target_type'], target_id=attrs['target_id']).exists():
+            raise serializers.ValidationError(f"Already following this {attrs['target_type']}.")
+        return attrs
+
 class ActivitySerializer(serializers.Serializer):
     type = serializers.CharField(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
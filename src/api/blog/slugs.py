@@ -0,0 +1,120 @@
+"""Unique slug allocation without AutoSlugField's probe loop.
+
+AutoSlugField tries `slug`, `slug-2`, `slug-3`, ... with one query each, and two concurrent creates
+can both pick the same "free" value. Here the next free suffix is found with one aggregate query,
+and a save that still loses the race retries with a short random suffix instead of probing again.
+"""
+import re
+import secrets
+from contextlib import nullcontext
+
+from autoslug import AutoSlugField
+from autoslug.utils import get_prepopulated_value
+from django.db import IntegrityError, router, transaction
+from django.db.models import Case, Count, IntegerField, Max, Q, Value, When
+from django.db.models.functions import Cast, Substr
+
+SLUG_SAVE_ATTEMPTS = 3
+SUFFIX_DIGITS = 6  # room kept for "-N" when a base has to be cropped
+RANDOM_SUFFIX_BYTES = 3
+
+
+def _stem(field, base):
+    """The part of `base` that numbered variants are built on (cropped so "-N" still fits)."""
+    return base[:field.max_length - len(field.index_sep) - SUFFIX_DIGITS]
+
+
+def _rivals(field, exclude_pk=None):
+    queryset = field.model._default_manager.all()
+    return queryset.exclude(pk=exclude_pk) if exclude_pk is not None else queryset
+
+
+def next_free_slug(field, base, exclude_pk=None):
+    """Returns `base` if free, otherwise `stem-N` with N one past the highest suffix in use. One query."""
+    stem, sep = _stem(field, base), field.index_sep
+    numbered = Q(**{f'{field.name}__startswith': f'{stem}{sep}', f'{field.name}__regex': rf'^{re.escape(stem + sep)}[0-9]{{1,9}}$'})
+    suffix = Cast(Substr(field.name, len(stem) + len(sep) + 1), IntegerField())
+    taken = _rivals(field, exclude_pk).filter(Q(**{field.name: base}) | numbered).aggregate(
+        base_taken=Count('pk', filter=Q(**{field.name: base})),
+        top=Max(Case(When(numbered, then=suffix), default=Value(1), output_field=IntegerField())),
+    )
+    if not taken['base_taken']: return base
+    return f"{stem}{sep}{max(taken['top'] or 1, 1) + 1}"
+
+
+def random_suffix_slug(field, base):
+    stem = base[:field.max_length - len(field.index_sep) - RANDOM_SUFFIX_BYTES * 2]
+    return f"{stem}{field.index_sep}{secrets.token_hex(RANDOM_SUFFIX_BYTES)}"
+
+
+def base_slug(field, instance):
+    value = getattr(instance, field.attname) or (get_prepopulated_value(field, instance) if field.populate_from else None)
+    slug = field.slugify(value) if value else ''
+    return slug[:field.max_length] or instance._meta.model_name
+
+
+def allocate_slugs(field, bases):
+    """Unique slugs for a batch of new rows: one query for the batch plus one per base that is taken.
+    Duplicates inside the batch get consecutive suffixes, so a bulk_create cannot collide with itself."""
+    bases = [base[:field.max_length] for base in bases]
+    existing = set(field.model._default_manager.filter(**{f'{field.name}__in': set(bases)}).values_list(field.name, flat=True))
+    next_index, used, slugs = {}, set(), []
+    for base in bases:
+        slug = base
+        if base in existing or base in used:
+            stem, sep = _stem(field, base), field.index_sep
+            if stem not in next_index:
+                first = next_free_slug(field, base)
+                next_index[stem] = int(first.rsplit(sep, 1)[1]) if first != base else 2
+            while True:
+                slug = f"{stem}{sep}{next_index[stem]}"
+                next_index[stem] += 1
+                if slug not in used: break
+        used.add(slug)
+        slugs.append(slug)
+    return slugs
+
+
+class AllocatedSlugField(AutoSlugField):
+    """AutoSlugField that allocates with `next_free_slug` (one query) instead of probing.
+
+    A slug that is already set on an existing row is kept as is; the unique constraint and
+    UniqueSlugMixin's retry cover the rare manual change. Rows given a slug by `allocate_slugs` and
+    `mark_allocated` are trusted as well, so bulk_create does not query per row.
+    """
+
+    def pre_save(self, instance, add):
+        if self.unique_with: return super().pre_save(instance, add)
+        current = getattr(instance, self.attname)
+        if current and (getattr(instance, '_allocated_slug', None) == current or (not add and not self.always_update)):
+            return current
+        if self.always_update: setattr(instance, self.attname, None)
+        slug = base_slug(self, instance)
+        if self.unique: slug = next_free_slug(self, slug, exclude_pk=instance.pk)
+        mark_allocated(instance, slug, self)
+        return slug
+
+
+def mark_allocated(instance, slug, field=None):
+    field = field or instance._meta.get_field('slug')
+    setattr(instance, field.attname, slug)
+    instance._allocated_slug = slug
+
+
+class UniqueSlugMixin:
+    """Retries a save that lost a slug race with a random suffix rather than re-probing the table."""
+    slug_field_name = 'slug'
+
+    def save(self, *args, **kwargs):
+        field = self._meta.get_field(self.slug_field_name)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        for attempt in range(SLUG_SAVE_ATTEMPTS):
+            try:
+                # Only a surrounding transaction needs a savepoint to survive the failed INSERT.
+                with transaction.atomic(using=using) if transaction.get_connection(using).in_atomic_block else nullcontext():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                slug = getattr(self, field.attname)
+                if attempt == SLUG_SAVE_ATTEMPTS - 1 or not slug or not _rivals(field, self.pk).filter(**{field.name: slug}).exists():
+                    raise
+                mark_allocated(self, random_suffix_slug(field, slug), field)
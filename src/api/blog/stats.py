@@ -0,0 +1,87 @@
+"""Materialized platform statistics for PostViewSet.stats.
+
+The counts are full scans on large tables, so they are computed together into a PlatformStats row
+and served from there. A snapshot older than PLATFORM_STATS_MAX_AGE is refreshed by the first
+request that notices it (the others keep serving the old one), or ahead of time by
+`manage.py refresh_stats` from a periodic job.
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from taggit.models import Tag
+
+from .models import Post, Comment, Category, PlatformStats
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'platform'
+
+
+def _daily_counts(queryset, since):
+    rows = queryset.filter(created_at__gte=since).annotate(day=TruncDate('created_at')).values('day').annotate(total=Count('id'))
+    return {row['day'].isoformat(): row['total'] for row in rows}
+
+
+def compute_platform_stats(days=None):
+    days = settings.PLATFORM_STATS_DAYS if days is None else days
+    now = timezone.now()
+    since = (timezone.localtime(now) - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    posts = Post.objects.aggregate(total=Count('id'), published=Count('id', filter=Q(is_published=True)))
+    by_category = list(Category.objects.annotate(post_count=Count('post')).order_by('-post_count', 'name').values('name', 'slug', 'post_count'))
+    daily_posts, daily_comments = _daily_counts(Post.objects.all(), since), _daily_counts(Comment.objects.all(), since)
+    daily = [{'date': day, 'posts': daily_posts.get(day, 0), 'comments': daily_comments.get(day, 0)}
+             for day in ((since + timedelta(days=i)).date().isoformat() for i in range(days))]
+
+    return {
+        'total_posts': posts['total'],
+        'published_posts': posts['published'],
+        'total_comments': Comment.objects.count(),
+        'total_categories': len(by_category),
+        'total_tags': Tag.objects.count(),
+        'uncategorized_posts': posts['total'] - sum(c['post_count'] for c in by_category),
+        'by_category': by_category,
+        'daily': daily,
+        'posts_per_day': round(sum(daily_posts.values()) / days, 2) if days else 0,
+        'comments_per_day': round(sum(daily_comments.values()) / days, 2) if days else 0,
+        'refreshed_at': now.isoformat(),
+    }
+
+
+def refresh_platform_stats():
+    data = compute_platform_stats()
+    PlatformStats.objects.update_or_create(key=STATS_KEY, defaults={'data': data, 'refreshed_at': timezone.now()})
+    logger.info(f"Backend Stats: Refreshed platform stats ({data['total_posts']} posts, {data['total_comments']} comments).")
+    return data
+
+
+def get_platform_stats(max_age=None):
+    """The current snapshot, refreshing it first if it is older than `max_age` seconds."""
+    max_age = settings.PLATFORM_STATS_MAX_AGE if max_age is None else max_age
+    row = PlatformStats.objects.filter(key=STATS_KEY).first()
+    if row is None: return refresh_platform_stats()
+
+    now = timezone.now()
+    if row.refreshed_at and now - row.refreshed_at < timedelta(seconds=max_age): return row.data
+    # Claim the refresh with a conditional UPDATE so concurrent readers don't all recompute
+    claimed = PlatformStats.objects.filter(pk=row.pk, refreshed_at=row.refreshed_at).update(refreshed_at=now)
+    if not claimed: return row.data
+    try:
+        return refresh_platform_stats()
+    except Exception:
+        PlatformStats.objects.filter(pk=row.pk).update(refreshed_at=row.refreshed_at)
+        raise
+
+
+async def aget_platform_stats(max_age=None):
+    """get_platform_stats for async views: the fresh-snapshot path stays on the event loop."""
+    max_age = settings.PLATFORM_STATS_MAX_AGE if max_age is None else max_age
+    row = await PlatformStats.objects.filter(key=STATS_KEY).afirst()
+    if row is not None and row.refreshed_at and timezone.now() - row.refreshed_at < timedelta(seconds=max_age): return row.data
+    # Stale or missing: the refresh runs a dozen sync aggregate queries, so hand it to a thread
+    return await sync_to_async(get_platform_stats)(max_age)
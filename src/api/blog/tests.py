@@ -1,3 +1,404 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from taggit.models import Tag
+
+from quillpad_backend.throttling import LocalBucketStore
+
+from . import events
+from .events import LocalBroker, post_channel
+from .models import Category, Comment, Follow, Post, PostLike, RelatedPost, TimelineEntry
+from .readers import fast_reader
+from .serializers import CategorySerializer, CommentSerializer, FollowSerializer, PostListSerializer, PostSerializer
+from .slugs import SLUG_SAVE_ATTEMPTS, allocate_slugs, next_free_slug
+from .timeline import encode_cursor
+from .transfer import PostImporter, export_lines
+from .views import CommentViewSet, PostViewSet
+
+User = get_user_model()
+
+
+def parse_frame(frame):
+    fields = dict(line.split(': ', 1) for line in frame.decode('utf-8').strip().split('\n'))
+    return fields['event'], json.loads(fields['data'])
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class PostEventsTests(TransactionTestCase):
+    """Comments reach /posts/<id>/events/ subscribers through the broker, and only once their transaction commits."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer', email='writer@example.com', password='pw12345!', role='author')
+        self.post = Post.objects.create(title='Events', content='Body', author=self.author, is_published=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.broker = LocalBroker()
+        patcher = mock.patch.object(events, '_broker', self.broker)
+        patcher.start(); self.addCleanup(patcher.stop)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.addCleanup(lambda: self.loop.run_until_complete(self.loop.shutdown_asyncgens()))
+        self.subscription = self.loop.run_until_complete(self._subscribe())
+        self.addCleanup(self.subscription.close)
+
+    async def _subscribe(self):
+        return self.broker.subscribe(post_channel(self.post.id))
+
+    def receive(self, timeout=5):
+        return self.loop.run_until_complete(asyncio.wait_for(self.subscription.queue.get(), timeout))
+
+    def test_wsgi_requests_are_refused(self):
+        """A WSGI server would drain the endless stream before sending a byte, so it answers 503 instead."""
+        response = self.client.get(f'/api/posts/{self.post.id}/events/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.broker.subscriber_count(post_channel(self.post.id)), 1)  # only setUp's
+
+    def test_asgi_requests_stream(self):
+        async def first_chunk():
+            response = await AsyncClient().get(f'/api/posts/{self.post.id}/events/')
+            try: return response.status_code, response['Content-Type'], await anext(aiter(response.streaming_content))
+            finally: await response.streaming_content.aclose()
+        self.assertEqual(self.loop.run_until_complete(first_chunk()), (200, 'text/event-stream', b'retry: 5000\n\n'))
+
+    def test_committed_comment_is_streamed(self):
+        response = self.client.post('/api/comments/', {'post': self.post.id, 'content': 'First!'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        event_type, data = parse_frame(self.receive())
+        self.assertEqual(event_type, 'comment')
+        comment = Comment.objects.get()
+        self.assertEqual((data['id'], data['post'], data['author'], data['content']), (comment.id, self.post.id, 'writer', 'First!'))
+
+    def test_event_waits_for_the_outer_commit(self):
+        with transaction.atomic():
+            self.client.post('/api/comments/', {'post': self.post.id, 'content': 'Pending'}, format='json')
+            self.loop.run_until_complete(asyncio.sleep(0.05))
+            self.assertTrue(self.subscription.queue.empty())
+        self.assertEqual(parse_frame(self.receive())[1]['content'], 'Pending')
+
+    def test_rolled_back_comment_is_not_streamed(self):
+        with transaction.atomic():
+            self.client.post('/api/comments/', {'post': self.post.id, 'content': 'Never'}, format='json')
+            transaction.set_rollback(True)
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertTrue(self.subscription.queue.empty())
+        self.assertFalse(Comment.objects.exists())
+
+
+@override_settings(FAST_READS=True, THROTTLE_ENABLED=False)
+class FastReaderParityTests(TestCase):
+    """blog/readers.py must render exactly what the serializers do, for every projection the views can ask for."""
+    post_projections = [None, ['id', 'title', 'tags', 'comment_count'], ['slug', 'featured_image_url'], ['created_at', 'updated_at', 'category', 'author'],
+                        ['comment_count'], 'omit:tags,excerpt', 'omit:content,featured_image_url,comment_count']
+    comment_projections = [None, ['id', 'author', 'replies'], ['id', 'author_avatar', 'content', 'parent'], ['replies'], 'omit:replies,author_avatar']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user(username='writer', email='writer@example.com', password='pw12345!', role='author')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pw12345!')
+        User.objects.filter(pk=cls.reader.pk).update(avatar='avatars/reader/face.png')
+        category = Category.objects.create(name='Science')
+        now = timezone.now()
+        for i in range(6):
+            post = Post.objects.create(title=f'Post {i}', content=f'Body **{i}** with ünïcödé \u2028 text ' * 20, author=cls.writer,
+                                       category=category if i % 2 else None, featured=i == 3, view_count=i * 7)
+            if i % 3: post.tags.add('python', f'tag{i}', 'django')
+            if i != 5:
+                root = Comment.objects.create(post=post, author=cls.reader, content=f'Root on {i}')
+                reply = Comment.objects.create(post=post, author=cls.writer, content='Reply', parent=root)
+                Comment.objects.create(post=post, author=cls.reader, content='Nested reply', parent=reply)
+                Comment.objects.create(post=post, author=cls.writer, content='Second root')
+            # Distinct timestamps (and microseconds) so ordering and datetime formatting are both exercised
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(hours=i, microseconds=i * 1001))
+        Post.objects.filter(title__in=['Post 1', 'Post 4']).update(featured_image='post_images/2024/01/cover.png')
+        cls.thread = Post.objects.get(title='Post 1')
+
+    def setUp(self):
+        self.request = APIRequestFactory().get('/api/posts/', HTTP_HOST='testserver')
+
+    def projection(self, serializer_class, spec):
+        if isinstance(spec, str): return serializer_class.project(None, spec.removeprefix('omit:').split(','))
+        return spec
+
+    def assertSameJSON(self, serializer_class, queryset, fields):
+        reader = fast_reader(serializer_class, fields)
+        self.assertIsNotNone(reader)
+        queryset = serializer_class.prepare_queryset(queryset, fields)
+        expected = serializer_class(queryset, many=True, context={'request': self.request}, fields=fields).data
+        actual = reader.read(list(reader.values(queryset)), self.request)
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+
+    def test_post_lists_match_the_serializers(self):
+        for serializer_class in (PostSerializer, PostListSerializer):
+            for spec in self.post_projections:
+                with self.subTest(serializer=serializer_class.__name__, fields=spec):
+                    self.assertSameJSON(serializer_class, Post.objects.order_by('-created_at'), self.projection(serializer_class, spec))
+
+    def test_comment_threads_match_the_serializer(self):
+        for spec in self.comment_projections:
+            with self.subTest(fields=spec):
+                self.assertSameJSON(CommentSerializer, Comment.objects.filter(post=self.thread).order_by('-created_at'), self.projection(CommentSerializer, spec))
+
+    def test_views_return_the_same_bytes_either_way(self):
+        """Through the DRF viewsets and the async routes that serve the same URLs."""
+        list_posts, by_post = PostViewSet.as_view({'get': 'list'}), CommentViewSet.as_view({'get': 'by_post'})
+        cases = [(list_posts, '/api/posts/?limit=4'), (list_posts, '/api/posts/?fields=id,tags,comment_count,featured_image_url'),
+                 (list_posts, '/api/posts/?content=true&omit=author'), (list_posts, '/api/posts/?tags=python&ordering=-view_count'),
+                 (by_post, f'/api/comments/by_post/?post_id={self.thread.id}'), (by_post, f'/api/comments/by_post/?post_id={self.thread.id}&fields=id,replies')]
+        factory = APIRequestFactory()
+        for view, path in cases:
+            with self.subTest(path=path):
+                bodies = []
+                for fast in (False, True):
+                    with override_settings(FAST_READS=fast):
+                        bodies.append(view(factory.get(path, HTTP_HOST='testserver')).render().content)
+                        bodies.append(self.client.get(path, HTTP_HOST='testserver').content)
+                self.assertEqual(bodies, [bodies[0]] * 4)
+
+    def test_unknown_serializers_fall_back(self):
+        self.assertIsNone(fast_reader(CategorySerializer))
+        with override_settings(FAST_READS=False):
+            self.assertIsNone(fast_reader(PostSerializer))
+
+
+class PostImporterTests(TestCase):
+    """blog/transfer.py: what export_lines writes, PostImporter reads back."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user(username='writer', email='writer@example.com', password='pw12345!', role='author')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pw12345!')
+        post = Post.objects.create(title='Round trip', content='Body', author=cls.writer, category=Category.objects.create(name='Science'), view_count=7)
+        post.tags.add('python', 'django')
+        root = Comment.objects.create(post=post, author=cls.reader, content='Root')
+        reply = Comment.objects.create(post=post, author=cls.writer, content='Reply', parent=root)
+        Comment.objects.create(post=post, author=cls.reader, content='Nested reply', parent=reply)
+        PostLike.objects.create(post=post, user=cls.reader)
+        cls.created_at = timezone.now().replace(microsecond=0) - timedelta(days=30) # exports keep milliseconds
+        Post.objects.filter(pk=post.pk).update(created_at=cls.created_at, updated_at=cls.created_at + timedelta(days=1))
+        Comment.objects.filter(pk=root.pk).update(created_at=cls.created_at + timedelta(hours=1))
+        cls.lines = list(export_lines())
+
+    def normalized(self, lines):
+        """Records with comment ids replaced by their position, since the importer assigns new ones."""
+        records = [json.loads(line) for line in lines]
+        for record in records:
+            position = {comment['id']: index for index, comment in enumerate(record['comments'])}
+            for comment in record['comments']: comment.update(id=position[comment['id']], parent=position.get(comment['parent']))
+        return records
+
+    def record(self, **changes):
+        return (json.dumps({'title': 'Imported', 'content': 'Body', 'author': 'writer', **changes}) + '\n').encode('utf-8')
+
+    def test_round_trip(self):
+        Post.objects.all().delete()
+        Category.objects.all().delete()
+        stats = PostImporter().run(self.lines)
+        self.assertEqual((stats['posts'], stats['comments'], stats['likes'], stats['tags'], stats['errors']), (1, 3, 1, 2, []))
+        self.assertEqual(self.normalized(export_lines()), self.normalized(self.lines))
+
+    def test_reply_trees_and_timestamps_are_restored(self):
+        Post.objects.all().delete()
+        PostImporter().run(self.lines)
+        post = Post.objects.get()
+        self.assertEqual((post.created_at, post.updated_at), (self.created_at, self.created_at + timedelta(days=1)))
+        nested = Comment.objects.get(content='Nested reply')
+        self.assertEqual((nested.parent.content, nested.parent.parent.content, nested.parent.parent.parent), ('Reply', 'Root', None))
+        self.assertEqual(Comment.objects.get(content='Root').created_at, self.created_at + timedelta(hours=1))
+
+    def test_conflicting_slugs_are_renamed(self):
+        stats = PostImporter(on_conflict='rename').run(self.lines + self.lines)
+        self.assertEqual(stats['posts'], 2)
+        self.assertEqual(sorted(Post.objects.values_list('slug', flat=True)), ['round-trip', 'round-trip-2', 'round-trip-3'])
+
+    def test_conflicting_slugs_are_skipped(self):
+        stats = PostImporter(on_conflict='skip').run(self.lines)
+        self.assertEqual((stats['posts'], stats['skipped']), (0, 1))
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_bad_records_are_reported_by_line(self):
+        lines = [b'{not json\n', self.record(title=''), self.record(view_count='many'), self.record(tags='python'),
+                 self.record(author='nobody'), self.record(title='Good one')]
+        stats = PostImporter(batch_size=2).run(lines)
+        self.assertEqual(stats['posts'], 1)
+        self.assertEqual([error['line'] for error in stats['errors']], [1, 2, 3, 4, 5])
+        self.assertIn("Unknown author 'nobody'", stats['errors'][-1]['error'])
+
+    def test_failed_batch_leaves_no_orphan_categories_or_tags(self):
+        importer = PostImporter()
+        with mock.patch('blog.transfer.Post.objects.bulk_create', side_effect=IntegrityError('slug taken')):
+            with self.assertRaises(IntegrityError):
+                importer.run([self.record(category='Brand new', tags=['fresh'])])
+        self.assertFalse(Category.objects.filter(name='Brand new').exists())
+        self.assertFalse(Tag.objects.filter(name='fresh').exists())
+        stats = PostImporter().run([self.record(category='Brand new', tags=['fresh'])])
+        self.assertEqual((stats['posts'], stats['tags']), (1, 1))
+        self.assertEqual(Post.objects.get(title='Imported').category.name, 'Brand new')
+
+
+class SlugAllocationTests(TestCase):
+    """blog/slugs.py: numbered suffixes from one aggregate query, and a random suffix when a save still loses the race."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user(username='writer', email='writer@example.com', password='pw12345!', role='author')
+        cls.field = Post._meta.get_field('slug')
+
+    def create(self, title='Hello World', **kwargs):
+        return Post.objects.create(title=title, content='Body', author=self.writer, **kwargs)
+
+    def test_taken_slugs_get_the_next_number(self):
+        self.assertEqual([self.create().slug for _ in range(3)], ['hello-world', 'hello-world-2', 'hello-world-3'])
+        Post.objects.filter(slug='hello-world-2').delete()
+        self.assertEqual(self.create().slug, 'hello-world-4')
+        self.assertEqual(self.create('Hello World 2').slug, 'hello-world-2')
+
+    def test_long_titles_are_cropped_to_leave_room_for_the_suffix(self):
+        title = 'A very long title that goes well past the slug column length'
+        first, second = self.create(title).slug, self.create(title).slug
+        self.assertEqual(len(first), self.field.max_length)
+        self.assertEqual(second, f"{first[:self.field.max_length - 7]}-2")
+        self.assertLessEqual(len(second), self.field.max_length)
+
+    def test_duplicates_inside_one_batch_get_consecutive_numbers(self):
+        self.create()
+        slugs = allocate_slugs(self.field, ['hello-world', 'other', 'hello-world', 'other', 'hello-world'])
+        self.assertEqual(slugs, ['hello-world-2', 'other', 'hello-world-3', 'other-2', 'hello-world-4'])
+
+    def test_updates_do_not_collide_with_their_own_row(self):
+        post = self.create()
+        self.assertEqual(next_free_slug(self.field, 'hello-world', exclude_pk=post.pk), 'hello-world')
+        self.assertEqual(next_free_slug(self.field, 'hello-world'), 'hello-world-2')
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(Post.objects.get(pk=post.pk).slug, 'hello-world')
+
+    def test_a_lost_race_retries_with_a_random_suffix(self):
+        self.create()
+        # Simulates a concurrent create taking the slug between allocation and INSERT
+        with mock.patch('blog.slugs.next_free_slug', return_value='hello-world') as allocate:
+            post = self.create()
+        self.assertEqual(allocate.call_count, 1)
+        self.assertRegex(post.slug, r'^hello-world-[0-9a-f]{6}$')
+        self.assertEqual(Post.objects.filter(slug__startswith='hello-world').count(), 2)
+
+    def test_gives_up_after_the_last_attempt(self):
+        self.create()
+        with mock.patch('blog.slugs.random_suffix_slug', return_value='hello-world') as random_slug, \
+                mock.patch('blog.slugs.next_free_slug', return_value='hello-world'):
+            with self.assertRaises(IntegrityError):
+                self.create()
+        self.assertEqual(random_slug.call_count, SLUG_SAVE_ATTEMPTS - 1)
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class FeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user(username='writer', email='writer@example.com', password='pw12345!', role='author')
+        cls.reader = User.objects.create_user(username='reader', email='reader@example.com', password='pw12345!')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def follow(self):
+        return self.client.post('/api/follows/', {'target_type': 'author', 'target_id': self.writer.id}, format='json')
+
+    def test_pages_follow_the_cursor(self):
+        self.follow()
+        writer = APIClient()
+        writer.force_authenticate(self.writer)
+        posts = [writer.post('/api/posts/', {'title': f'Post {i}', 'content': 'Body', 'tags': []}, format='json').json()['id'] for i in range(5)]
+        now = timezone.now()  # Equal timestamps, so the id breaks the tie
+        Post.objects.update(created_at=now)
+        TimelineEntry.objects.update(post_created_at=now)
+        seen, before = [], None
+        while True:
+            page = self.client.get('/api/posts/feed/', {'limit': 2, **({'before': before} if before else {})}).json()
+            seen += [post['id'] for post in page['results']]
+            if not (before := page['next']): break
+        self.assertEqual(seen, posts[::-1])
+
+    def test_only_issued_cursors_are_accepted(self):
+        for before in (timezone.now().isoformat(), 'garbage', encode_cursor(timezone.now(), 1)[:-3]):
+            with self.subTest(before=before):
+                self.assertEqual(self.client.get('/api/posts/feed/', {'before': before}).status_code, 400)
+
+    def test_duplicate_follows_are_rejected(self):
+        self.assertEqual(self.follow().status_code, 201)
+        self.assertEqual(self.follow().status_code, 400)
+        # Two concurrent requests both pass the serializer's check; the second INSERT hits the unique constraint
+        with mock.patch.object(FollowSerializer, 'validate', side_effect=lambda attrs: attrs):
+            response = self.follow()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'non_field_errors': ['Already following this author.']})
+        self.assertEqual(Follow.objects.count(), 1)
+
+
+class BulkLikeThrottleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user(username='writer', email='writer@example.com', password='pw12345!', role='author')
+        cls.posts = [Post.objects.create(title=f'Post {i}', content='Body', author=cls.writer) for i in range(6)]
+
+    def setUp(self):
+        store = LocalBucketStore()
+        patcher = mock.patch('quillpad_backend.throttling.get_bucket_store', return_value=store)
+        patcher.start(); self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.writer)
+
+    def bulk_like(self, posts):
+        return self.client.post('/api/posts/bulk_like/', [{'post': post.slug, 'action': 'like'} for post in posts], format='json')
+
+    @override_settings(THROTTLE_ENABLED=True, REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'like': '5/min'}})
+    def test_every_item_spends_a_like_token(self):
+        self.assertEqual(self.bulk_like(self.posts[:3]).status_code, 200)
+        response = self.bulk_like(self.posts[3:])
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(PostLike.objects.count(), 3)  # nothing from the rejected request
+        # The rejected request still paid the throttle's one token, like any request does
+        self.assertEqual(self.client.post(f'/api/posts/{self.posts[3].slug}/like/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/posts/{self.posts[4].slug}/like/').status_code, 429)
+
+
+@override_settings(THROTTLE_ENABLED=False, FAST_READS=False)
+class PostListEndpointTests(TestCase):
+    """Post lists outside PostViewSet.list honour ?content=true and load their posts in a fixed number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.writer = User.objects.create_user(username='writer', email='writer@example.com', password='pw12345!', role='author')
+        cls.posts = [Post.objects.create(title=f'Post {i}', content=f'Full body {i}', author=cls.writer) for i in range(5)]
+        for rank, post in enumerate(cls.posts[1:], start=1):
+            post.tags.add('python', f'tag{rank}')
+            Comment.objects.bulk_create([Comment(post=post, author=cls.writer, content='Hi') for _ in range(rank)])
+            RelatedPost.objects.create(post=cls.posts[0], related=post, score=1 / rank, rank=rank)
+        cls.tag = Tag.objects.get(name='python')
+
+    def test_tag_posts_return_content_on_request(self):
+        plain = self.client.get(f'/api/tags/{self.tag.pk}/posts/').json()['results']
+        full = self.client.get(f'/api/tags/{self.tag.pk}/posts/', {'content': 'true'}).json()['results']
+        self.assertNotIn('content', plain[0])
+        self.assertEqual(sorted(post['content'] for post in full), [f'Full body {i}' for i in range(1, 5)])
+
+    def test_related_posts_are_loaded_in_bulk(self):
+        with self.assertNumQueries(5):  # the post and its tags (get_object), the index, the related posts with their comment totals, their tags
+            related = self.client.get(f'/api/posts/{self.posts[0].slug}/related/').json()
+        self.assertEqual([post['id'] for post in related], [post.id for post in self.posts[1:]])
+        self.assertEqual([post['comment_count'] for post in related], [1, 2, 3, 4])
+        self.assertEqual([post['similarity'] for post in related], [1.0, 0.5, 0.3333, 0.25])
+        self.assertEqual(sorted(related[1]['tags']), ['python', 'tag2'])
+        self.assertNotIn('content', related[0])
@@ -0,0 +1,170 @@
+"""Personalised feeds: fan-out on write with a pull path for very large audiences.
+
+Publishing a post pushes a TimelineEntry to every follower of its author, tags and category, in
+batches, and trims each touched timeline back to TIMELINE_MAX_LENGTH. A target followed by more than
+TIMELINE_FANOUT_LIMIT users is not pushed; readers following it get its posts merged in at read
+time instead, so one popular author cannot turn a publish into millions of inserts. Unfollowing
+removes the target's posts from the reader's timeline unless another follow still brings them in.
+
+Pages are ordered by (created_at, post id) and continue from an opaque, URL-safe cursor encoding
+both, so posts sharing a timestamp are never skipped at a page boundary.
+"""
+import base64
+import binascii
+import logging
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from taggit.models import TaggedItem
+
+from .models import Post, Follow, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+FANOUT_BATCH_SIZE = 1000
+BACKFILL_POSTS = 50
+
+
+def post_targets(post):
+    """The (target_type, target_id) pairs a post can be followed through."""
+    targets = [(Follow.TARGET_AUTHOR, post.author_id)]
+    if post.category_id: targets.append((Follow.TARGET_CATEGORY, post.category_id))
+    tag_ids = TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post), object_id=post.pk).values_list('tag_id', flat=True)
+    targets.extend((Follow.TARGET_TAG, tag_id) for tag_id in tag_ids)
+    return targets
+
+
+def _targets_q(targets):
+    q = Q(pk__in=[])
+    for target_type, target_id in targets: q |= Q(target_type=target_type, target_id=target_id)
+    return q
+
+
+def _follower_counts(targets):
+    if not targets: return {}
+    rows = Follow.objects.filter(_targets_q(targets)).values('target_type', 'target_id').annotate(total=Count('id'))
+    return {(row['target_type'], row['target_id']): row['total'] for row in rows}
+
+
+def trim_timelines(user_ids, max_length=None):
+    """Evicts everything past the newest `max_length` entries of each given user's timeline."""
+    max_length = max_length or settings.TIMELINE_MAX_LENGTH
+    overflow = (TimelineEntry.objects.filter(user_id__in=user_ids)
+                .annotate(position=Window(RowNumber(), partition_by=F('user_id'), order_by=[F('post_created_at').desc(), F('id').desc()]))
+                .filter(position__gt=max_length).values_list('id', flat=True))
+    ids = list(overflow)
+    if ids: TimelineEntry.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def fan_out(post):
+    """Pushes a published post into its followers' timelines. Returns the number of timelines written."""
+    if not post.is_published: return 0
+    counts = _follower_counts(post_targets(post))
+    pushed = [target for target, total in counts.items() if total <= settings.TIMELINE_FANOUT_LIMIT]
+    pulled = len(counts) - len(pushed)
+    if not pushed:
+        if pulled: logger.info(f"Backend Timeline: Post '{post.slug}' only has large audiences; left to the pull path.")
+        return 0
+
+    followers = Follow.objects.filter(_targets_q(pushed)).exclude(user_id=post.author_id).values_list('user_id', flat=True).distinct().order_by('user_id')
+    written, batch = 0, []
+    for user_id in followers.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        batch.append(user_id)
+        if len(batch) >= FANOUT_BATCH_SIZE:
+            written += _push(post, batch); batch = []
+    if batch: written += _push(post, batch)
+    logger.info(f"Backend Timeline: Fanned out post '{post.slug}' to {written} timelines ({pulled} large targets pulled at read time).")
+    return written
+
+
+def _push(post, user_ids):
+    with transaction.atomic():
+        TimelineEntry.objects.bulk_create([TimelineEntry(user_id=user_id, post_id=post.pk, post_created_at=post.created_at) for user_id in user_ids], ignore_conflicts=True)
+        trim_timelines(user_ids)
+    return len(user_ids)
+
+
+def backfill(follow, limit=BACKFILL_POSTS):
+    """Seeds a new follower's timeline with the target's most recent posts (small audiences only)."""
+    if _follower_counts([(follow.target_type, follow.target_id)]).get((follow.target_type, follow.target_id), 0) > settings.TIMELINE_FANOUT_LIMIT: return 0
+    posts = Post.objects.filter(_posts_q([(follow.target_type, follow.target_id)]), is_published=True).exclude(author_id=follow.user_id).order_by('-created_at').values_list('id', 'created_at')[:limit]
+    TimelineEntry.objects.bulk_create([TimelineEntry(user_id=follow.user_id, post_id=post_id, post_created_at=created_at) for post_id, created_at in posts], ignore_conflicts=True)
+    trim_timelines([follow.user_id])
+    return len(posts)
+
+
+def _posts_q(targets):
+    q = Q(pk__in=[])
+    for target_type, target_id in targets:
+        if target_type == Follow.TARGET_AUTHOR: q |= Q(author_id=target_id)
+        elif target_type == Follow.TARGET_CATEGORY: q |= Q(category_id=target_id)
+        elif target_type == Follow.TARGET_TAG: q |= Q(tags__id=target_id)
+    return q
+
+
+def unfollow(follow):
+    """Removes the target's posts from the former follower's timeline, keeping those another of their
+    follows still reaches. Call once the Follow is deleted. Returns the number of entries removed."""
+    entries = TimelineEntry.objects.filter(user_id=follow.user_id, post__in=Post.objects.filter(_posts_q([(follow.target_type, follow.target_id)])))
+    remaining = list(Follow.objects.filter(user_id=follow.user_id).values_list('target_type', 'target_id'))
+    if remaining: entries = entries.exclude(post__in=Post.objects.filter(_posts_q(remaining)))
+    removed, _ = entries.delete()
+    return removed
+
+
+def _before_q(before, created_at, post_id):
+    """Rows strictly after the cursor in (created_at, id) descending order."""
+    created, pk = before
+    return Q(**{f'{created_at}__lt': created}) | Q(**{created_at: created, f'{post_id}__lt': pk})
+
+
+def timeline_page(user, limit, before=None, queryset=None):
+    """Returns (posts, next_cursor): the newest `limit` feed posts after the cursor `before` (see parse_cursor).
+
+    Reads `limit` pushed entries off the (user, -post_created_at) index and, for followed targets
+    too large to push, `limit` candidates from Post; the two are merged by (creation time, id).
+    The posts are loaded in one query from `queryset` (Post.objects by default), so callers can
+    pass one that already joins and prefetches what their serializer reads.
+    """
+    pushed = TimelineEntry.objects.filter(user=user)
+    if before: pushed = pushed.filter(_before_q(before, 'post_created_at', 'post_id'))
+    candidates = list(pushed.order_by('-post_created_at', '-post_id').values_list('post_id', 'post_created_at')[:limit])
+
+    follows = list(Follow.objects.filter(user=user).values_list('target_type', 'target_id'))
+    large = [target for target, total in _follower_counts(follows).items() if total > settings.TIMELINE_FANOUT_LIMIT]
+    if large:
+        pulled = Post.objects.filter(_posts_q(large), is_published=True).exclude(author=user)
+        if before: pulled = pulled.filter(_before_q(before, 'created_at', 'id'))
+        candidates += list(pulled.distinct().order_by('-created_at', '-id').values_list('id', 'created_at')[:limit])
+
+    seen, page = set(), []
+    for post_id, created_at in sorted(candidates, key=lambda item: (item[1], item[0]), reverse=True):
+        if post_id in seen: continue
+        seen.add(post_id)
+        page.append((post_id, created_at))
+        if len(page) == limit: break
+
+    queryset = Post.objects.all() if queryset is None else queryset
+    posts = queryset.filter(is_published=True).in_bulk([post_id for post_id, _ in page])
+    ordered = [posts[post_id] for post_id, _ in page if post_id in posts]
+    next_cursor = encode_cursor(page[-1][1], page[-1][0]) if len(page) == limit else None
+    return ordered, next_cursor
+
+
+def encode_cursor(created_at, post_id):
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{post_id}'.encode()).decode('ascii').rstrip('=')
+
+
+def parse_cursor(value):
+    """(created_at, post_id) from a cursor returned by timeline_page, or None if it isn't one."""
+    if not value: return None
+    try:
+        created_at, post_id = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('ascii').split('|')
+        return datetime.fromisoformat(created_at), int(post_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
@@ -0,0 +1,308 @@
+"""NDJSON export/import of posts with their tags, category, comments and likes.
+
+One line per post. Export walks posts with server-side cursors (iterator(chunk_size=...)) and
+prefetches related rows per chunk; import buffers a batch of lines and writes it with bulk_create,
+so memory stays bounded by the batch size rather than the table size.
+"""
+import json
+import logging
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+from taggit.models import Tag, TaggedItem
+
+from .excerpts import make_excerpt
+from .models import Post, Comment, Category, PostLike
+from .slugs import SLUG_SAVE_ATTEMPTS, allocate_slugs, mark_allocated
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+EXPORT_CHUNK_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+ON_CONFLICT_CHOICES = ('rename', 'skip')
+
+
+def export_queryset(queryset=None):
+    """Posts in primary-key order with everything a record needs fetched per chunk, not per row."""
+    queryset = Post.objects.all() if queryset is None else queryset
+    comments = Comment.objects.select_related('author').only('id', 'post_id', 'parent_id', 'content', 'created_at', 'author__username').order_by('id')
+    likes = PostLike.objects.select_related('user').only('id', 'post_id', 'created_at', 'user__username').order_by('id')
+    return (queryset.select_related('author', 'category')
+            .prefetch_related('tags', Prefetch('comments', queryset=comments), Prefetch('likes', queryset=likes))
+            .order_by('id'))
+
+
+def post_to_record(post):
+    return {
+        'title': post.title,
+        'slug': post.slug,
+        'author': post.author.username,
+        'content': post.content,
+        'created_at': post.created_at,
+        'updated_at': post.updated_at,
+        'category': post.category.name if post.category else None,
+        'tags': sorted(tag.name for tag in post.tags.all()),
+        'featured_image': post.featured_image.name or None,
+        'is_published': post.is_published,
+        'featured': post.featured,
+        'view_count': post.view_count,
+        # Comment ids are only meaningful inside this record: they let replies point at their parent.
+        'comments': [{'id': c.id, 'parent': c.parent_id, 'author': c.author.username, 'content': c.content, 'created_at': c.created_at} for c in post.comments.all()],
+        'likes': [{'user': like.user.username, 'created_at': like.created_at} for like in post.likes.all()],
+    }
+
+
+def export_records(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    for post in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        yield post_to_record(post)
+
+
+def export_lines(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields one encoded NDJSON line (bytes, newline-terminated) per post."""
+    for record in export_records(queryset, chunk_size):
+        yield (json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+def _timestamp(value):
+    return parse_datetime(value) if isinstance(value, str) and value else None
+
+
+def _category_name(record):
+    name = record.get('category')
+    return name[:Category._meta.get_field('name').max_length] if name else None
+
+
+def _is_optional(value, types):
+    """value is None or of types; booleans only count where bool is asked for (True isn't a view count)."""
+    types = types if isinstance(types, tuple) else (types,)
+    return value is None or (isinstance(value, types) and (bool in types or not isinstance(value, bool)))
+
+
+def _record_problem(record):
+    """Why record can't be imported, or None. Checks every type the importer relies on, so a malformed
+    record is reported on its own line instead of failing the batch it is written with."""
+    if not isinstance(record, dict) or not isinstance(record.get('title'), str) or not record['title'] or not isinstance(record.get('content'), str):
+        return "Record needs at least a 'title' and a 'content' (strings)."
+    for key in ('slug', 'author', 'category', 'featured_image', 'created_at', 'updated_at'):
+        if not _is_optional(record.get(key), str): return f"'{key}' must be a string."
+    for key in ('is_published', 'featured'):
+        if not _is_optional(record.get(key), bool): return f"'{key}' must be true or false."
+    if not _is_optional(record.get('view_count'), int) or (record.get('view_count') or 0) < 0: return "'view_count' must be a non-negative integer."
+    if not _is_optional(record.get('tags'), list) or not all(isinstance(name, str) for name in record.get('tags') or ()):
+        return "'tags' must be a list of strings."
+    for key, fields in (('comments', ('author', 'content', 'created_at')), ('likes', ('user', 'created_at'))):
+        entries = record.get(key)
+        if not _is_optional(entries, list) or not all(isinstance(entry, dict) for entry in entries or ()): return f"'{key}' must be a list of objects."
+        for entry in entries or ():
+            if not all(_is_optional(entry.get(field), str) for field in fields): return f"'{key}' entries need string {', '.join(map(repr, fields))}."
+            if key == 'comments' and not all(_is_optional(entry.get(field), (int, str)) for field in ('id', 'parent')):
+                return "Comment 'id' and 'parent' must be integers or strings."
+    return None
+
+
+class PostImporter:
+    """Reads NDJSON post records and writes them in batches.
+
+    Users are matched by username and never created; records whose author is unknown fall back to
+    `default_author` or are skipped. Categories and tags are created on first use and cached for the
+    rest of the run. `on_conflict` decides what happens to a record whose slug is already taken:
+    'rename' gives it the next free `-N` suffix, 'skip' leaves the existing post alone (so re-running
+    an import is idempotent).
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, default_author=None, on_conflict='rename'):
+        if on_conflict not in ON_CONFLICT_CHOICES: raise ValueError(f"on_conflict must be one of {ON_CONFLICT_CHOICES}")
+        self.batch_size = max(1, batch_size)
+        self.default_author_id = default_author.id if default_author else None
+        self.on_conflict = on_conflict
+        self.stats = {'posts': 0, 'comments': 0, 'likes': 0, 'tags': 0, 'skipped': 0, 'errors': []}
+        self._users, self._categories, self._tags = {}, {}, {}
+        self._slug_field = Post._meta.get_field('slug')
+        self._post_type = ContentType.objects.get_for_model(Post)
+        self._pending, self._batch_errors = [], []
+
+    def run(self, lines):
+        for line_number, line in enumerate(lines, start=1):
+            self.feed(line, line_number)
+        self.flush()
+        return self.stats
+
+    def feed(self, line, line_number=None):
+        if isinstance(line, bytes): line = line.decode('utf-8')
+        line = line.strip()
+        if not line: return
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            self._error(line_number, f"Invalid JSON: {exc}")
+            return
+        problem = _record_problem(record)
+        if problem:
+            self._error(line_number, problem)
+            return
+        self._pending.append((line_number, record))
+        if len(self._pending) >= self.batch_size: self.flush()
+
+    def flush(self):
+        if not self._pending: return
+        batch, self._pending = self._pending, []
+        self._resolve_users(batch)
+        for attempt in range(SLUG_SAVE_ATTEMPTS):
+            self._batch_errors = [] # Reported once the batch is written, so a retried attempt doesn't report twice
+            try:
+                counts = self._write_batch(batch)
+                break
+            except IntegrityError:
+                # A concurrent writer took one of the allocated slugs; allocate again against the new state.
+                if attempt == SLUG_SAVE_ATTEMPTS - 1: raise
+                logger.warning("Backend Import Posts: Slug collision while writing a batch, retrying.")
+        for line_number, message in self._batch_errors: self._error(line_number, message)
+        for key, value in counts.items(): self.stats[key] += value
+        logger.info(f"Backend Import Posts: Imported batch of {counts['posts']} posts ({self.stats['posts']} total).")
+
+    def _write_batch(self, batch):
+        counts = {'posts': 0, 'comments': 0, 'likes': 0, 'tags': 0, 'skipped': 0}
+        slugs = self._allocate_slugs(batch)
+        with transaction.atomic():
+            posts, kept = [], []
+            for (line_number, record), slug in zip(batch, slugs):
+                author_id = self._users.get(record.get('author')) or self.default_author_id
+                if slug is None:
+                    counts['skipped'] += 1
+                    continue
+                if author_id is None:
+                    self._batch_errors.append((line_number, f"Unknown author '{record.get('author')}'."))
+                    continue
+                post = Post(
+                    title=record['title'][:200], author_id=author_id, content=record['content'], excerpt=make_excerpt(record['content']),
+                    featured_image=record.get('featured_image') or None,
+                    is_published=record.get('is_published', True), featured=record.get('featured', False),
+                    view_count=record.get('view_count') or 0,
+                )
+                mark_allocated(post, slug, self._slug_field)
+                posts.append(post)
+                kept.append((line_number, record))
+            if not posts: return counts
+            # Created in this transaction, so a failed or retried batch leaves no orphan categories or tags behind
+            categories, tags = self._resolve_categories(kept), self._resolve_tags(kept)
+            for post, (_, record) in zip(posts, kept): post.category_id = categories.get(_category_name(record))
+            Post.objects.bulk_create(posts, batch_size=self.batch_size)
+            # auto_now/auto_now_add overwrite timestamps on insert; put the exported ones back in one statement
+            self._restore_timestamps(Post, posts, [r for _, r in kept], ('created_at', 'updated_at'))
+
+            tagged = [
+                TaggedItem(tag_id=tags[name], content_type=self._post_type, object_id=post.id)
+                for post, (_, record) in zip(posts, kept) for name in set(record.get('tags') or ()) if name in tags
+            ]
+            TaggedItem.objects.bulk_create(tagged, batch_size=self.batch_size)
+
+            comments, orphaned = self._import_comments(posts, kept)
+            counts.update(posts=len(posts), tags=len(tagged), comments=comments, likes=self._import_likes(posts, kept))
+            counts['skipped'] += orphaned
+        # Only cache the ids once they are committed
+        self._categories.update(categories)
+        self._tags.update(tags)
+        return counts
+
+    def _import_comments(self, posts, kept):
+        # Replies need their parent's new id, so comments are inserted one tree level per statement.
+        pending = []
+        for post, (line_number, record) in zip(posts, kept):
+            for comment in record.get('comments') or ():
+                author_id = self._users.get(comment.get('author')) or self.default_author_id
+                if author_id is None or not isinstance(comment.get('content'), str):
+                    self._batch_errors.append((line_number, f"Skipped comment {comment.get('id')}: unknown author or missing content."))
+                    continue
+                pending.append((post.id, comment, author_id))
+
+        new_ids, created = {}, 0
+        while pending:
+            ready = [item for item in pending if item[1].get('parent') is None or (item[0], item[1]['parent']) in new_ids]
+            if not ready: break
+            pending = [item for item in pending if not (item[1].get('parent') is None or (item[0], item[1]['parent']) in new_ids)]
+            objs = [Comment(post_id=post_id, author_id=author_id, content=c['content'],
+                            parent_id=new_ids[(post_id, c['parent'])] if c.get('parent') is not None else None)
+                    for post_id, c, author_id in ready]
+            Comment.objects.bulk_create(objs, batch_size=self.batch_size)
+            self._restore_timestamps(Comment, objs, [c for _, c, _ in ready], ('created_at',))
+            for obj, (post_id, c, _) in zip(objs, ready): new_ids[(post_id, c.get('id'))] = obj.id
+            created += len(objs)
+        if pending: self._batch_errors.append((None, f"Skipped {len(pending)} replies whose parent comment was not imported."))
+        return created, len(pending)
+
+    def _import_likes(self, posts, kept):
+        objs, source = [], []
+        for post, (_, record) in zip(posts, kept):
+            seen = set()
+            for like in record.get('likes') or ():
+                user_id = self._users.get(like.get('user'))
+                if user_id is None or user_id in seen: continue
+                seen.add(user_id)
+                objs.append(PostLike(post_id=post.id, user_id=user_id))
+                source.append(like)
+        PostLike.objects.bulk_create(objs, batch_size=self.batch_size)
+        self._restore_timestamps(PostLike, objs, source, ('created_at',))
+        return len(objs)
+
+    def _restore_timestamps(self, model, objs, records, fields):
+        changed = []
+        for obj, record in zip(objs, records):
+            values = {field: _timestamp(record.get(field)) for field in fields}
+            values = {field: value for field, value in values.items() if value is not None}
+            if not values or obj.pk is None: continue
+            for field, value in values.items(): setattr(obj, field, value)
+            changed.append(obj)
+        if changed: model.objects.bulk_update(changed, fields, batch_size=self.batch_size)
+
+    def _resolve_users(self, batch):
+        names = set()
+        for _, record in batch:
+            names.add(record.get('author'))
+            names.update(c.get('author') for c in record.get('comments') or ())
+            names.update(like.get('user') for like in record.get('likes') or ())
+        missing = {name for name in names if isinstance(name, str) and name not in self._users}
+        if missing:
+            self._users.update(User.objects.filter(username__in=missing).values_list('username', 'id'))
+
+    def _resolve_categories(self, kept):
+        """Category ids by name for the kept records, creating missing ones. Call inside the batch transaction."""
+        names = {_category_name(r) for _, r in kept} - {None}
+        resolved = {name: self._categories[name] for name in names & self._categories.keys()}
+        missing = names - resolved.keys()
+        if missing:
+            resolved.update(Category.objects.filter(name__in=missing).values_list('name', 'id'))
+            for name in missing - resolved.keys(): resolved[name] = Category.objects.create(name=name).id
+        return resolved
+
+    def _resolve_tags(self, kept):
+        """Tag ids by name for the kept records, creating missing ones. Call inside the batch transaction."""
+        names = {name for _, r in kept for name in r.get('tags') or () if isinstance(name, str) and name}
+        resolved = {name: self._tags[name] for name in names & self._tags.keys()}
+        missing = names - resolved.keys()
+        if missing:
+            resolved.update(Tag.objects.filter(name__in=missing).values_list('name', 'id'))
+            for name in missing - resolved.keys(): resolved[name] = Tag.objects.create(name=name).id
+        return resolved
+
+    def _allocate_slugs(self, batch):
+        """Returns one slug per record, or None for records skipped because their slug is taken."""
+        field = self._slug_field
+        wanted = [slugify(record.get('slug') or record['title'])[:field.max_length] or 'post' for _, record in batch]
+        if self.on_conflict == 'skip':
+            taken = set(Post.objects.filter(slug__in=set(wanted)).values_list('slug', flat=True))
+            keep = [slug for slug in wanted if slug not in taken]
+            allocated = iter(allocate_slugs(field, keep))
+            return [None if slug in taken else next(allocated) for slug in wanted]
+        return allocate_slugs(field, wanted)
+
+    def _error(self, line_number, message):
+        logger.warning(f"Backend Import Posts: line {line_number}: {message}")
+        if len(self.stats['errors']) < MAX_REPORTED_ERRORS:
+            self.stats['errors'].append({'line': line_number, 'error': message})
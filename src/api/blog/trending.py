@@ -0,0 +1,117 @@
+"""Time-decayed trending scores, recomputed periodically by `manage.py compute_trending`.
+
+    score = VIEW_WEIGHT * decayed views + LIKE_WEIGHT * sum(decay(like age)) + COMMENT_WEIGHT * sum(decay(comment age))
+
+with decay(age) = 2 ** (-age / half-life). Likes and comments are read from the last
+TRENDING_WINDOW_DAYS as (post_id, created_at) chunks and reduced with NumPy. Views only exist as the
+cumulative `Post.view_count`, so each run adds the views gained since the previous run to an
+exponentially decayed counter kept on TrendingScore. The top TRENDING_SIZE published posts get a
+`rank`, which is all /posts/trending/ reads.
+"""
+import logging
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from .models import Post, PostLike, Comment, TrendingScore
+
+logger = logging.getLogger(__name__)
+
+VIEW_WEIGHT = 1.0
+LIKE_WEIGHT = 4.0
+COMMENT_WEIGHT = 6.0
+CHUNK_SIZE = 50_000
+
+
+def _decay_rate():
+    return math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+
+
+def _reduce(post_ids, values):
+    """Sums `values` per post id; returns (sorted unique ids, sums)."""
+    ids, inverse = np.unique(post_ids, return_inverse=True)
+    return ids, np.bincount(inverse, weights=values, minlength=len(ids))
+
+
+def event_scores(queryset, weight, now, since, chunk_size=CHUNK_SIZE):
+    """Decayed, weighted event counts per post over `created_at >= since`, reduced chunk by chunk."""
+    rate, now_ts = _decay_rate(), now.timestamp()
+    partial_ids, partial_sums = [], []
+    rows = queryset.filter(created_at__gte=since).values_list('post_id', 'created_at').iterator(chunk_size=chunk_size)
+    while True:
+        chunk = [row for _, row in zip(range(chunk_size), rows)]
+        if not chunk: break
+        post_ids = np.fromiter((post_id for post_id, _ in chunk), dtype=np.int64, count=len(chunk))
+        ages = now_ts - np.fromiter((created_at.timestamp() for _, created_at in chunk), dtype=np.float64, count=len(chunk))
+        ids, sums = _reduce(post_ids, weight * np.exp(-rate * np.maximum(ages, 0)))
+        partial_ids.append(ids)
+        partial_sums.append(sums)
+    if not partial_ids: return np.empty(0, dtype=np.int64), np.empty(0)
+    return _reduce(np.concatenate(partial_ids), np.concatenate(partial_sums))
+
+
+def _lookup(ids, sums, keys):
+    """sums[ids == key] for every key, 0 where the key has no events (ids must be sorted)."""
+    if not len(ids): return np.zeros(len(keys))
+    pos = np.clip(np.searchsorted(ids, keys), 0, len(ids) - 1)
+    return np.where(ids[pos] == keys, sums[pos], 0.0)
+
+
+def compute_trending(now=None, chunk_size=CHUNK_SIZE):
+    """Recomputes every post's score and re-ranks the top list. Returns the number of ranked posts."""
+    now = now or timezone.now()
+    since = now - timedelta(days=settings.TRENDING_WINDOW_DAYS)
+    rate, size = _decay_rate(), settings.TRENDING_SIZE
+    like_ids, like_sums = event_scores(PostLike.objects.all(), LIKE_WEIGHT, now, since, chunk_size)
+    comment_ids, comment_sums = event_scores(Comment.objects.all(), COMMENT_WEIGHT, now, since, chunk_size)
+
+    top_ids, top_scores = np.empty(0, dtype=np.int64), np.empty(0)
+    last_id = 0
+    while True:
+        posts = list(Post.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'view_count', 'created_at', 'is_published')[:chunk_size])
+        if not posts: break
+        last_id = posts[-1][0]
+        ids = np.array([p[0] for p in posts], dtype=np.int64)
+        view_counts = np.array([p[1] for p in posts], dtype=np.float64)
+        recent = np.array([p[2] >= since for p in posts])
+        published = np.array([p[3] for p in posts])
+
+        state = {post_id: (view_score, seen, computed_at) for post_id, view_score, seen, computed_at in
+                 TrendingScore.objects.filter(post_id__in=ids.tolist()).values_list('post_id', 'view_score', 'views_seen', 'computed_at')}
+        known = np.array([post_id in state for post_id in ids.tolist()])
+        old_score = np.array([state[i][0] if i in state else 0.0 for i in ids.tolist()])
+        seen = np.array([state[i][1] if i in state else 0 for i in ids.tolist()], dtype=np.float64)
+        elapsed = np.array([(now - state[i][2]).total_seconds() if i in state else 0.0 for i in ids.tolist()])
+
+        # Views gained since the last run count in full; a post seen for the first time only brings
+        # its views along if it is itself recent, otherwise an old archive would trend on day one.
+        gained = np.where(known, np.maximum(view_counts - seen, 0), np.where(recent, view_counts, 0))
+        view_score = old_score * np.exp(-rate * np.maximum(elapsed, 0)) + gained
+        score = VIEW_WEIGHT * view_score + _lookup(like_ids, like_sums, ids) + _lookup(comment_ids, comment_sums, ids)
+
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(post_id=int(i), score=float(s), view_score=float(v), views_seen=int(c), computed_at=now)
+             for i, s, v, c in zip(ids, score, view_score, view_counts)],
+            update_conflicts=True, unique_fields=['post'], update_fields=['score', 'view_score', 'views_seen', 'computed_at'],
+        )
+
+        eligible = published & (score > 0)
+        top_ids = np.concatenate([top_ids, ids[eligible]])
+        top_scores = np.concatenate([top_scores, score[eligible]])
+        if len(top_ids) > size:
+            keep = np.argpartition(-top_scores, size)[:size]
+            top_ids, top_scores = top_ids[keep], top_scores[keep]
+
+    ranked = top_ids[np.lexsort((top_ids, -top_scores))].tolist()
+    with transaction.atomic():
+        TrendingScore.objects.filter(rank__isnull=False).update(rank=None)
+        if ranked:
+            TrendingScore.objects.filter(post_id__in=ranked).update(
+                rank=Case(*[When(post_id=post_id, then=Value(rank)) for rank, post_id in enumerate(ranked, start=1)]))
+    logger.info(f"Backend Trending: Ranked {len(ranked)} posts from {len(like_ids)} liked and {len(comment_ids)} commented posts in the window.")
+    return len(ranked)
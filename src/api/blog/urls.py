@@ -1,13 +1,27 @@
-from django.urls import path, include
+import re
+
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet, CategoryViewSet, TagViewSet
+from .views import PostViewSet, CommentViewSet, CategoryViewSet, TagViewSet, FollowViewSet, post_events
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
 router.register(r'comments', CommentViewSet)
 router.register(r'categories', CategoryViewSet)
 router.register(r'tags', TagViewSet)
+router.register(r'follows', FollowViewSet, basename='follow')
+
+# posts/<slug>/ must not swallow the list actions (posts/featured/, posts/stats/, ...) the router serves
+_post_list_actions = '|'.join(re.escape(a.url_path) for a in PostViewSet.get_extra_actions() if not a.detail)
 
 urlpatterns = [
+    path('posts/<int:post_id>/events/', post_events, name='post-events'),
+    # Async read paths, ahead of the router; non-GET methods fall through to the viewsets inside them
+    path('posts/', async_views.post_list),
+    path('posts/stats/', async_views.post_stats),
+    re_path(rf'^posts/(?!(?:{_post_list_actions})/$)(?P<slug>[^/.]+)/$', async_views.post_detail),
+    path('comments/by_post/', async_views.comments_by_post),
+    path('tags/popular/', async_views.popular_tags),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
@@ -1,20 +1,34 @@
 # api/blog/views.py
 
-from rest_framework import viewsets, permissions, status
+from rest_framework import viewsets, permissions, status, mixins
 from rest_framework.decorators import action
-from .models import Post, Comment, Category, PostLike, SavedPost
+from .models import Post, Comment, Category, PostLike, SavedPost, RelatedPost, Follow
 from rest_framework.response import Response
-from .serializers import PostSerializer, CommentSerializer, CategorySerializer, TagSerializer
+from rest_framework.settings import api_settings
+from .serializers import PostSerializer, PostListSerializer, CommentSerializer, CategorySerializer, TagSerializer, CommentBulkItemSerializer, LikeBulkItemSerializer, FollowSerializer
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+from django.http import StreamingHttpResponse, JsonResponse
+from django.contrib.auth import get_user_model
+from django.conf import settings
 from taggit.models import Tag
 from taggit.serializers import TaggitSerializer
 from django_filters import rest_framework as filters
 from .pagination import StandardResultsSetPagination, PostLimitOffsetPagination
+from .readers import fast_reader
+from .events import comment_event, get_broker, post_channel, publish_post_event
+from .stats import get_platform_stats
+from .timeline import backfill, fan_out, parse_cursor, timeline_page, unfollow
+from .transfer import EXPORT_CHUNK_SIZE, IMPORT_BATCH_SIZE, ON_CONFLICT_CHOICES, PostImporter, export_lines
+from quillpad_backend.throttling import charge
 # --- Add logging ---
+import asyncio
 import logging
 logger = logging.getLogger(__name__)
+User = get_user_model()
 # --- End logging import ---
 # --- Add Permission Denied ---
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 # --- End Add Permission Denied ---
 
 
@@ -62,6 +76,89 @@ class IsAuthorEditorAdminOrReadOnly(permissions.BasePermission):
 # --- End Permissions with Logging ---
 
 
+BULK_MAX_ITEMS = 100
+
+def _validate_bulk_items(serializer_class, data):
+    """Shape-validates every item of a bulk payload without touching the database.
+    Returns (items, error) where items is a list of (index, validated_data, errors)."""
+    if isinstance(data, dict): data = data.get('items')
+    if not isinstance(data, list) or not data: return None, "Expected a non-empty list of items."
+    if len(data) > BULK_MAX_ITEMS: return None, f"At most {BULK_MAX_ITEMS} items are allowed per request."
+    items = []
+    for index, raw in enumerate(data):
+        serializer = serializer_class(data=raw)
+        if serializer.is_valid(): items.append((index, serializer.validated_data, None))
+        else: items.append((index, None, serializer.errors))
+    return items, None
+
+
+def _refresh_related(post):
+    """Queues the related-posts refresh for after the save commits, off the request (blog/related.py)."""
+    from .related import schedule_related_refresh  # numpy/scipy load on first use, not at startup
+    schedule_related_refresh(post)
+
+
+class SparseFieldsMixin:
+    """`?fields=a,b` and/or `?omit=c` on reads: the serializer outputs only those fields, and get_queryset() (or
+    project_queryset() for actions that build their own queryset) loads only the columns and relations they read."""
+
+    def sparse_fields(self):
+        """The projected output fields for this request, or None for the full representation."""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = None
+            request = getattr(self, 'request', None)
+            if request is not None and request.method in permissions.SAFE_METHODS:
+                fields, omit = (request.query_params.get(name, '') for name in ('fields', 'omit'))
+                split = lambda names: [name.strip() for name in names.split(',')]
+                if fields or omit: self._sparse_fields = self.get_serializer_class().project(split(fields) if fields else None, split(omit) if omit else None) or None  # nothing valid left: full representation
+        return self._sparse_fields
+
+    def project_queryset(self, queryset):
+        return self.get_serializer_class().prepare_queryset(queryset, self.sparse_fields())
+
+    def get_queryset(self):
+        return self.project_queryset(super().get_queryset())
+
+    def get_serializer(self, *args, **kwargs):
+        if self.sparse_fields() is not None: kwargs.setdefault('fields', self.sparse_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def fast_reader(self):
+        """The serializer-free reader for this request's output (blog/readers.py), or None to serialize."""
+        return fast_reader(self.get_serializer_class(), self.sparse_fields())
+
+
+async def post_events(request, post_id):
+    """Server-Sent Events stream of a published post's new comments and like counts.
+    Plain async Django view (DRF views are sync). ASGI only: a WSGI server (runserver, gthread workers)
+    drains a streaming body to the end before sending it, and this one never ends."""
+    if 'wsgi.version' in request.META:
+        return JsonResponse({"error": "Event streams are only served through the ASGI app (quillpad_backend.asgi)."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    if not await Post.objects.filter(pk=post_id, is_published=True).aexists():
+        return JsonResponse({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
+    subscription = get_broker().subscribe(post_channel(post_id))
+    heartbeat = settings.EVENTS_HEARTBEAT_SECONDS
+
+    async def stream():
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                try: yield await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError: yield b": keep-alive\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def post_list_serializer_class(request):
+    """PostListSerializer (excerpt, no content) for lists of posts, unless the request asks for ?content=true."""
+    return PostSerializer if request.query_params.get('content', '').lower() in ('true', '1') else PostListSerializer
+
+
 class PostFilter(filters.FilterSet):
     tags = filters.CharFilter(field_name='tags__name')
     author = filters.CharFilter(field_name='author__username')
@@ -73,7 +170,7 @@ class PostFilter(filters.FilterSet):
         fields = ['category', 'author', 'tags', 'is_published', 'featured']
 
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Post.objects.all().order_by('-created_at')
     serializer_class = PostSerializer
     # Use the logged permission classes
@@ -85,6 +182,20 @@ class PostViewSet(viewsets.ModelViewSet):
     ordering_fields = ['created_at', 'updated_at', 'view_count']
     ordering = ['-created_at']
     lookup_field = 'slug'
+    throttle_scope = None  # set per action (view, like) for ScopedTokenBucketThrottle
+    # Actions returning many posts: PostListSerializer (excerpt, no content) unless the request asks for ?content=true
+    list_actions = {'list', 'my_posts', 'featured', 'feed', 'trending', 'saved', 'recent', 'by_user', 'by_category', 'by_tag', 'related'}
+
+    def get_serializer_class(self):
+        return post_list_serializer_class(self.request) if self.action in self.list_actions else PostSerializer
+
+    def list(self, request, *args, **kwargs):
+        reader = self.fast_reader()
+        if reader is None: return super().list(request, *args, **kwargs)
+        rows = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None: return self.get_paginated_response(reader.read(page, request))
+        return Response(reader.read(list(rows), request))
 
     def perform_create(self, serializer):
         # Explicit check remains as a safeguard
@@ -100,7 +211,9 @@ class PostViewSet(viewsets.ModelViewSet):
              raise PermissionDenied("You do not have permission to create posts.")
 
         logger.info(f"Backend Create Post: Permission GRANTED. Saving post for author '{user.username}'.")
-        serializer.save(author=user)
+        post = serializer.save(author=user)
+        _refresh_related(post)
+        fan_out(post)
 
 
     # --- Add logging to other relevant actions ---
@@ -108,8 +221,11 @@ class PostViewSet(viewsets.ModelViewSet):
         instance = serializer.instance
         user = self.request.user
         logger.info(f"Backend Update Post: User '{user.username}' attempting update for post '{instance.slug}'. Data: {serializer.validated_data}")
-        serializer.save()
+        was_published = instance.is_published
+        post = serializer.save()
         logger.info(f"Backend Update Post: Post '{instance.slug}' updated successfully.")
+        _refresh_related(post)
+        if post.is_published and not was_published: fan_out(post)  # A draft being published reaches feeds now
 
     def perform_destroy(self, instance):
         user = self.request.user
@@ -121,7 +237,7 @@ class PostViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def my_posts(self, request):
         # ... (no changes needed here, permissions handled by viewset) ...
-        posts = Post.objects.filter(author=request.user).order_by('-created_at')
+        posts = self.project_queryset(Post.objects.filter(author=request.user).order_by('-created_at'))
         page = self.paginate_queryset(posts)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -129,7 +245,7 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(posts, many=True)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.AllowAny])
+    @action(detail=True, methods=['post'], permission_classes=[permissions.AllowAny], throttle_scope='post_view')
     def view(self, request, slug=None):
         # ... (no changes needed here) ...
         post = self.get_object()
@@ -140,17 +256,103 @@ class PostViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def featured(self, request):
         # ... (no changes needed here) ...
-         featured_posts = Post.objects.filter(featured=True, is_published=True)
+         featured_posts = self.project_queryset(Post.objects.filter(featured=True, is_published=True))
          serializer = self.get_serializer(featured_posts, many=True)
          return Response(serializer.data)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        """The current user's personalised feed (followed authors, tags and categories), newest first.
+        Paginated by cursor: pass the returned `next` value as `before` to get the following page."""
+        try: limit = max(1, min(int(request.query_params.get('limit', 10)), PostLimitOffsetPagination.max_limit))
+        except ValueError: return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        before = request.query_params.get('before')
+        if before and parse_cursor(before) is None: return Response({"error": "before must be a cursor returned as `next`"}, status=status.HTTP_400_BAD_REQUEST)
+        posts, next_cursor = timeline_page(request.user, limit, parse_cursor(before), self.project_queryset(Post.objects.all()))
+        return Response({'next': next_cursor, 'results': self.get_serializer(posts, many=True).data})
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Top posts by time-decayed views, likes and comments, as ranked by `manage.py compute_trending`."""
+        try: limit = max(1, min(int(request.query_params.get('limit', 10)), settings.TRENDING_SIZE))
+        except ValueError: return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        posts = self.project_queryset(Post.objects.filter(trending__rank__isnull=False, is_published=True).order_by('trending__rank'))[:limit]
+        serializer = self.get_serializer(posts, many=True)
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated], throttle_scope='like')
     def like(self, request, slug=None):
         # ... (no changes needed here) ...
         post = self.get_object(); user = request.user
         like, created = PostLike.objects.get_or_create(user=user, post=post)
-        if not created: like.delete(); return Response({'status': 'unliked', 'liked': False, 'like_count': post.likes.count()})
-        return Response({'status': 'liked', 'liked': True, 'like_count': post.likes.count()})
+        if not created: like.delete()
+        like_count = post.likes.count()
+        publish_post_event(post.id, 'likes', {'post': post.id, 'like_count': like_count})
+        return Response({'status': 'liked' if created else 'unliked', 'liked': created, 'like_count': like_count})
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated], throttle_scope='like')
+    def bulk_like(self, request):
+        """Applies a list of {post: slug, action: like|unlike|toggle} for the current user in one transaction."""
+        items, error = _validate_bulk_items(LikeBulkItemSerializer, request.data)
+        if error: return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        charge(request, self, len(items) - 1)  # Each item costs a like, as it would through the like action
+        user = request.user
+
+        slugs = {data['post'] for _, data, errors in items if not errors}
+        post_ids = dict(Post.objects.filter(slug__in=slugs).values_list('slug', 'id'))
+        initially_liked = set(PostLike.objects.filter(user=user, post_id__in=post_ids.values()).values_list('post_id', flat=True))
+        liked = set(initially_liked)
+
+        results = []
+        for index, data, errors in items:
+            post_id = post_ids.get(data['post']) if data else None
+            if errors or post_id is None:
+                results.append({'index': index, 'success': False, 'errors': errors or {'post': ['Post not found.']}})
+                continue
+            # Items apply in order, so two toggles of the same post cancel out as separate calls would
+            wants_like = (post_id not in liked) if data['action'] == 'toggle' else data['action'] == 'like'
+            if wants_like: liked.add(post_id)
+            else: liked.discard(post_id)
+            results.append({'index': index, 'success': True, 'post': data['post'], 'post_id': post_id, 'status': 'liked' if wants_like else 'unliked', 'liked': wants_like})
+
+        to_like, to_unlike = liked - initially_liked, initially_liked - liked
+        with transaction.atomic():
+            PostLike.objects.bulk_create([PostLike(user=user, post_id=post_id) for post_id in to_like], ignore_conflicts=True)
+            if to_unlike: PostLike.objects.filter(user=user, post_id__in=to_unlike).delete()
+        touched = {r['post_id'] for r in results if r['success']}
+        like_counts = dict(PostLike.objects.filter(post_id__in=touched).values('post_id').annotate(total=Count('id')).values_list('post_id', 'total'))
+
+        for result in results:
+            if result['success']: result['like_count'] = like_counts.get(result['post_id'], 0)
+        for post_id in touched: publish_post_event(post_id, 'likes', {'post': post_id, 'like_count': like_counts.get(post_id, 0)})
+        logger.info(f"Backend Bulk Like: User '{user.username}' liked {len(to_like)} and unliked {len(to_unlike)} posts in a batch of {len(items)}.")
+        return Response({'results': results, 'liked': len(to_like), 'unliked': len(to_unlike)})
+
+    @action(detail=False, methods=['get'], url_path='export', permission_classes=[permissions.IsAdminUser])
+    def export_ndjson(self, request):
+        """Streams every post matching the list filters as NDJSON (see blog/transfer.py), one post per line."""
+        queryset = self.filter_queryset(self.get_queryset())
+        logger.info(f"Backend Export Posts: User '{request.user.username}' started an NDJSON export.")
+        response = StreamingHttpResponse(export_lines(queryset, chunk_size=EXPORT_CHUNK_SIZE), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="posts.ndjson"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[permissions.IsAdminUser])
+    def import_ndjson(self, request):
+        """Imports an NDJSON request body line by line in batches; the body is never loaded whole.
+        Query params: on_conflict=rename|skip, default_author=<username>."""
+        on_conflict = request.query_params.get('on_conflict', 'rename')
+        if on_conflict not in ON_CONFLICT_CHOICES: return Response({"error": f"on_conflict must be one of {', '.join(ON_CONFLICT_CHOICES)}"}, status=status.HTTP_400_BAD_REQUEST)
+        default_author = None
+        if request.query_params.get('default_author'):
+            default_author = User.objects.filter(username=request.query_params['default_author']).first()
+            if default_author is None: return Response({"error": "default_author does not exist"}, status=status.HTTP_400_BAD_REQUEST)
+        stream = request.stream
+        if stream is None: return Response({"error": "Request body is empty"}, status=status.HTTP_400_BAD_REQUEST)
+
+        stats = PostImporter(batch_size=IMPORT_BATCH_SIZE, default_author=default_author, on_conflict=on_conflict).run(stream)
+        logger.info(f"Backend Import Posts: User '{request.user.username}' imported {stats['posts']} posts, skipped {stats['skipped']}.")
+        return Response(stats, status=status.HTTP_201_CREATED if stats['posts'] else status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def save(self, request, slug=None):
@@ -163,7 +365,7 @@ class PostViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def saved(self, request):
         # ... (no changes needed here) ...
-        saved_posts = Post.objects.filter(saved_by__user=request.user).order_by('-saved_by__created_at')
+        saved_posts = self.project_queryset(Post.objects.filter(saved_by__user=request.user).order_by('-saved_by__created_at'))
         page = self.paginate_queryset(saved_posts)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -173,8 +375,8 @@ class PostViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        # ... (no changes needed here) ...
-        return Response({'total_posts': Post.objects.count(), 'published_posts': Post.objects.filter(is_published=True).count(), 'total_comments': Comment.objects.count(), 'total_categories': Category.objects.count(), 'total_tags': Tag.objects.count()})
+        # Served from the PlatformStats snapshot; see blog/stats.py for the staleness bound
+        return Response(get_platform_stats())
 
     @action(detail=False, methods=['get'])
     def recent(self, request):
@@ -214,6 +416,20 @@ class PostViewSet(viewsets.ModelViewSet):
         if page is not None: serializer = self.get_serializer(page, many=True); return self.get_paginated_response(serializer.data)
         serializer = self.get_serializer(posts, many=True); return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def related(self, request, slug=None):
+        """Nearest posts by tag and content similarity, from the precomputed RelatedPost index."""
+        post = self.get_object()
+        try: limit = max(1, min(int(request.query_params.get('limit', settings.RELATED_POSTS_K)), settings.RELATED_POSTS_K))
+        except ValueError: return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        scores = dict(RelatedPost.objects.filter(post=post, related__is_published=True).order_by('rank').values_list('related_id', 'score')[:limit])
+        # Loaded like any other post list: joined, tags prefetched and comment totals annotated in one pass
+        posts = self.project_queryset(Post.objects.all()).in_bulk(scores)
+        related = [posts[post_id] for post_id in scores if post_id in posts]
+        data = self.get_serializer(related, many=True).data
+        for item, related_post in zip(data, related): item['similarity'] = round(scores[related_post.pk], 4)
+        return Response(data)
+
     @action(detail=True, methods=['get'])
     def summary(self, request, slug=None):
          # ... (no changes needed here) ...
@@ -225,7 +441,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [IsAdminEditorOrReadOnly] # Use logged version
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all().order_by('-created_at')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorEditorAdminOrReadOnly] # Use logged version
@@ -233,21 +449,84 @@ class CommentViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         user = self.request.user
         logger.info(f"Backend Create Comment: User '{user.username}' creating comment. Data: {serializer.validated_data}")
-        serializer.save(author=user)
+        comment = serializer.save(author=user)
+        publish_post_event(comment.post_id, 'comment', comment_event(comment))
         logger.info(f"Backend Create Comment: Comment saved successfully for user '{user.username}'.")
 
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """Creates a list of comments/replies ({post, content, parent}) for the current user with one bulk insert.
+        A reply's parent must already exist; it cannot reference another comment in the same batch."""
+        items, error = _validate_bulk_items(CommentBulkItemSerializer, request.data)
+        if error: return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+        user = request.user
+
+        valid = [data for _, data, errors in items if not errors]
+        existing_posts = set(Post.objects.filter(id__in={d['post'] for d in valid}).values_list('id', flat=True))
+        parent_posts = dict(Comment.objects.filter(id__in={d['parent'] for d in valid if d.get('parent')}).values_list('id', 'post_id'))
+
+        results, to_create = [], []
+        for index, data, errors in items:
+            if not errors:
+                parent_id = data.get('parent')
+                if data['post'] not in existing_posts: errors = {'post': ['Post not found.']}
+                elif parent_id and parent_posts.get(parent_id) is None: errors = {'parent': ['Parent comment not found.']}
+                elif parent_id and parent_posts[parent_id] != data['post']: errors = {'parent': ['Parent comment belongs to a different post.']}
+            if errors:
+                results.append({'index': index, 'success': False, 'errors': errors})
+                continue
+            results.append({'index': index, 'success': True})
+            to_create.append(Comment(author=user, post_id=data['post'], content=data['content'], parent_id=data.get('parent')))
+
+        with transaction.atomic():
+            created = Comment.objects.bulk_create(to_create)
+        created_iter = iter(created)
+        for result in results:
+            if not result['success']: continue
+            comment = next(created_iter)
+            result.update({'id': comment.id, 'post': comment.post_id, 'parent': comment.parent_id, 'created_at': comment.created_at})
+            publish_post_event(comment.post_id, 'comment', comment_event(comment))
+        logger.info(f"Backend Bulk Comment: User '{user.username}' created {len(created)} of {len(items)} comments.")
+        return Response({'results': results, 'created': len(created)}, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'])
     def by_post(self, request):
          # ... (no changes needed here) ...
          post_id = request.query_params.get('post_id', None)
          if post_id:
-             comments = Comment.objects.filter(post_id=post_id).order_by('-created_at')
+             comments = self.project_queryset(Comment.objects.filter(post_id=post_id).order_by('-created_at'))
+             reader = self.fast_reader()
+             if reader is not None and self.paginator is None: return Response(reader.read(list(reader.values(comments)), request))  # replies are wired from the whole thread
              page = self.paginate_queryset(comments)
              if page is not None: serializer = self.get_serializer(page, many=True); return self.get_paginated_response(serializer.data)
              serializer = self.get_serializer(comments, many=True); return Response(serializer.data)
          return Response({"error": "post_id parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class FollowViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Follows of the current user. POST {target_type: author|tag|category, target_id} to follow."""
+    serializer_class = FollowSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+
+    def get_queryset(self):
+        return Follow.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def perform_create(self, serializer):
+        try:
+            # FollowSerializer's duplicate check can't see a follow created concurrently; the unique constraint can
+            with transaction.atomic(): follow = serializer.save(user=self.request.user)
+        except IntegrityError:
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [f"Already following this {serializer.validated_data['target_type']}."]})
+        seeded = backfill(follow)
+        logger.info(f"Backend Follow: User '{self.request.user.username}' followed {follow.target_type} {follow.target_id}; seeded {seeded} timeline entries.")
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        removed = unfollow(instance)
+        logger.info(f"Backend Follow: User '{self.request.user.username}' unfollowed {instance.target_type} {instance.target_id}; removed {removed} timeline entries.")
+
+
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -256,10 +535,11 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=True, methods=['get'])
     def posts(self, request, pk=None):
         # ... (no changes needed here) ...
-        tag = self.get_object(); posts_queryset = Post.objects.filter(tags__name__in=[tag.name], is_published=True).order_by('-created_at')
+        tag = self.get_object(); serializer_class = post_list_serializer_class(request)
+        posts_queryset = serializer_class.prepare_queryset(Post.objects.filter(tags__name__in=[tag.name], is_published=True).order_by('-created_at'))
         paginator = PostLimitOffsetPagination(); page = paginator.paginate_queryset(posts_queryset, request, view=self)
-        if page is not None: serializer = PostSerializer(page, many=True, context={'request': request}); return paginator.get_paginated_response(serializer.data)
-        serializer = PostSerializer(posts_queryset, many=True, context={'request': request}); return Response(serializer.data)
+        if page is not None: serializer = serializer_class(page, many=True, context={'request': request}); return paginator.get_paginated_response(serializer.data)
+        serializer = serializer_class(posts_queryset, many=True, context={'request': request}); return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def popular(self, request):
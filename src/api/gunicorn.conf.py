@@ -0,0 +1,75 @@
+"""Gunicorn server profile for the QuillPad API.
+
+    gunicorn -c src/api/gunicorn.conf.py
+
+GUNICORN_WORKER_CLASS picks the worker model:
+  uvicorn  - (default) ASGI app, one event loop per process. The async read views and the SSE
+             streams (/api/posts/<id>/events/) hold no thread while they wait, so open streams cost
+             a coroutine each; sync DRF views still run on a thread per request, paying a small
+             hand-off from the loop.
+  gthread  - WSGI app, WEB_CONCURRENCY processes x GUNICORN_THREADS threads. Slightly cheaper for
+             the sync views, but every in-flight request holds a thread for its whole database round
+             trip, and the SSE streams can't be served at all (they answer 503 under WSGI). Only use
+             it when /api/posts/<id>/events/ is routed to a separate ASGI process.
+The worker count defaults to what the CPUs available to this process can keep busy. The app is
+preloaded in the master so the workers share its imported code copy-on-write.
+"""
+import gc
+import os
+
+from decouple import config as env  # a module-level `config` would clash with gunicorn's own setting of that name
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_CLASSES = {'gthread': 'gthread', 'uvicorn': 'uvicorn_worker.UvicornWorker'}
+
+
+def available_cpus():
+    # Honours CPU affinity (containers, taskset), unlike os.cpu_count()
+    try: return len(os.sched_getaffinity(0))
+    except AttributeError: return os.cpu_count() or 1
+
+
+worker_model = env('GUNICORN_WORKER_CLASS', default='uvicorn')
+if worker_model not in WORKER_CLASSES: raise RuntimeError(f"GUNICORN_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}, not '{worker_model}'.")
+cpus = available_cpus()
+
+chdir = APP_DIR
+wsgi_app = 'quillpad_backend.asgi:application' if worker_model == 'uvicorn' else 'quillpad_backend.wsgi:application'
+worker_class = WORKER_CLASSES[worker_model]
+# A thread-per-request worker blocks on I/O, so it wants more processes than an event-loop worker does
+workers = env('WEB_CONCURRENCY', default=cpus * 2 + 1 if worker_model == 'gthread' else cpus, cast=int)
+threads = env('GUNICORN_THREADS', default=4, cast=int) if worker_model == 'gthread' else 1
+bind = env('GUNICORN_BIND', default=f"0.0.0.0:{env('PORT', default='8000')}")
+
+preload_app = env('GUNICORN_PRELOAD', default=True, cast=bool)
+# Recycle workers to contain slow leaks; the jitter keeps them from all restarting at once
+max_requests = env('GUNICORN_MAX_REQUESTS', default=1000, cast=int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', default=max_requests // 10, cast=int)
+# Longer than the load balancer's idle timeout would leak sockets; shorter wastes handshakes
+keepalive = env('GUNICORN_KEEPALIVE', default=5, cast=int)
+timeout = env('GUNICORN_TIMEOUT', default=30, cast=int)
+graceful_timeout = env('GUNICORN_GRACEFUL_TIMEOUT', default=30, cast=int)
+backlog = env('GUNICORN_BACKLOG', default=2048, cast=int)
+# Heartbeat files on tmpfs, so a slow disk cannot make the arbiter kill healthy workers
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = env('GUNICORN_ACCESS_LOG', default=None)
+loglevel = env('GUNICORN_LOG_LEVEL', default='info')
+forwarded_allow_ips = env('FORWARDED_ALLOW_IPS', default='127.0.0.1')
+
+
+def when_ready(server):
+    server.log.info(f"Backend Server: {workers} {worker_model} workers x {threads} threads on {bind} ({cpus} CPUs, preload={preload_app}).")
+    if not preload_app: return
+    # Load (or generate) the OpenAPI schema once here rather than in every worker on its first /api/schema/ request
+    from quillpad_backend.schema import get_schema_document
+    get_schema_document()
+    # Nothing opened in the master may be inherited by the workers: neither connections nor pools (their threads do not survive fork)
+    from django.db import connections
+    connections.close_all()
+    for connection in connections.all(initialized_only=True):
+        if hasattr(connection, 'close_pool'): connection.close_pool()
+    # Move the preloaded objects out of the collector's view: collections in the workers would
+    # otherwise touch their refcount/GC headers and un-share the pages
+    gc.collect()
+    gc.freeze()
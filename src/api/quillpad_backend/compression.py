@@ -0,0 +1,233 @@
+"""Negotiated response compression (zstd, Brotli, gzip) for API responses.
+
+compression_middleware picks the first encoding in COMPRESSION_ENCODINGS (the server's preference)
+that the client's Accept-Encoding allows and whose library is installed (brotli and zstandard are
+optional), and compresses API responses (JSON, NDJSON, the OpenAPI schema) once they reach
+COMPRESSION_MIN_SIZE bytes. Streaming responses (NDJSON exports) are compressed chunk by chunk,
+flushing after every chunk so nothing is held back from the client.
+
+HTML is never compressed: pages such as the admin login embed a CSRF token next to reflected input,
+which is what BREACH needs, and neither is anything that fetched a CSRF token while rendering.
+Server-Sent Events are left alone too, so no frame waits behind a compressor or a proxy buffer.
+
+Static files are not touched here: WhiteNoise serves the .br/.gz files collectstatic wrote at build time.
+
+Bytes saved and compression CPU time are counted per endpoint (streams when they end) and reported at /api/metrics/.
+"""
+import threading
+import time
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import sync_and_async_middleware
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/vnd.oai.openapi')
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data): return self._compressor.compress(data)
+    def flush_chunk(self): return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+    def finish(self): return self._compressor.flush()
+
+
+class GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        stream = self.stream()
+        return stream.compress(data) + stream.finish()
+
+    def stream(self):
+        return _GzipStream(self.level)
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality, mode=brotli.MODE_TEXT)
+
+    def compress(self, data): return self._compressor.process(data)
+    def flush_chunk(self): return self._compressor.flush()
+    def finish(self): return self._compressor.finish()
+
+
+class BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.level, mode=brotli.MODE_TEXT)
+
+    def stream(self):
+        return _BrotliStream(self.level)
+
+
+class _ZstdStream:
+    def __init__(self, compressor):
+        self._compressor = compressor.compressobj()
+
+    def compress(self, data): return self._compressor.compress(data)
+    def flush_chunk(self): return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+    def finish(self): return self._compressor.flush()
+
+
+class ZstdEncoder:
+    name = 'zstd'
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def stream(self):
+        return _ZstdStream(self._compressor)
+
+
+ENCODERS = {'gzip': GzipEncoder, 'br': BrotliEncoder if brotli else None, 'zstd': ZstdEncoder if zstandard else None}
+
+
+@lru_cache(maxsize=None)
+def available_encoders():
+    levels = settings.COMPRESSION_LEVELS
+    return [ENCODERS[name](levels[name]) for name in settings.COMPRESSION_ENCODINGS if ENCODERS.get(name)]
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding):
+    """The encoder to use for an Accept-Encoding header, or None."""
+    accepted, wildcard = {}, None
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try: quality = float(value)
+                except ValueError: quality = 0.0
+        if name == '*': wildcard = quality
+        elif name: accepted[name] = quality
+    for encoder in available_encoders():
+        if accepted.get(encoder.name, wildcard or 0) > 0: return encoder
+    return None
+
+
+class CompressionMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: [0, 0, 0, 0.0])  # endpoint -> [responses, bytes in, bytes out, CPU seconds]
+
+    def record(self, endpoint, bytes_in, bytes_out, cpu_seconds):
+        with self._lock:
+            counts = self._counts[endpoint]
+            counts[0] += 1; counts[1] += bytes_in; counts[2] += bytes_out; counts[3] += cpu_seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: {'responses': responses, 'bytes_in': bytes_in, 'bytes_out': bytes_out,
+                               'saved_ratio': round(1 - bytes_out / bytes_in, 4) if bytes_in else 0,
+                               'cpu_us_per_response': round(cpu / responses * 1e6, 1)}
+                    for endpoint, (responses, bytes_in, bytes_out, cpu) in self._counts.items()}
+
+
+metrics = CompressionMetrics()
+
+
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else request.path
+
+
+def _compressible(request, response):
+    if response.has_header('Content-Encoding') or response.status_code in (204, 206, 304): return False
+    if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'): return False  # get_token() ran, so the body may hold the token
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or content_type.endswith('+json')
+
+
+def _chunk_encoder(encoder, endpoint):
+    """Returns encode(chunk, last=False): compresses and flushes one chunk; `last` ends the stream and records it."""
+    stream, totals = encoder.stream(), [0, 0, 0.0]
+
+    def encode(chunk, last=False):
+        started = time.thread_time()
+        data = (stream.compress(chunk) if chunk else b'') + (stream.finish() if last else stream.flush_chunk())
+        totals[0] += len(chunk); totals[1] += len(data); totals[2] += time.thread_time() - started
+        if last: metrics.record(endpoint, *totals)
+        return data
+
+    return encode
+
+
+def _compressed_sync(encoder, chunks, endpoint):
+    encode = _chunk_encoder(encoder, endpoint)
+    for chunk in chunks:
+        if chunk: yield encode(chunk)
+    yield encode(b'', last=True)
+
+
+async def _compressed_async(encoder, chunks, endpoint):
+    encode = _chunk_encoder(encoder, endpoint)
+    async for chunk in chunks:
+        if chunk: yield encode(chunk)
+    yield encode(b'', last=True)
+
+
+def compress_response(request, response):
+    if not _compressible(request, response) or request.path.startswith(settings.STATIC_URL): return response
+    if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE: return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    encoder = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    if encoder is None: return response
+
+    endpoint = _endpoint(request)
+    if response.streaming:
+        if response.is_async: response.streaming_content = _compressed_async(encoder, response.streaming_content, endpoint)
+        else: response.streaming_content = _compressed_sync(encoder, response.streaming_content, endpoint)
+        del response.headers['Content-Length']
+    else:
+        started = time.thread_time()
+        compressed = encoder.compress(response.content)
+        cpu = time.thread_time() - started
+        if len(compressed) >= len(response.content): return response
+        metrics.record(endpoint, len(response.content), len(compressed), cpu)
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+
+    # The body is no longer byte-identical to the uncompressed representation's
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'): response.headers['ETag'] = 'W/' + etag
+    response.headers['Content-Encoding'] = encoder.name
+    return response
+
+
+@sync_and_async_middleware
+def compression_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return compress_response(request, await get_response(request))
+    else:
+        def middleware(request):
+            return compress_response(request, get_response(request))
+    return middleware
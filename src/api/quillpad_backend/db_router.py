@@ -0,0 +1,180 @@
+"""Read-replica routing for safe-method API traffic.
+
+Replicas come from DATABASE_REPLICA_URLS and are registered as DATABASES['replica_<n>'].
+replica_routing_middleware marks GET/HEAD/OPTIONS requests as replica-readable; ReplicaRouter then
+sends their reads to one healthy replica, chosen once per request so the whole response comes from
+the same snapshot. Everything else (writes, unsafe methods, management commands, reads inside a
+transaction, and any read after the request has written) goes to `default`.
+
+Read-your-writes: a successful unsafe request sets a short-lived pin cookie, and requests carrying
+it read from the primary until it expires (REPLICA_PIN_SECONDS), by which time the replicas have
+caught up.
+
+Health: each replica is checked at most every REPLICA_HEALTH_CHECK_INTERVAL seconds, on the request
+path, by the first request that needs it (a trivial query, or the replay lag on PostgreSQL). A replica that
+fails the check, lags more than REPLICA_MAX_LAG_SECONDS or has a query fail at the connection level is
+taken out of rotation until a later check passes; with no healthy replica reads fall back to the
+primary.
+"""
+import contextvars
+import itertools
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.db.utils import DatabaseError, InterfaceError, OperationalError
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+REPLICA_PREFIX = 'replica_'
+PIN_COOKIE = 'quillpad_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# None outside replica-readable requests; otherwise a dict holding the request's routing state
+_request_state = contextvars.ContextVar('replica_routing', default=None)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+class ReplicaHealth:
+    """Per-process health of each replica, refreshed lazily and at most once per interval."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._healthy = {}    # alias -> bool
+        self._checked = {}    # alias -> monotonic time of the last check
+        self._checking = set()
+        self._turns = itertools.count()
+
+    def healthy(self, aliases):
+        now, interval = time.monotonic(), settings.REPLICA_HEALTH_CHECK_INTERVAL
+        for alias in aliases:
+            with self._lock:
+                due = now - self._checked.get(alias, float('-inf')) >= interval and alias not in self._checking
+                if due: self._checking.add(alias)
+            if due:
+                try: self._set(alias, *self.check(alias))
+                finally:
+                    with self._lock: self._checking.discard(alias)
+        # An unchecked replica (another thread is running its first check) is not used yet
+        return [alias for alias in aliases if self._healthy.get(alias)]
+
+    def choose(self, aliases):
+        healthy = self.healthy(aliases)
+        return healthy[next(self._turns) % len(healthy)] if healthy else None
+
+    def check(self, alias):
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute("SELECT CASE WHEN pg_is_in_recovery() THEN COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END")
+                    lag = float(cursor.fetchone()[0])
+                    # On an idle primary this also grows with the time since the last write; erring towards the primary is safe
+                    if lag > settings.REPLICA_MAX_LAG_SECONDS: return False, f"replication lag {lag:.1f}s"
+                else:
+                    # Touches a table, so an empty or detached database fails too
+                    cursor.execute("SELECT 1 FROM django_migrations LIMIT 1")
+                    cursor.fetchone()
+        except DatabaseError as exc:
+            connection.close()
+            return False, str(exc).strip() or type(exc).__name__
+        return True, None
+
+    def mark_down(self, alias, reason):
+        self._set(alias, False, reason)
+
+    def _set(self, alias, healthy, reason=None):
+        with self._lock:
+            was = self._healthy.get(alias)
+            self._healthy[alias], self._checked[alias] = healthy, time.monotonic()
+        if healthy and was is False: logger.info(f"Backend DB Router: Replica '{alias}' is back in rotation.")
+        elif not healthy and was is not False: logger.warning(f"Backend DB Router: Replica '{alias}' taken out of rotation: {reason}")
+
+
+health = ReplicaHealth()
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None: return None
+        # Inside a transaction on the primary, reads must see its uncommitted writes
+        if state['pinned'] or connections[DEFAULT_DB_ALIAS].in_atomic_block: return DEFAULT_DB_ALIAS
+        if 'alias' not in state:
+            state['alias'] = health.choose(replica_aliases())
+        return state['alias']
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None: state['pinned'] = True  # later reads in this request must see the write
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary, so objects read from either may be related
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases: return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication, never through migrate
+        return False if db.startswith(REPLICA_PREFIX) else None
+
+
+def _is_pinned(request):
+    try: return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError: return False
+
+
+def _begin(request):
+    if request.method not in SAFE_METHODS: return None
+    return _request_state.set({'pinned': _is_pinned(request)})
+
+
+def _pin_after_write(request, response):
+    if request.method not in SAFE_METHODS and response.status_code < 400:
+        seconds = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(PIN_COOKIE, f'{time.time() + seconds:.0f}', max_age=seconds, httponly=True, samesite='Lax', secure=request.is_secure())
+    return response
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = _begin(request)
+            try: response = await get_response(request)
+            finally:
+                if token is not None: _request_state.reset(token)
+            return _pin_after_write(request, response)
+    else:
+        def middleware(request):
+            token = _begin(request)
+            try: response = get_response(request)
+            finally:
+                if token is not None: _request_state.reset(token)
+            return _pin_after_write(request, response)
+    return middleware
+
+
+def _watch_replica(sender, connection, **kwargs):
+    """Takes a replica out of rotation as soon as one of its queries fails at the connection level."""
+    if not connection.alias.startswith(REPLICA_PREFIX): return
+
+    def execute(execute, sql, params, many, context):
+        try: return execute(sql, params, many, context)
+        except (OperationalError, InterfaceError) as exc:
+            health.mark_down(connection.alias, str(exc).strip() or type(exc).__name__)
+            raise
+
+    connection.execute_wrappers.append(execute)
+
+
+connection_created.connect(_watch_replica, dispatch_uid='quillpad_replica_watch')
@@ -0,0 +1,63 @@
+"""orjson-backed JSON renderer and parser for the API (JSON_BACKEND = 'orjson').
+
+ORJSONRenderer produces the same bytes as DRF's JSONRenderer for compact, non-ASCII-escaped output
+(the API's defaults). Datetimes, dates, times, Decimals and anything else orjson doesn't encode
+natively go through DRF's own JSONEncoder.default, so they are formatted exactly as before. UUIDs
+are encoded natively, in the same form as str(uuid). Indented output (the browsable API,
+`Accept: application/json; indent=4`), UNICODE_JSON = False, and data orjson refuses (integers
+wider than 64 bits, non-string dict keys) fall back to the standard library. Unlike DRF with
+STRICT_JSON, non-finite floats are rendered as null instead of raising.
+
+ORJSONParser rejects NaN and Infinity, as JSONParser does with STRICT_JSON.
+
+Without orjson installed both classes behave exactly like DRF's.
+"""
+from django.conf import settings
+from rest_framework import renderers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Dates and times go to DRF's encoder ('Z' for UTC, microseconds kept) rather than orjson's own format
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+_encode_default = JSONEncoder().default
+
+
+def orjson_dumps(data):
+    """Compact JSON bytes for data, or None when orjson is missing or can't encode it."""
+    if orjson is None: return None
+    try: ret = orjson.dumps(data, default=_encode_default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError: return None
+    # As JSONRenderer: keep the output a strict JavaScript subset
+    if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret: ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is not None and self.compact and not self.ensure_ascii and self.get_indent(accepted_media_type, renderer_context or {}) is None:
+            ret = orjson_dumps(data)
+            if ret is not None: return ret
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower() not in ('utf-8', 'utf8'): return super().parse(stream, media_type, parser_context)
+        try: return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc: raise ParseError(f'JSON parse error - {exc}')
+
+
+def render_json(data):
+    """data rendered as the API's configured JSON renderer would, for views that don't go through DRF."""
+    return api_settings.DEFAULT_RENDERER_CLASSES[0]().render(data)
@@ -0,0 +1,67 @@
+"""Password hashers whose work factors come from settings.PASSWORD_HASH_WORK_FACTORS.
+
+They keep the algorithm names of Django's own hashers, so existing hashes keep verifying. When the
+preferred algorithm (PASSWORD_HASH_ALGORITHM) or a work factor changes, Django's check_password
+re-hashes a user's password with the current policy on their next successful login.
+
+Hashing runs in a bounded per-process thread pool (PASSWORD_HASH_THREADS, default one per CPU).
+hashlib, argon2-cffi and bcrypt release the GIL while hashing, so the pool uses every core, and it
+caps how many hashes (and argon2 memory blocks) are in flight at once: under ASGI each request's
+sync code gets its own thread, so a login burst would otherwise hash on as many threads as there
+are concurrent requests.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def hash_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                threads = settings.PASSWORD_HASH_THREADS or len(os.sched_getaffinity(0))
+                _pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='password-hash', initializer=_mark_pool_thread)
+    return _pool
+
+
+def _mark_pool_thread():
+    _local.in_pool = True
+
+
+def in_hash_pool(fn, *args):
+    """Runs fn(*args) on the hashing pool and waits for the result."""
+    if getattr(_local, 'in_pool', False): return fn(*args)  # e.g. PBKDF2's verify() calling encode()
+    return hash_pool().submit(fn, *args).result()
+
+
+class PooledHasherMixin:
+    def encode(self, password, salt, *args):
+        return in_hash_pool(super().encode, password, salt, *args)
+
+    def verify(self, password, encoded):
+        return in_hash_pool(super().verify, password, encoded)
+
+    def harden_runtime(self, password, encoded):
+        return in_hash_pool(super().harden_runtime, password, encoded)
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    time_cost = property(lambda self: settings.PASSWORD_HASH_WORK_FACTORS['argon2_time_cost'])
+    memory_cost = property(lambda self: settings.PASSWORD_HASH_WORK_FACTORS['argon2_memory_cost'])
+    parallelism = property(lambda self: settings.PASSWORD_HASH_WORK_FACTORS['argon2_parallelism'])
+
+
+class BCryptSHA256PasswordHasher(PooledHasherMixin, hashers.BCryptSHA256PasswordHasher):
+    rounds = property(lambda self: settings.PASSWORD_HASH_WORK_FACTORS['bcrypt_rounds'])
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    iterations = property(lambda self: settings.PASSWORD_HASH_WORK_FACTORS['pbkdf2_iterations'])
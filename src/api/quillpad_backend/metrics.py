@@ -0,0 +1,46 @@
+"""Process-level runtime metrics for operators (connection pools, throttling, compression), served at /api/metrics/ (staff only).
+
+Every gunicorn/uvicorn worker is its own process with its own pools and counters, so a response
+describes the worker that happened to serve it; sample repeatedly or scrape each worker to see all.
+"""
+import os
+
+from django.db import connections
+from rest_framework import permissions
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.response import Response
+
+from .compression import metrics as compression_metrics
+from .throttling import metrics as throttle_metrics
+
+
+def db_pool_metrics():
+    """Stats of the psycopg connection pools this process has created, keyed by database alias."""
+    metrics = {}
+    for connection in connections.all():
+        pool = getattr(type(connection), '_connection_pools', {}).get(connection.alias)
+        if pool is None or pool.closed: continue  # created but not opened yet: nothing to report
+        stats = pool.get_stats()
+        size, available = stats.get('pool_size', 0), stats.get('pool_available', 0)
+        requests, waited_ms = stats.get('requests_num', 0), stats.get('requests_wait_ms', 0)
+        metrics[connection.alias] = {
+            'min_size': pool.min_size, 'max_size': pool.max_size,
+            'size': size, 'idle': available, 'in_use': size - available,
+            'utilization': round((size - available) / pool.max_size, 3) if pool.max_size else 0,
+            'waiting': stats.get('requests_waiting', 0),
+            'requests': requests,
+            'requests_queued': stats.get('requests_queued', 0),  # had to wait for a connection
+            'requests_timed_out': stats.get('requests_errors', 0),
+            'avg_wait_ms': round(waited_ms / requests, 2) if requests else 0,
+            'connections_opened': stats.get('connections_num', 0),
+            'connections_failed': stats.get('connections_errors', 0),
+            'connections_lost': stats.get('connections_lost', 0),  # failed the health check when lent out
+            'returns_bad': stats.get('returns_bad', 0),
+        }
+    return metrics
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    return Response({'pid': os.getpid(), 'db_pool': db_pool_metrics(), 'throttling': throttle_metrics.snapshot(), 'compression': compression_metrics.snapshot()})
@@ -0,0 +1,117 @@
+"""The OpenAPI schema, generated once per code version instead of on every /api/schema/ request.
+
+`manage.py build_schema` (run on release) writes the schema to SCHEMA_FILE, stamped with a fingerprint of
+the code it describes: the project's Python sources, the versions of the libraries that shape it, and
+SPECTACULAR_SETTINGS. A process loads that file the first time it needs the schema (the gunicorn master
+does so before forking) and only generates the schema itself when the file is missing or its fingerprint
+doesn't match, i.e. when the code changed since the file was written. Each rendering (YAML, JSON, an
+indent) is then made once and served from memory with an ETag, so unchanged clients get a 304.
+
+Requests for a translated (?lang=) or versioned (?version=) schema are still generated per request.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from functools import lru_cache
+from importlib.metadata import PackageNotFoundError, version
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from drf_spectacular.views import SpectacularAPIView
+
+logger = logging.getLogger(__name__)
+
+# Libraries whose version changes the generated document
+SCHEMA_PACKAGES = ('Django', 'djangorestframework', 'drf-spectacular', 'django-filter', 'django-taggit', 'djoser')
+
+_document = None
+_document_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def code_fingerprint():
+    digest = hashlib.sha256()
+    for path in sorted(settings.BASE_DIR.rglob('*.py')):
+        if '__pycache__' in path.parts: continue
+        digest.update(str(path.relative_to(settings.BASE_DIR)).encode()); digest.update(path.read_bytes())
+    for package in SCHEMA_PACKAGES:
+        try: digest.update(f'{package}=={version(package)}'.encode())
+        except PackageNotFoundError: pass
+    digest.update(repr(sorted(settings.SPECTACULAR_SETTINGS.items())).encode())
+    return digest.hexdigest()
+
+
+def generate_schema():
+    """The schema as SpectacularAPIView builds it for an anonymous, public request."""
+    view = SpectacularAPIView
+    return view.generator_class(urlconf=view.urlconf, patterns=view.patterns).get_schema(request=None, public=view.serve_public)
+
+
+def write_schema_file(path=None):
+    """Generates the schema and writes it with the current code fingerprint; returns the generation time in seconds."""
+    started = time.perf_counter()
+    schema = generate_schema()
+    elapsed = time.perf_counter() - started
+    with open(path or settings.SCHEMA_FILE, 'w') as file:
+        json.dump({'fingerprint': code_fingerprint(), 'schema': schema}, file)
+    return elapsed
+
+
+def read_schema_file(path=None):
+    """The schema from the file, or None if it's missing, unreadable or written for other code."""
+    try:
+        with open(path or settings.SCHEMA_FILE) as file: stored = json.load(file)
+    except (OSError, ValueError): return None
+    if stored.get('fingerprint') != code_fingerprint():
+        logger.info(f"Backend Schema: {path or settings.SCHEMA_FILE} was built for other code; regenerating.")
+        return None
+    return stored['schema']
+
+
+class SchemaDocument:
+    def __init__(self, schema):
+        self.schema = schema
+        self._renderings = {}  # (renderer class, indent) -> (body, etag); DRF caps the indent, so this stays small
+        self._lock = threading.Lock()
+
+    def render(self, renderer, media_type):
+        indent = renderer.get_indent(media_type, {}) if hasattr(renderer, 'get_indent') else None
+        key = (type(renderer), indent)
+        if key not in self._renderings:
+            with self._lock:
+                if key not in self._renderings:
+                    body = renderer.render(self.schema, media_type, {})
+                    self._renderings[key] = body, f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        return self._renderings[key]
+
+
+def get_schema_document():
+    global _document
+    if _document is None:
+        with _document_lock:
+            if _document is None:
+                schema = read_schema_file()
+                if schema is None:
+                    started = time.perf_counter()
+                    schema = generate_schema()
+                    logger.info(f"Backend Schema: Generated the OpenAPI schema in {time.perf_counter() - started:.2f}s; run `manage.py build_schema` on release to skip this.")
+                _document = SchemaDocument(schema)
+    return _document
+
+
+class CachedSpectacularAPIView(SpectacularAPIView):
+    """SpectacularAPIView serving the per-process SchemaDocument, with the same content negotiation and headers."""
+
+    def get(self, request, *args, **kwargs):
+        if self.custom_settings or self.api_version or request.version or request.GET.get('version') or (settings.USE_I18N and request.GET.get('lang')):
+            return super().get(request, *args, **kwargs)
+        renderer = request.accepted_renderer
+        body, etag = get_schema_document().render(renderer, request.accepted_media_type)
+        not_modified = get_conditional_response(request, etag=etag)
+        response = not_modified or HttpResponse(body, content_type=f'{renderer.media_type}; charset={renderer.charset}' if renderer.charset else renderer.media_type)
+        response.headers['ETag'] = etag
+        response.headers['Content-Disposition'] = f'inline; filename="{self._get_filename(request, None)}"'
+        return response
@@ -74,11 +74,43 @@ WSGI_APPLICATION = 'quillpad_backend.wsgi.application'
 
 DATABASE_URL = config('DATABASE_URL', default=None)
 if DATABASE_URL:
-    DATABASES = { 'default': dj_database_url.config(conn_max_age=600, ssl_require=config('DB_SSL_REQUIRE', default=not DEBUG, cast=bool)) }
+    DATABASES = { 'default': dj_database_url.config(conn_max_age=600, conn_health_checks=True, ssl_require=config('DB_SSL_REQUIRE', default=not DEBUG, cast=bool)) }
 else:
     DATABASES = { 'default': { 'ENGINE': 'django.db.backends.sqlite3', 'NAME': BASE_DIR / 'db.sqlite3', } }
 
+# Read replicas for safe-method requests (see quillpad_backend/db_router.py); each URL becomes DATABASES['replica_<n>']
+DATABASE_REPLICA_URLS = config('DATABASE_REPLICA_URLS', cast=Csv(), default='')
+for index, url in enumerate(DATABASE_REPLICA_URLS): DATABASES[f'replica_{index}'] = { **dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True), 'TEST': {'MIRROR': 'default'} }
+DATABASE_ROUTERS = ['quillpad_backend.db_router.ReplicaRouter'] if DATABASE_REPLICA_URLS else []
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int) # reads stay on the primary this long after a user's write
+REPLICA_HEALTH_CHECK_INTERVAL = config('REPLICA_HEALTH_CHECK_INTERVAL', default=10, cast=int); REPLICA_MAX_LAG_SECONDS = config('REPLICA_MAX_LAG_SECONDS', default=30, cast=int)
+# psycopg 3 connection pool per worker process (PostgreSQL only) instead of one persistent connection per thread.
+# Keep WEB_CONCURRENCY x DB_POOL_MAX_SIZE (per database) below the server's max_connections.
+DB_POOL = config('DB_POOL', default=False, cast=bool)
+DB_POOL_OPTIONS = { 'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int), 'max_size': config('DB_POOL_MAX_SIZE', default=config('GUNICORN_THREADS', default=4, cast=int), cast=int), 'timeout': config('DB_POOL_TIMEOUT', default=10.0, cast=float), 'max_idle': config('DB_POOL_MAX_IDLE', default=300.0, cast=float), 'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=3600.0, cast=float), }
+if DB_POOL:
+    # Pooling replaces persistent connections; CONN_HEALTH_CHECKS makes the pool check each connection before lending it
+    for alias, database in DATABASES.items():
+        if database['ENGINE'] == 'django.db.backends.postgresql': database.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True, OPTIONS={ **database.get('OPTIONS', {}), 'pool': { **DB_POOL_OPTIONS, 'name': f'quillpad-{alias}' } })
+# Response compression (quillpad_backend/compression.py); outermost after SecurityMiddleware so it sees final bodies
+COMPRESSION_ENCODINGS = config('COMPRESSION_ENCODINGS', cast=Csv(), default='zstd,br,gzip') # server preference; br and zstd need brotli/zstandard installed
+COMPRESSION_LEVELS = {'zstd': config('COMPRESSION_ZSTD_LEVEL', default=3, cast=int), 'br': config('COMPRESSION_BROTLI_QUALITY', default=4, cast=int), 'gzip': config('COMPRESSION_GZIP_LEVEL', default=6, cast=int)}
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int) # bytes; smaller bodies are sent as they are
+if COMPRESSION_ENCODINGS: MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'quillpad_backend.compression.compression_middleware')
+if DATABASE_REPLICA_URLS: MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'quillpad_backend.db_router.replica_routing_middleware')
+
 AUTH_PASSWORD_VALIDATORS = [ {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',}, {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',}, {'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',}, {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',}, ]
+# Password hashing (quillpad_backend/hashers.py). Production work factors are the OWASP Password Storage Cheat Sheet
+# minimums (cheaper than Django's defaults); 'loadtest' makes hashing nearly free for load tests and must not be used in production.
+# Hashes made under another algorithm or work factor are upgraded on the user's next successful login.
+PASSWORD_HASH_ALGORITHM = config('PASSWORD_HASH_ALGORITHM', default='argon2') # argon2, bcrypt or pbkdf2
+PASSWORD_HASH_PROFILE = config('PASSWORD_HASH_PROFILE', default='production') # production or loadtest
+PASSWORD_HASH_PROFILES = {'production': {'argon2_time_cost': 2, 'argon2_memory_cost': 19456, 'argon2_parallelism': 1, 'bcrypt_rounds': 10, 'pbkdf2_iterations': 600_000}, 'loadtest': {'argon2_time_cost': 1, 'argon2_memory_cost': 256, 'argon2_parallelism': 1, 'bcrypt_rounds': 4, 'pbkdf2_iterations': 1_000}}
+PASSWORD_HASH_WORK_FACTORS = {name: config(f'PASSWORD_{name.upper()}', default=value, cast=int) for name, value in PASSWORD_HASH_PROFILES[PASSWORD_HASH_PROFILE].items()} # e.g. PASSWORD_BCRYPT_ROUNDS=12
+PASSWORD_HASH_THREADS = config('PASSWORD_HASH_THREADS', default=0, cast=int) # per process; 0 = one per CPU
+PASSWORD_HASH_ALGORITHMS = {'argon2': 'quillpad_backend.hashers.Argon2PasswordHasher', 'bcrypt': 'quillpad_backend.hashers.BCryptSHA256PasswordHasher', 'pbkdf2': 'quillpad_backend.hashers.PBKDF2PasswordHasher'}
+PASSWORD_HASHERS = [PASSWORD_HASH_ALGORITHMS[PASSWORD_HASH_ALGORITHM], *(path for name, path in PASSWORD_HASH_ALGORITHMS.items() if name != PASSWORD_HASH_ALGORITHM), 'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher', 'django.contrib.auth.hashers.ScryptPasswordHasher'] # the first one hashes; all of them verify
+if not DEBUG and PASSWORD_HASH_PROFILE == 'loadtest': print("WARNING: PASSWORD_HASH_PROFILE=loadtest in production; new password hashes are weak!")
 LANGUAGE_CODE = 'en-us'; TIME_ZONE = 'UTC'; USE_I18N = True; USE_TZ = True
 
 STATIC_URL = '/static/'
@@ -86,7 +118,8 @@ if DEBUG:
     STATICFILES_DIRS = [ BASE_DIR.parent / 'static_dev_assets' ]
 else:
     STATIC_ROOT = BASE_DIR.parent / 'staticfiles_collected'
-    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+    # Hashed names plus .gz/.br copies written by collectstatic (.br needs brotli), served by WhiteNoise as negotiated
+    STORAGES = { 'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}, 'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'}, }
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = config('MEDIA_ROOT', default=str(BASE_DIR.parent / 'mediafiles_local_dev'))
@@ -96,6 +129,15 @@ AUTH_USER_MODEL = 'users.User'
 SITE_ID = 1
 
 REST_FRAMEWORK = { 'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.TokenAuthentication',], 'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticatedOrReadOnly',], 'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema', 'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend','rest_framework.filters.SearchFilter','rest_framework.filters.OrderingFilter',], }
+JSON_BACKEND = config('JSON_BACKEND', default='orjson') # 'orjson' (quillpad_backend/fastjson.py, same output as DRF's; stdlib json if orjson isn't installed) or 'stdlib'
+JSON_RENDERERS = {'orjson': ('quillpad_backend.fastjson.ORJSONRenderer', 'quillpad_backend.fastjson.ORJSONParser'), 'stdlib': ('rest_framework.renderers.JSONRenderer', 'rest_framework.parsers.JSONParser')}
+REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [JSON_RENDERERS[JSON_BACKEND][0], 'rest_framework.renderers.BrowsableAPIRenderer']
+REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'] = [JSON_RENDERERS[JSON_BACKEND][1], 'rest_framework.parsers.FormParser', 'rest_framework.parsers.MultiPartParser']
+# Token-bucket throttles (quillpad_backend/throttling.py): 'N/period' = bursts of up to N, refilled at N per period
+THROTTLE_ENABLED = config('THROTTLE_ENABLED', default=True, cast=bool) # the benchmark commands turn it off
+THROTTLE_REDIS_URL = config('THROTTLE_REDIS_URL', default='') # shared buckets across workers; per-process buckets when empty
+REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = ['quillpad_backend.throttling.UserTokenBucketThrottle', 'quillpad_backend.throttling.AnonTokenBucketThrottle', 'quillpad_backend.throttling.ScopedTokenBucketThrottle']
+REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = { 'user': config('THROTTLE_RATE_USER', default='300/min'), 'anon': config('THROTTLE_RATE_ANON', default='120/min'), 'read': config('THROTTLE_RATE_READ', default='600/min'), 'login': config('THROTTLE_RATE_LOGIN', default='20/min'), 'register': config('THROTTLE_RATE_REGISTER', default='30/hour'), 'post_view': config('THROTTLE_RATE_POST_VIEW', default='60/min'), 'like': config('THROTTLE_RATE_LIKE', default='60/min'), }
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', cast=Csv(), default=','.join(list(set(CSRF_TRUSTED_ORIGINS_DEFAULTS))))
 CORS_ALLOW_CREDENTIALS = True
 if not DEBUG and not CORS_ALLOWED_ORIGINS: print("WARNING: CORS_ALLOWED_ORIGINS not set for production!")
@@ -104,6 +146,15 @@ EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.conso
 if EMAIL_BACKEND == 'django.core.mail.backends.smtp.EmailBackend': EMAIL_HOST = config('EMAIL_HOST', default=''); EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int); EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool); EMAIL_HOST_USER = config('EMAIL_HOST_USER', default=''); EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='');
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='webmaster@localhost')
 SPECTACULAR_SETTINGS = { 'TITLE': 'QuillPad API', 'VERSION': '1.0.0', 'SERVE_INCLUDE_SCHEMA': DEBUG, }
+SCHEMA_FILE = config('SCHEMA_FILE', default=str(BASE_DIR / 'openapi-schema.json')) # written by `manage.py build_schema`, served by quillpad_backend/schema.py
+FAST_READS = config('FAST_READS', default=True, cast=bool) # post lists and comment threads skip the serializers (blog/readers.py); same JSON either way
+POST_EXCERPT_LENGTH = config('POST_EXCERPT_LENGTH', default=200, cast=int) # characters of plain text stored per post for list responses; run `manage.py backfill_excerpts` after changing it
+PLATFORM_STATS_MAX_AGE = config('PLATFORM_STATS_MAX_AGE', default=60, cast=int) # seconds /posts/stats/ may lag behind the tables
+PLATFORM_STATS_DAYS = config('PLATFORM_STATS_DAYS', default=30, cast=int)
+TRENDING_HALF_LIFE_HOURS = config('TRENDING_HALF_LIFE_HOURS', default=24.0, cast=float); TRENDING_WINDOW_DAYS = config('TRENDING_WINDOW_DAYS', default=7, cast=int); TRENDING_SIZE = config('TRENDING_SIZE', default=100, cast=int)
+RELATED_POSTS_K = config('RELATED_POSTS_K', default=5, cast=int); RELATED_POSTS_CANDIDATES = config('RELATED_POSTS_CANDIDATES', default=500, cast=int) # candidate pool for the on-save update
+TIMELINE_MAX_LENGTH = config('TIMELINE_MAX_LENGTH', default=500, cast=int); TIMELINE_FANOUT_LIMIT = config('TIMELINE_FANOUT_LIMIT', default=5000, cast=int) # targets with more followers are pulled at read time
+EVENTS_REDIS_URL = config('EVENTS_REDIS_URL', default=''); EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=100, cast=int); EVENTS_HEARTBEAT_SECONDS = config('EVENTS_HEARTBEAT_SECONDS', default=15, cast=int) # /posts/<id>/events/ (SSE, needs ASGI)
 MARKDOWNX_MARKDOWN_EXTENSIONS = ['markdown.extensions.extra','markdown.extensions.codehilite',]
 
 if not DEBUG:
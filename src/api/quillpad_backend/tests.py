@@ -0,0 +1,154 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.middleware.csrf import get_token
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import db_router
+from .compression import compress_response
+from .db_router import PIN_COOKIE, ReplicaHealth, ReplicaRouter, replica_routing_middleware
+
+User = get_user_model()
+
+REPLICA, BROKEN_REPLICA = 'replica_0', 'replica_1'
+
+
+@override_settings(DATABASE_ROUTERS=['quillpad_backend.db_router.ReplicaRouter'], REPLICA_PIN_SECONDS=5, REPLICA_HEALTH_CHECK_INTERVAL=60, REPLICA_MAX_LAG_SECONDS=30)
+class ReplicaRoutingTests(TransactionTestCase):
+    """quillpad_backend/db_router.py against two SQLite aliases: the test database and a replica
+    mirroring it (a second connection to the same shared in-memory database)."""
+    databases = {DEFAULT_DB_ALIAS}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registered once the test database exists, so the alias opens the same shared in-memory database;
+        # the test runner never sees it, and a mirror is neither created nor flushed
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        connections.settings[REPLICA] = {**primary, 'TEST': {**primary['TEST'], 'MIRROR': DEFAULT_DB_ALIAS}}
+        cls.databases = {DEFAULT_DB_ALIAS, REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.databases = {DEFAULT_DB_ALIAS}
+        super().tearDownClass()
+
+    def setUp(self):
+        self.health = ReplicaHealth()
+        for target, value in (('health', self.health), ('replica_aliases', lambda: [REPLICA])):
+            patcher = mock.patch.object(db_router, target, value)
+            patcher.start(); self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='reader', email='reader@example.com', password='pw12345!')
+        self.factory = RequestFactory()
+        self.routed = []
+
+    def view(self, request):
+        """Records where the request's reads went, and writes on POST."""
+        if request.method == 'POST': User.objects.filter(pk=self.user.pk).update(first_name='Written')
+        self.routed.append(User.objects.filter(pk=self.user.pk).db)
+        return HttpResponse()
+
+    def serve(self, request):
+        return replica_routing_middleware(self.view)(request)
+
+    def test_reads_go_to_the_replica(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica, CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            replica_routing_middleware(lambda request: HttpResponse(User.objects.get(pk=self.user.pk).username))(self.factory.get('/'))
+        self.assertEqual(len(replica), 2)  # the health check, then the read
+        self.assertEqual(len(primary), 0)
+
+    def test_writes_and_unsafe_requests_use_the_primary(self):
+        response = self.serve(self.factory.post('/'))
+        self.assertEqual(self.routed, [DEFAULT_DB_ALIAS])
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(ReplicaRouter().db_for_write(User), DEFAULT_DB_ALIAS)
+
+    def test_a_write_pins_the_rest_of_the_request(self):
+        def view(request):
+            self.routed.append(User.objects.all().db)
+            User.objects.filter(pk=self.user.pk).update(first_name='Written')
+            self.routed.append(User.objects.all().db)
+            return HttpResponse()
+        replica_routing_middleware(view)(self.factory.get('/'))
+        self.assertEqual(self.routed, [REPLICA, DEFAULT_DB_ALIAS])
+
+    def test_pinned_requests_read_from_the_primary(self):
+        pin = self.serve(self.factory.post('/')).cookies[PIN_COOKIE].value
+        self.factory.cookies[PIN_COOKIE] = pin
+        self.serve(self.factory.get('/'))
+        self.factory.cookies[PIN_COOKIE] = '1'  # expired
+        self.serve(self.factory.get('/'))
+        self.assertEqual(self.routed, [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS, REPLICA])
+
+    def test_reads_inside_a_transaction_use_the_primary(self):
+        def view(request):
+            with transaction.atomic(): self.routed.append(User.objects.all().db)
+            return HttpResponse()
+        replica_routing_middleware(view)(self.factory.get('/'))
+        self.assertEqual(self.routed, [DEFAULT_DB_ALIAS])
+
+    def test_routing_state_ends_with_the_request(self):
+        self.serve(self.factory.get('/'))
+        self.assertIsNone(db_router._request_state.get())
+        self.assertIsNone(ReplicaRouter().db_for_read(User))  # outside a request: Django's default routing
+
+    def test_reads_fall_back_while_the_replica_is_down(self):
+        self.health.mark_down(REPLICA, 'test')
+        self.serve(self.factory.get('/'))
+        self.health._set(REPLICA, True)
+        self.serve(self.factory.get('/'))
+        self.assertEqual(self.routed, [DEFAULT_DB_ALIAS, REPLICA])
+
+    def test_failed_health_checks_take_a_replica_out_of_rotation(self):
+        connections.settings[BROKEN_REPLICA] = {**connections[REPLICA].settings_dict, 'NAME': '/nonexistent/quillpad/replica.sqlite3'}
+        self.addCleanup(connections.settings.pop, BROKEN_REPLICA)
+        self.addCleanup(connections.__delitem__, BROKEN_REPLICA)
+        patcher = mock.patch.object(type(self), 'databases', {*self.databases, BROKEN_REPLICA})
+        patcher.start(); self.addCleanup(patcher.stop)
+        self.assertEqual(self.health.healthy([BROKEN_REPLICA, REPLICA]), [REPLICA])
+        with mock.patch.object(db_router, 'replica_aliases', lambda: [BROKEN_REPLICA]):
+            self.serve(self.factory.get('/'))
+        self.assertEqual(self.routed, [DEFAULT_DB_ALIAS])
+
+
+@override_settings(COMPRESSION_MIN_SIZE=1024)
+class CompressionTests(SimpleTestCase):
+    """quillpad_backend/compression.py compresses API payloads only."""
+    body = {'results': [{'title': f'Post {i}', 'excerpt': 'Lorem ipsum dolor sit amet. ' * 4} for i in range(50)]}
+
+    def compress(self, response, request=None):
+        return compress_response(request or RequestFactory().get('/api/posts/', HTTP_ACCEPT_ENCODING='gzip'), response)
+
+    def test_json_is_compressed(self):
+        for response in (JsonResponse(self.body), JsonResponse(self.body, content_type='application/problem+json')):
+            with self.subTest(content_type=response['Content-Type']):
+                self.assertEqual(self.compress(response)['Content-Encoding'], 'gzip')
+
+    def test_html_is_not_compressed(self):
+        response = self.compress(HttpResponse('<p>Hello</p>' * 200))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_responses_that_rendered_a_csrf_token_are_not_compressed(self):
+        request = RequestFactory().get('/api/posts/', HTTP_ACCEPT_ENCODING='gzip')
+        get_token(request)
+        self.assertFalse(self.compress(JsonResponse(self.body), request).has_header('Content-Encoding'))
+
+    def test_event_streams_are_not_compressed(self):
+        response = self.compress(StreamingHttpResponse(iter([b'data: {}\n\n'] * 200), content_type='text/event-stream'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(next(iter(response.streaming_content)), b'data: {}\n\n')
+
+
+class AdminCompressionTests(TestCase):
+
+    def test_admin_login_is_not_compressed(self):
+        response = self.client.get('/admin/login/', HTTP_ACCEPT_ENCODING='gzip, br, zstd')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertFalse(response.has_header('Content-Encoding'))
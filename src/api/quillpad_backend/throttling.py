@@ -0,0 +1,201 @@
+"""Token-bucket throttles for DRF.
+
+Rates use DRF's 'N/period' syntax and are read from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']:
+a bucket holds N tokens, refills at N per period and each request takes one, so a client may burst
+up to N requests and then sustain N per period. A request that does the work of several (a bulk
+action) can take several at once; one costing more than N needs a full bucket. Unlike DRF's built-in throttles (a list of request
+timestamps per client, rewritten in the cache on every request) a bucket is two numbers.
+
+Buckets live in Redis when THROTTLE_REDIS_URL is set (shared by every worker; one atomic script
+call per check) and otherwise in a per-process LocalBucketStore. If Redis is unreachable, checks
+fall back to the local store rather than failing requests.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+REDIS_KEY_PREFIX = 'quillpad:throttle:'
+LOCAL_MAX_BUCKETS = 100_000
+REDIS_RETRY_SECONDS = 5
+
+# KEYS[1] bucket; ARGV capacity, refill per second, tokens to take. Uses the Redis clock so app servers' clocks don't matter.
+TAKE_SCRIPT = """
+local capacity, rate, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), math.min(tonumber(ARGV[3]), tonumber(ARGV[1]))
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens, ts = tonumber(bucket[1]), tonumber(bucket[2])
+if tokens == nil then tokens, ts = capacity, now end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(wait)
+"""
+
+
+class LocalBucketStore:
+    """In-process buckets: exact within one worker, but each worker grants its own allowance."""
+    is_local = True
+
+    def __init__(self, max_buckets=LOCAL_MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = {}  # key -> (tokens, monotonic time of the last update, seconds to refill completely)
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        """Takes `cost` tokens (at most a full bucket) from `key`'s bucket, or none. Returns 0 if they were granted,
+        else the seconds until they are available."""
+        now, cost = time.monotonic(), min(cost, capacity)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = capacity if bucket is None else min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            wait = 0.0
+            if tokens >= cost: tokens -= cost
+            else: wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now, capacity / rate)
+            if len(self._buckets) > self.max_buckets: self._evict(now)
+        return wait
+
+    def _evict(self, now):
+        # A bucket idle long enough to have refilled is indistinguishable from a missing one
+        full = [key for key, (_, updated, refill) in self._buckets.items() if now - updated >= refill]
+        for key in full: del self._buckets[key]
+        if len(self._buckets) > self.max_buckets:
+            for key in list(self._buckets)[:len(self._buckets) - self.max_buckets]: del self._buckets[key]
+
+
+class RedisBucketStore:
+    is_local = False
+
+    def __init__(self, url):
+        import redis  # optional dependency, only needed when THROTTLE_REDIS_URL is set
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self._take = self._client.register_script(TAKE_SCRIPT)
+        self._fallback, self._retry_at = LocalBucketStore(), 0.0
+
+    def take(self, key, capacity, rate, cost=1):
+        if time.monotonic() < self._retry_at: return self._fallback.take(key, capacity, rate, cost)
+        try: return float(self._take(keys=[REDIS_KEY_PREFIX + key], args=[capacity, rate, cost]))
+        except Exception:
+            self._retry_at = time.monotonic() + REDIS_RETRY_SECONDS
+            logger.warning(f"Backend Throttling: Redis unavailable; using this process's local buckets for {REDIS_RETRY_SECONDS}s.", exc_info=True)
+            return self._fallback.take(key, capacity, rate, cost)
+
+
+class ThrottleMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: [0, 0])  # scope -> [allowed, rejected]
+
+    def record(self, scope, allowed):
+        with self._lock: self._counts[scope][0 if allowed else 1] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {scope: {'allowed': allowed, 'rejected': rejected, 'rejected_ratio': round(rejected / ((allowed + rejected) or 1), 4)}
+                    for scope, (allowed, rejected) in self._counts.items()}
+
+
+metrics = ThrottleMetrics()
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RedisBucketStore(settings.THROTTLE_REDIS_URL) if settings.THROTTLE_REDIS_URL else LocalBucketStore()
+    return _store
+
+
+_rates = {}
+
+
+def parse_rate(rate):
+    """'N/period' -> (capacity, tokens per second); cached since it runs on every check."""
+    if rate not in _rates:
+        count, period = rate.split('/')
+        seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        _rates[rate] = (int(count), int(count) / seconds)
+    return _rates[rate]
+
+
+def take(scope, ident, request=None, cost=1):
+    """Spends `cost` of `ident`'s tokens for `scope`. Returns 0 if granted, else seconds until they are available.
+    Scopes without a configured rate (and everything when THROTTLE_ENABLED is off) are unlimited."""
+    rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+    if not rate or not settings.THROTTLE_ENABLED or cost < 1: return 0
+    capacity, per_second = parse_rate(rate)
+    wait = get_bucket_store().take(f'{scope}:{ident}', capacity, per_second, cost)
+    metrics.record(scope, wait == 0)
+    if wait and request is not None: logger.info(f"Backend Throttling: Rejected {request.method} {request.path} for {ident} (scope '{scope}', retry in {wait:.1f}s).")
+    return wait
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base class: subclasses set `scope` (or derive it) and implement get_ident_key()."""
+    scope = None
+
+    def get_scope(self, view):
+        return self.scope
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(view)
+        if not scope: return True
+        ident = self.get_ident_key(request, view)
+        if ident is None: return True
+        self.wait_seconds = take(scope, ident, request)
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return getattr(self, 'wait_seconds', None)
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Per authenticated user, across every endpoint."""
+    scope = 'user'
+
+    def get_ident_key(self, request, view):
+        return f'u{request.user.pk}' if request.user and request.user.is_authenticated else None
+
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    """Per client IP, for unauthenticated requests."""
+    scope = 'anon'
+
+    def get_ident_key(self, request, view):
+        return None if request.user and request.user.is_authenticated else self.get_ident(request)
+
+
+class ScopedTokenBucketThrottle(TokenBucketThrottle):
+    """Per user (or IP when anonymous) on views and actions that set `throttle_scope`. Takes one token per
+    request; views that apply many operations per request spend the rest with charge()."""
+
+    def get_scope(self, view):
+        return getattr(view, 'throttle_scope', None)
+
+    def get_ident_key(self, request, view):
+        return f'u{request.user.pk}' if request.user and request.user.is_authenticated else self.get_ident(request)
+
+
+def charge(request, view, cost):
+    """Spends `cost` more of the request's tokens in the view's throttle scope, on top of the one the
+    throttle already took. Raises Throttled (429) if they aren't available."""
+    throttle = ScopedTokenBucketThrottle()
+    scope = throttle.get_scope(view)
+    wait = take(scope, throttle.get_ident_key(request, view), request, cost) if scope else 0
+    if wait: view.throttled(request, wait)
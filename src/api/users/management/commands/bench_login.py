@@ -0,0 +1,90 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+PASSWORD = 'bench-Login-pw-1'
+PREFIX = 'bench_login_'
+
+
+def hasher_settings(algorithm, profile):
+    preferred = settings.PASSWORD_HASH_ALGORITHMS[algorithm]
+    return {'PASSWORD_HASHERS': [preferred, *(path for path in settings.PASSWORD_HASHERS if path != preferred)],
+            'PASSWORD_HASH_WORK_FACTORS': settings.PASSWORD_HASH_PROFILES[profile]}
+
+
+class Command(BaseCommand):
+    help = ("Measures POST /api/login/ throughput for each password hasher and work-factor profile through the WSGI "
+            "application, reporting logins per second and per CPU-second (per core), and checks that an outdated hash "
+            "is upgraded on login. Creates and then deletes its own users.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--algorithms', default=','.join(settings.PASSWORD_HASH_ALGORITHMS))
+        parser.add_argument('--profiles', default=','.join(settings.PASSWORD_HASH_PROFILES))
+        parser.add_argument('--logins', type=int, default=200, help="Logins per combination (divided by 10 for production profiles).")
+        parser.add_argument('--clients', type=int, default=len(os.sched_getaffinity(0)), help="Concurrent clients.")
+
+    @override_settings(THROTTLE_ENABLED=False)  # every benchmark login comes from the same client
+    def handle(self, *args, **options):
+        algorithms, profiles = options['algorithms'].split(','), options['profiles'].split(',')
+        unknown = set(algorithms) - set(settings.PASSWORD_HASH_ALGORITHMS) | set(profiles) - set(settings.PASSWORD_HASH_PROFILES)
+        if unknown: raise CommandError(f"Unknown algorithms or profiles: {', '.join(sorted(unknown))}.")
+        from quillpad_backend.wsgi import application
+
+        User = get_user_model()
+        usernames = [f'{PREFIX}{i}' for i in range(options['clients'])]
+        User.objects.bulk_create([User(username=name, email=f'{name}@example.com') for name in usernames], ignore_conflicts=True)
+        users = User.objects.filter(username__in=usernames)
+        try:
+            self.stdout.write(f"{options['clients']} clients, {len(os.sched_getaffinity(0))} CPUs\n")
+            self.stdout.write(f"{'algorithm':>9} {'profile':>10} {'logins':>6} {'logins/s':>9} {'per core':>9} {'p50 ms':>8}")
+            for algorithm in algorithms:
+                for profile in profiles:
+                    with override_settings(**hasher_settings(algorithm, profile)):
+                        users.update(password=make_password(PASSWORD))
+                        logins = max(options['logins'] // (10 if profile == 'production' else 1), options['clients'])
+                        elapsed, cpu, timings, errors = self.run(application, usernames, logins)
+                    if errors: raise CommandError(f"{errors} of {logins} logins failed with {algorithm}/{profile}.")
+                    timings.sort()
+                    self.stdout.write(f"{algorithm:>9} {profile:>10} {logins:>6} {logins / elapsed:>9.1f} {logins / cpu:>9.1f} {timings[len(timings) // 2] * 1000:>8.1f}")
+            self.check_upgrade(application, usernames[0], algorithms[0])
+        finally:
+            users.delete()
+
+    def run(self, app, usernames, total):
+        def login(i):
+            body = json.dumps({'username': usernames[i % len(usernames)], 'password': PASSWORD}).encode()
+            environ = {'REQUEST_METHOD': 'POST', 'PATH_INFO': '/api/login/', 'CONTENT_TYPE': 'application/json',
+                       'CONTENT_LENGTH': str(len(body)), 'HTTP_HOST': 'localhost', 'wsgi.input': BytesIO(body)}
+            setup_testing_defaults(environ)
+            status = []
+            started = time.perf_counter()
+            b''.join(app(environ, lambda s, headers, exc_info=None: status.append(s)))
+            return time.perf_counter() - started, not status[0].startswith('200')
+
+        clients = len(usernames)
+        # process_time covers every thread, including the hashing pool
+        started, cpu_started = time.perf_counter(), time.process_time()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(login, range(total)))
+        return time.perf_counter() - started, time.process_time() - cpu_started, [t for t, _ in results], sum(e for _, e in results)
+
+    def check_upgrade(self, app, username, algorithm):
+        User = get_user_model()
+        outdated = 'pbkdf2' if algorithm != 'pbkdf2' else 'bcrypt'
+        with override_settings(**hasher_settings(outdated, 'loadtest')):
+            User.objects.filter(username=username).update(password=make_password(PASSWORD))
+        with override_settings(**hasher_settings(algorithm, 'loadtest')):
+            before = User.objects.get(username=username).password.split('$')[0]
+            _, _, _, errors = self.run(app, [username], 1)
+            after = User.objects.get(username=username).password.split('$')[0]
+        upgraded = not errors and after != before
+        self.stdout.write(f"\nRehash on login: {before} -> {after} ({'ok' if upgraded else 'NOT upgraded'})")
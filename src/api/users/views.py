@@ -12,6 +12,7 @@ from blog.models import Post, Comment
 from .serializers import RegisterSerializer, UserSerializer, ActivitySerializer, AdminUserUpdateSerializer
 from rest_framework.permissions import IsAdminUser
 from blog.pagination import PostLimitOffsetPagination
+from quillpad_backend.throttling import AnonTokenBucketThrottle, ScopedTokenBucketThrottle
 # --- Add logging ---
 import logging
 logger = logging.getLogger(__name__)
@@ -80,8 +81,13 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_scope = 'register'
 
 class CustomAuthToken(ObtainAuthToken):
+    # ObtainAuthToken disables throttling; password checks are expensive, so limit attempts per IP
+    throttle_classes = [AnonTokenBucketThrottle, ScopedTokenBucketThrottle]
+    throttle_scope = 'login'
+
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         try:
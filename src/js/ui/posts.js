@@ -15,7 +15,8 @@ export function renderPostList(posts, title = "Posts") {
 
 function renderPostSummary(post) {
     const summaryLength = 200; let excerpt = '';
-    if (post.content) { const cleanHtml = uiCommon.sanitizeAndParseMarkdown(post.content); const tempDiv = $('<div>').html(cleanHtml); const textContent = tempDiv.text(); excerpt = textContent.length > summaryLength ? textContent.substring(0, summaryLength) + '...' : textContent; }
+    if (post.excerpt) { excerpt = $('<div>').text(post.excerpt).html(); }
+    else if (post.content) { const cleanHtml = uiCommon.sanitizeAndParseMarkdown(post.content); const tempDiv = $('<div>').html(cleanHtml); const textContent = tempDiv.text(); excerpt = textContent.length > summaryLength ? textContent.substring(0, summaryLength) + '...' : textContent; }
     const canModify = auth.canEditOrDelete(post); const postDate = post.created_at ? new Date(post.created_at).toLocaleDateString() : 'N/A';
     return ` <div class="card post-summary mb-4" data-slug="${post.slug}"> ${post.featured_image_url ? `<a href="#posts/${post.slug}"><img src="${post.featured_image_url}" class="card-img-top" alt="${post.title}" style="max-height: 250px; object-fit: cover;"></a>` : ''} <div class="card-body"> <h3 class="card-title mb-1"><a href="#posts/${post.slug}" class="text-decoration-none">${post.title || 'Untitled'}</a></h3> <p class="post-meta card-subtitle mb-2 text-muted"> <i class="bi bi-person"></i> <a href="#posts/by_user/${post.author}" class="text-muted text-decoration-none">${post.author || '?'}</a> <i class="bi bi-calendar-event ms-2"></i> ${postDate} ${post.category ? `<i class="bi bi-folder ms-2"></i> <a href="#posts/by_category/${post.category}" class="text-muted text-decoration-none">${post.category}</a>` : ''} <br class="d-sm-none"> <span class="ms-sm-2"><i class="bi bi-chat-dots"></i> ${post.comment_count ?? 'N/A'}</span> <span class="ms-2"><i class="bi bi-eye"></i> ${post.view_count ?? 'N/A'}</span> <span class="ms-2"><i class="bi bi-hand-thumbs-up"></i> <span class="like-count">${post.likes?.length || 0}</span></span> </p> <p class="card-text">${excerpt || ''}</p> <div class="mb-2"> ${post.tags?.length > 0 ? '<i class="bi bi-tags me-1"></i>' : ''} ${(post.tags || []).map(tag => `<a href="#posts/by_tag/${tag}" class="tag">${tag}</a>`).join('')} </div> <a href="#posts/${post.slug}" class="btn btn-sm btn-outline-primary mt-1"><i class="bi bi-book me-1"></i>Read More</a> ${auth.getCurrentUser().token ? `<button class="btn btn-sm btn-outline-danger mt-1 btn-like" data-slug="${post.slug}" data-liked="false"><i class="bi bi-heart"></i><i class="bi bi-heart-fill"></i> Like</button> <button class="btn btn-sm btn-outline-success mt-1 btn-save" data-slug="${post.slug}" data-saved="false"><i class="bi bi-bookmark"></i><i class="bi bi-bookmark-fill"></i> Save</button>` : ''} ${ canModify ? `<a href="#edit-post/${post.slug}" class="btn btn-sm btn-outline-warning mt-1"><i class="bi bi-pencil"></i> Edit</a> <button class="btn btn-sm btn-outline-danger mt-1 btn-delete-post" data-slug="${post.slug}"><i class="bi bi-trash"></i> Delete</button>` : ''} </div> </div>`;
 }